@@ -0,0 +1,216 @@
+import sys
+import argparse
+import numpy as np
+
+from artfile import read_art, read_art_metadata, write_art
+from colors import PIXEL_DTYPE, TRANSPARENT, rgba_view
+from export import create_image
+
+# Using this as a git diff and merge driver for art files:
+#   .gitattributes:  *.json diff=pixelart merge=pixelart
+#   git config diff.pixelart.command "python /path/to/artdiff.py git-diff"
+#   git config merge.pixelart.driver "python /path/to/artdiff.py merge %O %A %B -o %A"
+
+# Changed pixels closer than this are reported as one region
+REGION_BLOCK = 8
+
+HIGHLIGHT = (255, 0, 255, 255)
+
+
+def pad_to(pixels, width, height):
+    """Extend a pixel array to width x height with transparent pixels"""
+    if pixels.shape == (height, width):
+        return pixels
+    padded = np.full((height, width), TRANSPARENT, dtype=PIXEL_DTYPE)
+    padded[:pixels.shape[0], :pixels.shape[1]] = pixels
+    return padded
+
+
+def align(*arrays):
+    """Pad pixel arrays to the size of the largest one, so they can be compared"""
+    height = max(pixels.shape[0] for pixels in arrays)
+    width = max(pixels.shape[1] for pixels in arrays)
+    return [pad_to(pixels, width, height) for pixels in arrays]
+
+
+def changed_regions(mask, block=REGION_BLOCK):
+    """Return (left, top, right, bottom) boxes around groups of changed pixels.
+
+    The mask is reduced to blocks first, so grouping only visits one cell
+    per block instead of one per pixel.
+    """
+    height, width = mask.shape
+    rows = -(-height // block)
+    columns = -(-width // block)
+    blocks = np.zeros((rows * block, columns * block), dtype=bool)
+    blocks[:height, :width] = mask
+    blocks = blocks.reshape(rows, block, columns, block).any(axis=(1, 3))
+
+    regions = []
+    seen = np.zeros_like(blocks)
+    for start in zip(*np.nonzero(blocks)):
+        start = (int(start[0]), int(start[1]))
+        if seen[start]:
+            continue
+        # Flood fill over touching blocks, diagonals included
+        seen[start] = True
+        stack = [start]
+        top, left = start
+        bottom, right = start
+        while stack:
+            row, column = stack.pop()
+            top, bottom = min(top, row), max(bottom, row)
+            left, right = min(left, column), max(right, column)
+            for y in range(max(row - 1, 0), min(row + 2, rows)):
+                for x in range(max(column - 1, 0), min(column + 2, columns)):
+                    if blocks[y, x] and not seen[y, x]:
+                        seen[y, x] = True
+                        stack.append((y, x))
+
+        # Shrink the block box down to the changed pixels
+        y0, x0 = top * block, left * block
+        ys, xs = np.nonzero(mask[y0:(bottom + 1) * block, x0:(right + 1) * block])
+        regions.append((x0 + int(xs.min()), y0 + int(ys.min()), x0 + int(xs.max()) + 1, y0 + int(ys.max()) + 1))
+    return regions
+
+
+def diff(old, new):
+    """Return the changed-pixel mask of two pixel arrays and the regions it covers"""
+    old, new = align(old, new)
+    mask = old != new
+    return mask, changed_regions(mask)
+
+
+def diff_image(old, new, scale_factor=4):
+    """Render old, new and a highlight of the changes side by side.
+
+    The highlight shows the new pixels faded, with changed pixels in full
+    color and removed ones in magenta.
+    """
+    old, new = align(old, new)
+    mask = old != new
+    height, width = mask.shape
+
+    highlight = new.copy()
+    rgba = rgba_view(highlight)
+    faded = ~mask & (rgba[:, :, 3] > 0)
+    rgba[faded, :3] = rgba[faded, :3] // 4 + 191
+    rgba[mask & (new == TRANSPARENT)] = HIGHLIGHT
+
+    gap = 1
+    panels = np.full((height, width * 3 + gap * 2), TRANSPARENT, dtype=PIXEL_DTYPE)
+    for index, panel in enumerate((old, new, highlight)):
+        left = index * (width + gap)
+        panels[:, left:left + width] = panel
+    return create_image(panels, scale_factor, transparent_bg=False)
+
+
+def merge_size(base, ours, theirs):
+    """Three-way merge of the sizes of pixel arrays.
+
+    The side that resized wins. Returns the merged (height, width) and
+    whether both sides resized differently, in which case ours is kept.
+    """
+    if theirs.shape in (base.shape, ours.shape):
+        return ours.shape, False
+    if ours.shape == base.shape:
+        return theirs.shape, False
+    return ours.shape, True
+
+
+def merge(base, ours, theirs):
+    """Three-way merge of pixel arrays.
+
+    The size is merged first, see merge_size, so a crop on one side is
+    kept instead of turning into an erase. Pixels changed on only one side
+    take that side's color, pixels both sides changed the same way merge
+    cleanly too. Returns the merged array and a mask of conflicting
+    pixels, which keep our color.
+    """
+    (height, width), _ = merge_size(base, ours, theirs)
+    base, ours, theirs = align(base, ours, theirs)
+    ours_changed = ours != base
+    theirs_changed = theirs != base
+    conflicts = ours_changed & theirs_changed & (ours != theirs)
+    merged = np.where(theirs_changed & ~ours_changed, theirs, ours)
+    return merged[:height, :width], conflicts[:height, :width]
+
+
+def read_or_empty(filename, like=None):
+    """Read an art file, treating /dev/null (added or deleted files in git) as empty"""
+    if filename == "/dev/null":
+        shape = like.shape if like is not None else (1, 1)
+        return np.zeros(shape, dtype=PIXEL_DTYPE)
+    return read_art(filename)
+
+
+def describe(name, old, new, image=None):
+    """Print the changes between two pixel arrays, returns whether there were any"""
+    mask, regions = diff(old, new)
+    if not regions:
+        return False
+    old_height, old_width = old.shape
+    new_height, new_width = new.shape
+    print(f"{name}: {int(mask.sum())} pixels changed in {len(regions)} regions")
+    if (old_width, old_height) != (new_width, new_height):
+        print(f"  size {old_width}x{old_height} -> {new_width}x{new_height}")
+    for left, top, right, bottom in regions:
+        print(f"  ({left}, {top}) - ({right}, {bottom})  {right - left}x{bottom - top}")
+    if image:
+        diff_image(old, new).save(image)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare and merge pixel art files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    diff_parser = commands.add_parser("diff", help="show the regions that changed between two files")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    diff_parser.add_argument("--image", help="also write a visual diff to this image")
+
+    git_parser = commands.add_parser("git-diff", help="diff driver for git (GIT_EXTERNAL_DIFF arguments)")
+    git_parser.add_argument("args", nargs="+")
+
+    merge_parser = commands.add_parser("merge", help="three-way merge, exits with 1 if there are conflicts")
+    merge_parser.add_argument("base")
+    merge_parser.add_argument("ours")
+    merge_parser.add_argument("theirs")
+    merge_parser.add_argument("-o", "--output", help="merged art file (default: print a summary only)")
+    args = parser.parse_args()
+
+    if args.command == "diff":
+        old = read_art(args.old)
+        new = read_art(args.new)
+        if not describe(f"{args.old} -> {args.new}", old, new, args.image):
+            print("No pixel changes")
+    elif args.command == "git-diff":
+        # path old-file old-hex old-mode new-file new-hex new-mode
+        path, old_file, new_file = args.args[0], args.args[1], args.args[4]
+        new = read_or_empty(new_file)
+        old = read_or_empty(old_file, like=new)
+        if new_file == "/dev/null":
+            new = np.zeros_like(old)
+        describe(path, old, new)
+    else:
+        base, ours, theirs = read_art(args.base), read_art(args.ours), read_art(args.theirs)
+        merged, conflicts = merge(base, ours, theirs)
+        if args.output:
+            # Our pixel_size and other settings are kept
+            write_art(args.output, merged, metadata=read_art_metadata(args.ours))
+        _, size_conflict = merge_size(base, ours, theirs)
+        if size_conflict:
+            print(f"Both sides resized, kept ours: {ours.shape[1]}x{ours.shape[0]} "
+                  f"(theirs {theirs.shape[1]}x{theirs.shape[0]})")
+        regions = changed_regions(conflicts)
+        if regions:
+            print(f"{int(conflicts.sum())} conflicting pixels, kept ours in:")
+            for left, top, right, bottom in regions:
+                print(f"  ({left}, {top}) - ({right}, {bottom})")
+        if size_conflict or regions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
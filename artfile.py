@@ -0,0 +1,114 @@
+import json
+import struct
+import numpy as np
+
+from colors import PIXEL_DTYPE, TRANSPARENT, pack_color, to_hex
+
+# The editor's JSON format:
+# {"grid_width": 32, "grid_height": 32, "pixel_size": 16, "pixels": {"x,y": "#RRGGBB", ...}}
+
+# The binary format for large documents: a header (magic, version, width and
+# height as little-endian uint32) followed by the packed pixels row by row,
+# exactly as they are in memory, so the file can be memory-mapped.
+BINARY_EXTENSION = ".pxa"
+BINARY_MAGIC = b"PXAR"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sIII")
+
+# Keys of the JSON format that hold the pixels, the others are metadata such as pixel_size
+PIXEL_KEYS = ('grid_width', 'grid_height', 'pixels')
+
+
+def pixels_to_dict(pixels):
+    """Convert packed colors to the {"x,y": color} mapping used in art files"""
+    ys, xs = np.nonzero(pixels)
+    # Format each distinct color once
+    values, inverse = np.unique(pixels[ys, xs], return_inverse=True)
+    names = [to_hex(value) for value in values]
+    return {f"{x},{y}": names[i] for x, y, i in zip(xs.tolist(), ys.tolist(), inverse.tolist())}
+
+
+def pixels_from_dict(save_data):
+    """Build a pixel array from the contents of an art file"""
+    width = int(save_data['grid_width'])
+    height = int(save_data['grid_height'])
+    pixels = np.zeros((height, width), dtype=PIXEL_DTYPE)
+
+    for key, color in save_data.get('pixels', {}).items():
+        x, y = map(int, key.split(','))
+        if 0 <= x < width and 0 <= y < height:
+            pixels[y, x] = TRANSPARENT if color == "white" else pack_color(color)
+    return pixels
+
+
+def read_art(filename):
+    """Load a pixel array from an art file"""
+    if filename.lower().endswith(BINARY_EXTENSION):
+        return np.array(map_binary(filename, writable=False))
+    with open(filename, 'r') as f:
+        return pixels_from_dict(json.load(f))
+
+
+def is_art_data(save_data):
+    """Whether loaded JSON is an art file, and not some other JSON such as a build manifest"""
+    return isinstance(save_data, dict) and all(key in save_data for key in PIXEL_KEYS)
+
+
+def read_art_metadata(filename):
+    """Everything but the pixels of an art file, e.g. its pixel_size (nothing for binary files)"""
+    if filename.lower().endswith(BINARY_EXTENSION):
+        return {}
+    with open(filename, 'r') as f:
+        save_data = json.load(f)
+    return {key: value for key, value in save_data.items() if key not in PIXEL_KEYS}
+
+
+def write_art(filename, pixels, pixel_size=16, metadata=None):
+    """Save a pixel array as an art file, with extra metadata keys if given"""
+    height, width = pixels.shape
+    save_data = {
+        'grid_width': width,
+        'grid_height': height,
+        'pixel_size': pixel_size,
+        'pixels': pixels_to_dict(pixels)
+    }
+    if metadata:
+        save_data.update((key, value) for key, value in metadata.items() if key not in PIXEL_KEYS)
+    with open(filename, 'w') as f:
+        json.dump(save_data, f, indent=2)
+
+
+def read_binary_header(filename):
+    """Return (width, height) of a binary art file"""
+    with open(filename, 'rb') as f:
+        header = f.read(BINARY_HEADER.size)
+    if len(header) < BINARY_HEADER.size:
+        raise ValueError("Not a binary art file")
+    magic, version, width, height = BINARY_HEADER.unpack(header)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a binary art file")
+    if version > BINARY_VERSION:
+        raise ValueError(f"Binary art file version {version} is not supported")
+    return width, height
+
+
+def create_binary(filename, width, height):
+    """Create an empty binary art file without writing its pixels, so it takes no time at any size"""
+    with open(filename, 'wb') as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, width, height))
+        f.truncate(BINARY_HEADER.size + width * height * PIXEL_DTYPE.itemsize)
+
+
+def write_binary(filename, pixels):
+    """Save a pixel array as a binary art file"""
+    height, width = pixels.shape
+    with open(filename, 'wb') as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, width, height))
+        f.write(np.ascontiguousarray(pixels, dtype=PIXEL_DTYPE).tobytes())
+
+
+def map_binary(filename, writable=True):
+    """Memory-map the pixels of a binary art file, pages are only read when touched"""
+    width, height = read_binary_header(filename)
+    return np.memmap(filename, dtype=PIXEL_DTYPE, mode='r+' if writable else 'r',
+                     offset=BINARY_HEADER.size, shape=(height, width))
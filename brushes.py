@@ -0,0 +1,41 @@
+from functools import lru_cache
+
+import numpy as np
+
+from colors import TRANSPARENT
+
+BRUSH_SHAPES = ("round", "square", "custom")
+MAX_BRUSH_SIZE = 64
+
+
+@lru_cache(maxsize=256)
+def brush_mask(shape, size):
+    """Return the cells covered by a round or square brush as a size x size boolean mask.
+
+    Masks are built once per shape and size. They are read-only because
+    every stamp of the brush shares them.
+    """
+    size = min(max(int(size), 1), MAX_BRUSH_SIZE)
+    if shape == "square" or size <= 2:
+        mask = np.ones((size, size), dtype=bool)
+    else:
+        # Cells whose centers lie inside the circle touching the box edges
+        center = (size - 1) / 2
+        offsets = (np.arange(size) - center) ** 2
+        mask = offsets[:, None] + offsets[None, :] <= (size / 2) ** 2
+    mask.setflags(write=False)
+    return mask
+
+
+def stamp_mask(pixels):
+    """Return a custom brush mask from the opaque cells of a block of pixels"""
+    mask = pixels != TRANSPARENT
+    mask.setflags(write=False)
+    return mask
+
+
+def is_corner(previous, middle, point):
+    """Whether three consecutive stroke cells form an L, whose middle cell pixel-perfect mode drops"""
+    (x0, y0), (x1, y1), (x2, y2) = previous, middle, point
+    return (abs(x2 - x0) == 1 and abs(y2 - y0) == 1 and
+            (x1 == x0 or y1 == y0) and (x1 == x2 or y1 == y2))
@@ -0,0 +1,239 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from artfile import read_art
+from export import EXPORT_FORMATS, RAW_CONTAINERS, RAW_ENCODINGS, export_image, export_raw
+from workers import shared_pool
+
+# A build manifest lists the exports to make, relative to the manifest's directory:
+# {"assets": [{"source": "sprites/**/*.json", "target": "build/{name}@{scale}x.{format}",
+#              "scales": [1, 4], "formats": ["png"], "transparent": true}]}
+# Formats are image formats (png, jpeg) or raw containers (raw, c, python),
+# which use the asset's "encoding" (rgba8888, rgb565, indexed8, indexed4).
+# The build adds "sources" (file stats and hashes) and "outputs" (what each
+# target was built from) so the next build can skip everything up to date.
+
+# Bump when export output changes, so old targets are rebuilt
+BUILD_VERSION = 1
+
+
+def expand_jobs(manifest, base_directory):
+    """Return (source, target, scale, format, settings) for every export in a manifest"""
+    jobs = []
+    for asset in manifest.get('assets', []):
+        pattern = os.path.join(base_directory, asset['source'])
+        sources = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        scales = asset.get('scales', [1])
+        formats = asset.get('formats', ["png"])
+        settings = {'transparent': bool(asset.get('transparent', True)),
+                    'encoding': asset.get('encoding', "rgba8888")}
+        for file_format in formats:
+            if file_format not in EXPORT_FORMATS + RAW_CONTAINERS:
+                raise ValueError(f"Unknown export format: {file_format}")
+        if settings['encoding'] not in RAW_ENCODINGS:
+            raise ValueError(f"Unknown raw encoding: {settings['encoding']}")
+
+        for source in sources:
+            name = os.path.splitext(os.path.basename(source))[0]
+            for scale in scales:
+                for file_format in formats:
+                    target = os.path.normpath(asset['target'].format(name=name, scale=scale, format=file_format))
+                    jobs.append((os.path.relpath(source, base_directory), target,
+                                 int(scale), file_format, settings))
+    return jobs
+
+
+def hash_file(filename):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def format_settings(file_format, settings):
+    """The asset settings that affect targets of one format"""
+    if file_format in RAW_CONTAINERS:
+        names = ('encoding',)
+    elif file_format == "png":
+        names = ('transparent',)
+    else:
+        # JPEG has no transparency and no encoding
+        names = ()
+    return {name: settings[name] for name in names}
+
+
+def build_key(source_hash, scale, file_format, settings):
+    """Hash of everything a target depends on, so other formats' settings leave it alone"""
+    key = json.dumps([BUILD_VERSION, source_hash, scale, file_format, format_settings(file_format, settings)],
+                     sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def build_source(source, exports):
+    """Export one source file to all its stale targets (runs in worker processes).
+
+    Returns (target, error) pairs, error is None for targets that were written.
+    """
+    try:
+        pixels = read_art(source)
+    except Exception as e:
+        return [(target, f"Could not load {source}: {str(e)}") for target, *_ in exports]
+
+    results = []
+    for target, scale, file_format, settings in exports:
+        try:
+            directory = os.path.dirname(target)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if file_format in RAW_CONTAINERS:
+                scaled = pixels.repeat(scale, axis=0).repeat(scale, axis=1) if scale != 1 else pixels
+                export_raw(scaled, target, settings['encoding'], file_format)
+            else:
+                export_image(pixels, target, file_format, scale, settings['transparent'])
+            results.append((target, None))
+        except Exception as e:
+            results.append((target, f"Could not export {target}: {str(e)}"))
+    return results
+
+
+class Build:
+    """Incremental export of the assets listed in a manifest.
+
+    Sources are only re-hashed when their modification time or size
+    changed, and targets are only rebuilt when the hash of their source
+    and export settings differs from the one recorded in the manifest.
+    """
+    def __init__(self, manifest_path):
+        self.manifest_path = os.path.abspath(manifest_path)
+        self.base_directory = os.path.dirname(self.manifest_path)
+        with open(self.manifest_path, 'r') as f:
+            self.manifest = json.load(f)
+
+    def path(self, relative):
+        return os.path.join(self.base_directory, relative)
+
+    def watch_paths(self):
+        """Return (directories, files) the sources of the manifest come from.
+
+        Globs are watched from the directory before their first wildcard, so
+        files that start to match later are picked up too, even outside the
+        manifest's directory.
+        """
+        directories = set()
+        files = set()
+        for asset in self.manifest.get('assets', []):
+            pattern = os.path.normpath(self.path(asset['source']))
+            if not glob.has_magic(pattern):
+                files.add(pattern)
+                continue
+            parts = pattern.split(os.sep)
+            fixed = next(index for index, part in enumerate(parts) if glob.has_magic(part))
+            directories.add(os.sep.join(parts[:fixed]) or os.sep)
+        return directories, files
+
+    def source_hashes(self, sources):
+        """Hash sources, reusing the recorded hash of files whose stat did not change"""
+        known = self.manifest.get('sources', {})
+        hashes = {}
+        records = {}
+        for source in sources:
+            try:
+                stat = os.stat(self.path(source))
+            except OSError:
+                continue
+            record = known.get(source)
+            if record is None or record['mtime_ns'] != stat.st_mtime_ns or record['size'] != stat.st_size:
+                record = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                          'hash': hash_file(self.path(source))}
+            records[source] = record
+            hashes[source] = record['hash']
+        return hashes, records
+
+    def stale_jobs(self, force=False):
+        """Return (jobs to build, target keys, source records, number of missing sources)"""
+        jobs = expand_jobs(self.manifest, self.base_directory)
+        hashes, records = self.source_hashes({source for source, *_ in jobs})
+        outputs = self.manifest.get('outputs', {})
+
+        stale = []
+        keys = {}
+        missing = 0
+        for source, target, scale, file_format, settings in jobs:
+            if source not in hashes:
+                missing += 1
+                continue
+            key = build_key(hashes[source], scale, file_format, settings)
+            keys[target] = key
+            if force or outputs.get(target) != key or not os.path.exists(self.path(target)):
+                stale.append((source, target, scale, file_format, settings))
+        return stale, keys, records, missing
+
+    def run(self, workers=None, force=False, log=print):
+        """Rebuild stale targets and record the result in the manifest, returns the number of errors"""
+        start = time.perf_counter()
+        stale, keys, records, missing = self.stale_jobs(force)
+
+        # Group exports by source so every source is read once
+        by_source = {}
+        for source, target, scale, file_format, settings in stale:
+            by_source.setdefault(self.path(source), []).append(
+                (self.path(target), scale, file_format, settings))
+
+        results = []
+        if len(by_source) > 1 and workers is None:
+            for batch in shared_pool().map(build_source, by_source, by_source.values(), chunksize=16):
+                results.extend(batch)
+        elif len(by_source) > 1 and workers != 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for batch in pool.map(build_source, by_source, by_source.values(), chunksize=16):
+                    results.extend(batch)
+        else:
+            for source, exports in by_source.items():
+                results.extend(build_source(source, exports))
+
+        outputs = self.manifest.get('outputs', {})
+        errors = 0
+        for target, error in results:
+            target = os.path.relpath(target, self.base_directory)
+            if error is None:
+                outputs[target] = keys[target]
+            else:
+                outputs.pop(target, None)
+                errors += 1
+                log(error)
+
+        # Forget targets that are no longer in the manifest
+        self.manifest['outputs'] = {target: key for target, key in outputs.items() if target in keys}
+        self.manifest['sources'] = records
+        self.save_manifest()
+
+        log(f"{len(results) - errors} built, {len(keys) - len(stale)} up to date, "
+            f"{errors} failed, {missing} missing sources in {time.perf_counter() - start:.2f}s")
+        return errors + missing
+
+    def save_manifest(self):
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the pixel art listed in a build manifest")
+    parser.add_argument("manifest", help="build manifest (.json)")
+    parser.add_argument("--jobs", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="rebuild everything")
+    args = parser.parse_args()
+
+    sys.exit(1 if Build(args.manifest).run(args.jobs, args.force) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+from functools import lru_cache
+
+import numpy as np
+from PIL import ImageColor
+
+# Pixels are packed RGBA integers with red in the lowest byte, so the raw
+# memory of a pixel array is plain RGBA bytes. Zero means transparent.
+PIXEL_DTYPE = np.dtype("<u4")
+TRANSPARENT = 0
+
+
+def pack_rgba(r, g, b, a=255):
+    """Pack color channels into one integer"""
+    return r | (g << 8) | (b << 16) | (a << 24)
+
+
+def unpack_rgba(value):
+    """Split a packed color into (r, g, b, a)"""
+    value = int(value)
+    return value & 0xFF, (value >> 8) & 0xFF, (value >> 16) & 0xFF, (value >> 24) & 0xFF
+
+
+@lru_cache(maxsize=1024)
+def pack_color(color):
+    """Convert a color string such as "#FF0000" or "white" to a packed color.
+
+    Results are cached, every string is parsed only once.
+    """
+    return pack_rgba(*ImageColor.getcolor(color, "RGBA"))
+
+
+def color_value(color):
+    """Convert a color string, a packed color or None (transparent) to a packed color"""
+    if color is None:
+        return TRANSPARENT
+    if isinstance(color, str):
+        return pack_color(color)
+    return int(color)
+
+
+def to_hex(value):
+    """Convert a packed color to a "#RRGGBB" string"""
+    r, g, b, _ = unpack_rgba(value)
+    return f"#{r:02X}{g:02X}{b:02X}"
+
+
+def rgba_view(pixels):
+    """View a 2D array of packed colors as a (height, width, 4) byte array"""
+    return pixels.view(np.uint8).reshape(pixels.shape + (4,))
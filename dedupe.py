@@ -0,0 +1,370 @@
+import os
+import sys
+import json
+import bisect
+import argparse
+import numpy as np
+
+from colors import PIXEL_DTYPE, TRANSPARENT
+
+TILE_SIZE = 16
+
+# Orientations a tile is compared in, as numbers for orient()
+TRANSFORM_NAMES = ("", "rotated 90", "rotated 180", "rotated 270",
+                   "flipped", "flipped, rotated 90", "flipped, rotated 180", "flipped, rotated 270")
+
+# Tiles hashed per step, which bounds the memory of the 64-bit products
+HASH_CHUNK = 16384
+
+# Near-duplicate buckets with more tiles than this (mostly empty bands) are
+# skipped, so a common band cannot turn the search into all pairs
+MAX_BUCKET = 256
+
+
+def orient(tiles, transform):
+    """Apply one of the 8 symmetries of a square to a (n, size, size) stack of tiles"""
+    if transform >= 4:
+        tiles = tiles[:, :, ::-1]
+    return np.rot90(tiles, transform % 4, axes=(1, 2))
+
+
+def slice_tiles(pixels, size=TILE_SIZE):
+    """Cut pixels into size x size tiles, returns the non-empty tiles and their (x, y) positions"""
+    height, width = pixels.shape
+    rows, columns = -(-height // size), -(-width // size)
+    padded = np.full((rows * size, columns * size), TRANSPARENT, dtype=PIXEL_DTYPE)
+    padded[:height, :width] = pixels
+    tiles = padded.reshape(rows, size, columns, size).swapaxes(1, 2).reshape(-1, size, size)
+    keep = (tiles != TRANSPARENT).any(axis=(1, 2))
+    ys, xs = np.divmod(np.nonzero(keep)[0], columns)
+    return tiles[keep], np.stack([xs * size, ys * size], axis=1)
+
+
+def hash_rows(values, weights):
+    """64-bit hash of every row of a 2D array of packed colors.
+
+    Each position has its own random odd multiplier and the products are
+    summed with wraparound, so this is one multiply-add pass per chunk.
+    """
+    hashes = np.empty(len(values), dtype=np.uint64)
+    for start in range(0, len(values), HASH_CHUNK):
+        chunk = values[start:start + HASH_CHUNK].astype(np.uint64)
+        hashes[start:start + HASH_CHUNK] = (chunk * weights).sum(axis=1, dtype=np.uint64)
+    return hashes
+
+
+class TileIndex:
+    """Index of the distinct tiles of any number of documents.
+
+    Every tile is hashed in all 8 orientations and filed under the smallest
+    hash, so a tile shares its entry with its mirror images and rotations.
+    Near-duplicates are found by splitting tiles into bands: two tiles that
+    differ in at most N pixels have at least one of N + 1 bands in common,
+    so only tiles sharing a band hash are ever compared. Tiles with equal
+    hashes are compared pixel for pixel before they share an entry, so a
+    hash collision can never swap one tile for another.
+    """
+    def __init__(self, tile_size=TILE_SIZE, symmetries=True):
+        self.tile_size = tile_size
+        self.transforms = range(8) if symmetries else range(1)
+        rng = np.random.default_rng(0x711E)
+        self.weights = rng.integers(0, 1 << 63, tile_size * tile_size, dtype=np.uint64) * 2 + 1
+        self.ids = {}
+        # Further tile ids of hashes that collided, which are rare enough to be kept apart
+        self.collisions = {}
+        self.count = 0
+        self.sources = []
+        # Tiles in the orientation they were filed under, one array per add(), and the id each starts at
+        self.chunks = []
+        self.chunk_starts = []
+        # Rows of (source, x, y, tile id, transform), one array per add()
+        self.occurrence_chunks = []
+        self._tiles = None
+        self._occurrences = None
+
+    def __len__(self):
+        return self.count
+
+    def filed_tile(self, tile_id):
+        """A tile in the orientation it was filed under"""
+        chunk = bisect.bisect_right(self.chunk_starts, tile_id) - 1
+        return self.chunks[chunk][tile_id - self.chunk_starts[chunk]]
+
+    def add(self, pixels, source=""):
+        """Slice a document into tiles and index them, returns the tile id of every tile"""
+        tiles, positions = slice_tiles(pixels, self.tile_size)
+        return self.add_tiles(tiles, positions, source)
+
+    def add_tiles(self, tiles, positions, source=""):
+        """Index a (n, size, size) stack of tiles found at (x, y) positions in a source"""
+        count = len(tiles)
+        if not count:
+            return np.empty(0, dtype=np.int64)
+        # Repeats are usually exact, so only tiles that differ as they are get all orientations hashed
+        _, first, inverse = np.unique(hash_rows(tiles.reshape(count, -1), self.weights),
+                                      return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        # Tiles that only share a hash with the first of their group become groups of their own
+        collided = np.nonzero((tiles != tiles[first][inverse]).any(axis=(1, 2)))[0]
+        if len(collided):
+            inverse[collided] = len(first) + np.arange(len(collided))
+            first = np.concatenate([first, collided])
+        distinct = tiles[first]
+        hashes = np.empty((len(self.transforms), len(first)), dtype=np.uint64)
+        for transform in self.transforms:
+            hashes[transform] = hash_rows(orient(distinct, transform).reshape(len(first), -1), self.weights)
+        transforms = hashes.argmin(axis=0)
+        canonical = hashes[transforms, np.arange(len(first))]
+        filed = np.empty_like(distinct)
+        for transform in self.transforms:
+            chosen = transforms == transform
+            filed[chosen] = orient(distinct[chosen], transform)
+
+        ids = np.empty(len(first), dtype=np.int64)
+        start = self.count
+        new = []
+        for k, value in enumerate(canonical.tolist()):
+            tile_id = self.ids.get(value)
+            if tile_id is None:
+                tile_id = self.ids[value] = self.count
+                self.count += 1
+                new.append(k)
+            else:
+                # Same hash, the pixels decide
+                for tile_id in [tile_id] + self.collisions.get(value, []):
+                    known = filed[new[tile_id - start]] if tile_id >= start else self.filed_tile(tile_id)
+                    if np.array_equal(known, filed[k]):
+                        break
+                else:
+                    tile_id = self.count
+                    self.count += 1
+                    self.collisions.setdefault(value, []).append(tile_id)
+                    new.append(k)
+            ids[k] = tile_id
+        if new:
+            self.chunk_starts.append(start)
+            self.chunks.append(filed[new])
+            self._tiles = None
+
+        tile_ids = ids[inverse]
+        transforms = transforms[inverse]
+        self.sources.append(source)
+        occurrences = np.empty((count, 5), dtype=np.int64)
+        occurrences[:, 0] = len(self.sources) - 1
+        occurrences[:, 1:3] = positions
+        occurrences[:, 3] = tile_ids
+        occurrences[:, 4] = transforms
+        self.occurrence_chunks.append(occurrences)
+        self._occurrences = None
+        return tile_ids
+
+    @property
+    def tiles(self):
+        """(distinct tiles, size, size) array of every indexed tile in its filed orientation"""
+        if self._tiles is None:
+            self._tiles = (np.concatenate(self.chunks) if self.chunks else
+                           np.empty((0, self.tile_size, self.tile_size), dtype=PIXEL_DTYPE))
+        return self._tiles
+
+    @property
+    def occurrences(self):
+        """(tiles added, 5) array of source, x, y, tile id and transform to the filed orientation"""
+        if self._occurrences is None:
+            self._occurrences = (np.concatenate(self.occurrence_chunks) if self.occurrence_chunks else
+                                 np.empty((0, 5), dtype=np.int64))
+        return self._occurrences
+
+    def usage(self):
+        """How often each distinct tile occurs"""
+        return np.bincount(self.occurrences[:, 3], minlength=len(self))
+
+    def duplicates(self):
+        """Yield (tile id, occurrences) for every tile that occurs more than once"""
+        occurrences = self.occurrences
+        occurrences = occurrences[np.argsort(occurrences[:, 3], kind='stable')]
+        ids, starts, counts = np.unique(occurrences[:, 3], return_index=True, return_counts=True)
+        for tile_id, start, count in zip(ids.tolist(), starts.tolist(), counts.tolist()):
+            if count > 1:
+                yield tile_id, occurrences[start:start + count]
+
+    def near_duplicates(self, max_distance):
+        """Return (a, b, transform, distance) arrays for distinct tiles that differ in 1 to max_distance pixels.
+
+        Tile b is tile a in that orientation with distance pixels changed.
+        """
+        tiles = self.tiles
+        count = len(tiles)
+        area = self.tile_size * self.tile_size
+        empty = np.empty(0, dtype=np.int64)
+        if count < 2 or max_distance < 1:
+            return empty, empty, empty, empty
+
+        bands = np.array_split(np.arange(area), min(max_distance + 1, area))
+        flat = tiles.reshape(count, area)
+        keys = np.concatenate([hash_rows(flat[:, band], self.weights[band]) for band in bands])
+        ids = np.tile(np.arange(count), len(bands))
+        order = np.argsort(keys, kind='stable')
+        keys, ids = keys[order], ids[order]
+
+        # Look up every band of every orientation of every tile
+        candidates = []
+        for transform in self.transforms:
+            oriented = np.ascontiguousarray(orient(tiles, transform)).reshape(count, area)
+            for band in bands:
+                query = hash_rows(oriented[:, band], self.weights[band])
+                starts = np.searchsorted(keys, query, 'left')
+                sizes = np.searchsorted(keys, query, 'right') - starts
+                sizes[sizes > MAX_BUCKET] = 0
+                total = int(sizes.sum())
+                if not total:
+                    continue
+                queries = np.repeat(np.arange(count), sizes)
+                offsets = np.arange(total) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+                matches = ids[np.repeat(starts, sizes) + offsets]
+                # Each unordered pair is found from both ends, keep one
+                keep = queries < matches
+                candidates.append((queries[keep] * count + matches[keep]) * 8 + transform)
+        if not candidates:
+            return empty, empty, empty, empty
+
+        pairs = np.unique(np.concatenate(candidates))
+        pairs, transforms = np.divmod(pairs, 8)
+        a, b = np.divmod(pairs, count)
+        distances = np.empty(len(pairs), dtype=np.int64)
+        for transform in self.transforms:
+            chosen = np.nonzero(transforms == transform)[0]
+            for start in range(0, len(chosen), HASH_CHUNK):
+                rows = chosen[start:start + HASH_CHUNK]
+                distances[rows] = (orient(tiles[a[rows]], transform) != tiles[b[rows]]).sum(axis=(1, 2))
+
+        # Keep the closest orientation of each pair
+        close = distances <= max_distance
+        a, b, transforms, distances = a[close], b[close], transforms[close], distances[close]
+        order = np.lexsort((distances, b, a))
+        a, b, transforms, distances = a[order], b[order], transforms[order], distances[order]
+        first = np.ones(len(a), dtype=bool)
+        first[1:] = (a[1:] != a[:-1]) | (b[1:] != b[:-1])
+        return a[first], b[first], transforms[first], distances[first]
+
+    def representatives(self, max_distance=0):
+        """Map every distinct tile to the tile that should replace it.
+
+        The most used tiles are kept first, and their near-duplicates that
+        are not kept yet are folded into them.
+        """
+        count = len(self)
+        result = np.full(count, -1, dtype=np.int64)
+        a, b, _, _ = self.near_duplicates(max_distance)
+        # Neighbours of every tile, both directions
+        ends = np.concatenate([a, b])
+        others = np.concatenate([b, a])
+        order = np.argsort(ends, kind='stable')
+        others = others[order]
+        bounds = np.searchsorted(ends[order], np.arange(count + 1))
+
+        for tile_id in np.argsort(-self.usage(), kind='stable').tolist():
+            if result[tile_id] >= 0:
+                continue
+            result[tile_id] = tile_id
+            neighbours = others[bounds[tile_id]:bounds[tile_id + 1]]
+            result[neighbours[result[neighbours] < 0]] = tile_id
+        return result
+
+
+def tile_replacements(tiles, max_distance=0):
+    """For a list of same-sized square tiles, the index of the tile that should replace each one.
+
+    Tiles are only compared as they are, since tile references cannot
+    flip or rotate tiles.
+    """
+    stack = np.stack(tiles)
+    index = TileIndex(stack.shape[1], symmetries=False)
+    tile_ids = index.add_tiles(stack, np.zeros((len(tiles), 2), dtype=np.int64))
+    representatives = index.representatives(max_distance)
+    # The first tile of each distinct tile speaks for it
+    _, first = np.unique(tile_ids, return_index=True)
+    return first[representatives[tile_ids]]
+
+
+def art_files(paths):
+    """Expand directories into the art files they contain"""
+    from workspace import scan_art_files
+
+    for path in paths:
+        if os.path.isdir(path):
+            for relative, _, _ in scan_art_files(path):
+                yield os.path.join(path, relative)
+        else:
+            yield path
+
+
+def report(index, max_distance=0, limit=20):
+    """Print the duplicate and near-duplicate tiles of an index"""
+    usage = index.usage()
+    total = int(usage.sum())
+    print(f"{total} tiles, {len(index)} distinct including flips and rotations, "
+          f"{total - len(index)} duplicates")
+
+    groups = sorted(index.duplicates(), key=lambda group: -len(group[1]))
+    for tile_id, occurrences in groups[:limit]:
+        print(f"  tile {tile_id} x{len(occurrences)}:")
+        for source, x, y, _, transform in occurrences[:8].tolist():
+            # How the occurrence has to be turned to match the indexed tile
+            name = TRANSFORM_NAMES[transform]
+            print(f"    {index.sources[source]} ({x}, {y})" + (f" [{name}]" if name else ""))
+        if len(occurrences) > 8:
+            print(f"    ... {len(occurrences) - 8} more")
+    if len(groups) > limit:
+        print(f"  ... {len(groups) - limit} more groups")
+
+    if max_distance:
+        a, b, transforms, distances = index.near_duplicates(max_distance)
+        print(f"{len(a)} near-duplicate pairs within {max_distance} pixels")
+        for tile_a, tile_b, transform, distance in list(zip(a.tolist(), b.tolist(),
+                                                            transforms.tolist(), distances.tolist()))[:limit]:
+            name = TRANSFORM_NAMES[transform]
+            print(f"  tile {tile_a} ~ tile {tile_b}: {distance} pixels" + (f" [{name}]" if name else ""))
+
+
+def main():
+    from artfile import read_art
+    from tilemap import TileMap
+
+    parser = argparse.ArgumentParser(description="Find duplicate tiles, including flipped and rotated ones")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = commands.add_parser("report", help="list repeated tiles in art files or directories")
+    report_parser.add_argument("paths", nargs="+")
+    report_parser.add_argument("--tile-size", type=int, default=TILE_SIZE)
+    report_parser.add_argument("--distance", type=int, default=0, help="also report tiles this many pixels apart")
+    report_parser.add_argument("--no-symmetries", action="store_true", help="do not match flipped or rotated tiles")
+    report_parser.add_argument("--limit", type=int, default=20, help="groups to list")
+    report_parser.add_argument("--json", help="write the tile id, source, position and transform of every tile here")
+
+    tilemap_parser = commands.add_parser("tilemap", help="merge duplicate tiles of a tilemap and rewrite its cells")
+    tilemap_parser.add_argument("tilemap")
+    tilemap_parser.add_argument("-o", "--output", required=True)
+    tilemap_parser.add_argument("--distance", type=int, default=0, help="also merge tiles this many pixels apart")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        index = TileIndex(args.tile_size, symmetries=not args.no_symmetries)
+        for path in art_files(args.paths):
+            try:
+                index.add(read_art(path), path)
+            except Exception as e:
+                print(f"Could not load {path}: {str(e)}", file=sys.stderr)
+        report(index, args.distance, args.limit)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({'sources': index.sources, 'tiles': index.occurrences.tolist()}, f)
+    else:
+        tilemap = TileMap.load(args.tilemap)
+        before = len(tilemap.tiles)
+        tilemap.merge_tiles(args.distance)
+        tilemap.save(args.output)
+        print(f"{before - len(tilemap.tiles)} of {before} tiles merged")
+
+
+if __name__ == "__main__":
+    main()
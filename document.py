@@ -0,0 +1,236 @@
+import os
+import numpy as np
+
+from artfile import BINARY_EXTENSION, create_binary, map_binary, read_art, write_art, write_binary
+from colors import PIXEL_DTYPE, TRANSPARENT, color_value
+from export import export_image, export_raw
+from selection import clip_rect, mask_bounds
+from usage import ColorUsage
+
+
+class PixelDocument:
+    """A sprite as an array of packed colors, with bulk editing and no Tk dependency.
+
+    Colors can be given as strings ("#FF0000"), packed colors or None for
+    transparent. Every change calls the change listeners with the
+    (x0, y0, x1, y1) rectangle it touched, which is how the editor keeps
+    its view in sync.
+
+        document = PixelDocument(16, 16)
+        document.fill_rect(0, 12, 16, 16, "#228B22")
+        document.replace_color("#228B22", "#8B4513")
+        document.export("ground.png", scale_factor=4)
+    """
+    def __init__(self, width=32, height=32, pixels=None):
+        if pixels is None:
+            pixels = np.zeros((height, width), dtype=PIXEL_DTYPE)
+        self.pixels = np.array(pixels, dtype=PIXEL_DTYPE)
+        self.change_listeners = []
+        self._usage = None
+
+    @property
+    def width(self):
+        return self.pixels.shape[1]
+
+    @property
+    def height(self):
+        return self.pixels.shape[0]
+
+    @property
+    def usage(self):
+        """Color usage index, counted once on first use and kept up to date by every write"""
+        if self._usage is None or self._usage.pixels is not self.pixels:
+            self._usage = ColorUsage(self.pixels)
+        return self._usage
+
+    def tracked_usage(self):
+        """The usage index if it is being kept, writes only update it then"""
+        if self._usage is not None and self._usage.pixels is self.pixels:
+            return self._usage
+        return None
+
+    @property
+    def mapped(self):
+        """Whether the pixels live in a memory-mapped binary art file"""
+        return isinstance(self.pixels, np.memmap)
+
+    @classmethod
+    def load(cls, filename):
+        """Open an art file"""
+        return cls(pixels=read_art(filename))
+
+    @classmethod
+    def open_mapped(cls, filename, writable=True):
+        """Open a binary art file in constant time, its pages are only read when touched"""
+        document = cls(0, 0)
+        document.pixels = map_binary(filename, writable)
+        return document
+
+    @classmethod
+    def create_mapped(cls, filename, width, height):
+        """Create an empty binary art file of any size and open it mapped"""
+        create_binary(filename, width, height)
+        return cls.open_mapped(filename)
+
+    def save(self, filename, pixel_size=16):
+        """Save as an art file, binary if the name ends in .pxa"""
+        if not filename.lower().endswith(BINARY_EXTENSION):
+            write_art(filename, self.pixels, pixel_size)
+        elif self.mapped and os.path.exists(filename) and os.path.samefile(filename, self.pixels.filename):
+            self.flush()
+        else:
+            write_binary(filename, self.pixels)
+
+    def flush(self):
+        """Write changed pages of a mapped document to its file"""
+        if self.mapped:
+            self.pixels.flush()
+
+    def export(self, filename, file_format="png", scale_factor=1, transparent_bg=True):
+        """Export as an image, see export.export_image.
+
+        The usage index tells without a scan whether a PNG can use a palette.
+        """
+        colors = None
+        if file_format == "png" and not self.mapped and self.usage.fits_palette():
+            colors = list(self.usage.counts)
+        return export_image(self.pixels, filename, file_format, scale_factor, transparent_bg, colors)
+
+    def export_raw(self, filename, encoding="rgba8888", container="raw"):
+        """Export raw pixel data for game engines, see export.export_raw"""
+        export_raw(self.pixels, filename, encoding, container)
+
+    def copy(self):
+        """Return an independent document with the same pixels and no listeners"""
+        return PixelDocument(pixels=self.pixels.copy())
+
+    def notify(self, x0, y0, x1, y1):
+        for listener in list(self.change_listeners):
+            listener(x0, y0, x1, y1)
+
+    # Reading
+
+    def get_pixel(self, x, y):
+        return int(self.pixels[y, x])
+
+    def get_region(self, rect):
+        """Return a copy of the pixels inside a (left, top, right, bottom) rectangle"""
+        left, top, right, bottom = rect
+        return self.pixels[top:bottom, left:right].copy()
+
+    # Writing
+
+    def set_pixel(self, x, y, color):
+        value = color_value(color)
+        old = int(self.pixels[y, x])
+        if old != value:
+            self.pixels[y, x] = value
+            usage = self.tracked_usage()
+            if usage is not None:
+                usage.replace_pixel(x, y, old, value)
+            self.notify(x, y, x + 1, y + 1)
+
+    def set_region(self, left, top, region, mask=None):
+        """Write a block of packed colors (only where mask is set), clipped to the document.
+
+        Returns (x0, y0, pixels before) for the part that landed on the
+        document, or None if nothing did.
+        """
+        height, width = region.shape
+        rect = clip_rect((left, top, left + width, top + height), self.width, self.height)
+        if rect is None:
+            return None
+
+        # Cut the block down to the part that lands on the document
+        x0, y0, x1, y1 = rect
+        region = region[y0 - top:y1 - top, x0 - left:x1 - left]
+        if mask is not None:
+            mask = mask[y0 - top:y1 - top, x0 - left:x1 - left]
+
+        target = self.pixels[y0:y1, x0:x1]
+        before = target.copy()
+        if mask is None:
+            target[:] = region
+        else:
+            target[mask] = region[mask]
+        usage = self.tracked_usage()
+        if usage is not None:
+            usage.replace_region(x0, y0, before, target)
+        self.notify(x0, y0, x1, y1)
+        return x0, y0, before
+
+    def set_pixels(self, pixels):
+        """Replace all pixels with an array of packed colors, which may have a different size unless mapped"""
+        pixels = np.asarray(pixels, dtype=PIXEL_DTYPE)
+        if pixels.shape == self.pixels.shape:
+            self.set_region(0, 0, pixels)
+            return
+        if self.mapped:
+            # A mapped file has a fixed size, a copy would no longer be written back to it
+            raise ValueError("A memory-mapped document cannot change size")
+        self.pixels = pixels.copy()
+        self.notify(0, 0, self.width, self.height)
+
+    def fill_rect(self, x0, y0, x1, y1, color):
+        """Fill the cells from (x0, y0) up to but not including (x1, y1)"""
+        rect = clip_rect((x0, y0, x1, y1), self.width, self.height)
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+        usage = self.tracked_usage()
+        before = self.pixels[y0:y1, x0:x1].copy() if usage is not None else None
+        self.pixels[y0:y1, x0:x1] = color_value(color)
+        if usage is not None:
+            usage.replace_region(x0, y0, before, self.pixels[y0:y1, x0:x1])
+        self.notify(x0, y0, x1, y1)
+
+    def clear(self):
+        self.fill_rect(0, 0, self.width, self.height, TRANSPARENT)
+
+    def fill(self, color):
+        """Paint every pixel with one color"""
+        self.fill_rect(0, 0, self.width, self.height, color)
+
+    def color_mask(self, color):
+        """Return a mask of the pixels that have a color"""
+        mask = np.zeros(self.pixels.shape, dtype=bool)
+        rect = self.usage.bounds(color_value(color)) if not self.mapped else (0, 0, self.width, self.height)
+        if rect is not None:
+            # Only the color's bounding box can hold it
+            x0, y0, x1, y1 = rect
+            mask[y0:y1, x0:x1] = self.pixels[y0:y1, x0:x1] == color_value(color)
+        return mask
+
+    def fill_mask(self, mask, color):
+        """Paint the pixels set in a full-size mask with one color, returns how many changed"""
+        rect = mask_bounds(mask)
+        if rect is None:
+            return 0
+        x0, y0, x1, y1 = rect
+        value = color_value(color)
+        mask = mask[y0:y1, x0:x1] & (self.pixels[y0:y1, x0:x1] != value)
+        self.set_region(x0, y0, np.full((y1 - y0, x1 - x0), value, dtype=PIXEL_DTYPE), mask)
+        return int(np.count_nonzero(mask))
+
+    def blit(self, source, x, y, skip_transparent=True):
+        """Draw another document or pixel array with its top left corner at (x, y)"""
+        if isinstance(source, PixelDocument):
+            source = source.pixels
+        mask = source != TRANSPARENT if skip_transparent else None
+        self.set_region(x, y, source, mask)
+
+    def replace_color(self, old, new):
+        """Replace every pixel of one color with another, returns how many changed"""
+        return self.fill_mask(self.color_mask(old), new)
+
+
+class DocumentTab:
+    """A document open in an editor tab, with the history and file that belong to it"""
+    def __init__(self, document, filename=None):
+        self.document = document
+        self.filename = filename
+        self.undo_stack = []
+        self.redo_stack = []
+        # Widget of the tab and its crash recovery journal, set by the editor
+        self.frame = None
+        self.journal = None
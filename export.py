@@ -0,0 +1,198 @@
+import os
+import numpy as np
+from PIL import Image
+
+from colors import PIXEL_DTYPE, TRANSPARENT, rgba_view
+
+EXPORT_FORMATS = ("png", "jpeg")
+
+# Raw exports for game engines and microcontrollers: a pixel encoding,
+# written as a binary file, a C header or a Python module
+RAW_ENCODINGS = ("rgba8888", "rgb565", "indexed8", "indexed4")
+RAW_CONTAINERS = ("raw", "c", "python")
+RAW_EXTENSIONS = {"raw": ".bin", "c": ".h", "python": ".py"}
+
+# Bytes per line in C headers
+C_BYTES_PER_LINE = 16
+
+
+def create_image(pixels, scale_factor=1, transparent_bg=False):
+    """Create a PIL Image from packed colors, scaled up with hard pixel edges"""
+    height, width = pixels.shape
+
+    # The pixel array is already RGBA bytes
+    image = Image.frombuffer('RGBA', (width, height), np.ascontiguousarray(pixels).tobytes(),
+                             'raw', 'RGBA', 0, 1)
+    if scale_factor != 1:
+        image = image.resize((width * scale_factor, height * scale_factor), Image.NEAREST)
+
+    # Transparent pixels become white unless the background is kept transparent
+    if not transparent_bg:
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image)
+        image = background
+
+    return image
+
+
+def create_palette_image(pixels, colors, scale_factor=1, transparent_bg=False):
+    """Create a palette ("P" mode) PIL Image from packed colors and the at most 256 colors they use"""
+    height, width = pixels.shape
+    colors = np.sort(np.asarray(colors, dtype=PIXEL_DTYPE))
+    indices = np.searchsorted(colors, pixels).astype(np.uint8)
+    if scale_factor != 1:
+        indices = indices.repeat(scale_factor, axis=0).repeat(scale_factor, axis=1)
+
+    image = Image.frombuffer('P', (indices.shape[1], indices.shape[0]), np.ascontiguousarray(indices).tobytes(),
+                             'raw', 'P', 0, 1)
+    palette = rgba_view(colors.reshape(1, -1))[0]
+    if transparent_bg:
+        image.putpalette(palette.tobytes(), rawmode='RGBA')
+    else:
+        # Blend every palette entry onto white instead of every pixel
+        alpha = palette[:, 3:].astype(np.uint16)
+        rgb = (palette[:, :3] * alpha + 255 * (255 - alpha) + 127) // 255
+        image.putpalette(rgb.astype(np.uint8).tobytes(), rawmode='RGB')
+    return image
+
+
+def export_image(pixels, filename, file_format="png", scale_factor=1, transparent_bg=True, colors=None):
+    """Write packed colors to an image file and return the image.
+
+    colors can list every color the pixels use (e.g. from a usage index),
+    PNGs are then written with a palette if there are 256 or fewer.
+    """
+    if file_format == "png":
+        if colors is not None and len(colors) <= 256:
+            image = create_palette_image(pixels, colors, scale_factor, transparent_bg)
+        else:
+            image = create_image(pixels, scale_factor, transparent_bg)
+        image.save(filename, 'PNG')
+    elif file_format == "jpeg":
+        # JPEG has no transparency
+        image = create_image(pixels, scale_factor, False)
+        image.save(filename, 'JPEG', quality=95)
+    else:
+        raise ValueError(f"Unknown export format: {file_format}")
+    return image
+
+
+def encode_rgba8888(pixels):
+    """Return the pixels as RGBA bytes, a view of the array itself"""
+    return memoryview(np.ascontiguousarray(pixels, dtype=PIXEL_DTYPE)).cast("B")
+
+
+def encode_rgb565(pixels):
+    """Return the pixels as little-endian RGB565, alpha is dropped"""
+    rgba = rgba_view(np.ascontiguousarray(pixels, dtype=PIXEL_DTYPE)).astype(np.uint16)
+    packed = ((rgba[:, :, 0] >> 3) << 11) | ((rgba[:, :, 1] >> 2) << 5) | (rgba[:, :, 2] >> 3)
+    return memoryview(packed.astype("<u2")).cast("B")
+
+
+def encode_indexed(pixels, bits=8):
+    """Return (palette, indices) for 8 or 4 bits per pixel.
+
+    The palette holds RGBA8888 entries with transparent always at index 0.
+    At 4 bits two pixels share a byte, the left one in the high nibble, and
+    every row starts on a new byte.
+    """
+    colors, indices = np.unique(pixels, return_inverse=True)
+    if colors[0] != TRANSPARENT:
+        colors = np.concatenate(([TRANSPARENT], colors)).astype(PIXEL_DTYPE)
+        indices = indices + 1
+    if len(colors) > 1 << bits:
+        raise ValueError(f"{len(colors)} colors do not fit in {bits} bits per pixel, "
+                         f"reduce them to {1 << bits} first")
+
+    indices = indices.reshape(pixels.shape).astype(np.uint8)
+    if bits == 4:
+        height, width = pixels.shape
+        if width % 2:
+            indices = np.concatenate((indices, np.zeros((height, 1), dtype=np.uint8)), axis=1)
+        indices = (indices[:, 0::2] << 4) | indices[:, 1::2]
+    return encode_rgba8888(colors.reshape(1, -1)), memoryview(np.ascontiguousarray(indices)).cast("B")
+
+
+def encode_raw(pixels, encoding):
+    """Return (palette or None, data) as byte memoryviews"""
+    if encoding == "rgba8888":
+        return None, encode_rgba8888(pixels)
+    if encoding == "rgb565":
+        return None, encode_rgb565(pixels)
+    if encoding == "indexed8":
+        return encode_indexed(pixels, 8)
+    if encoding == "indexed4":
+        return encode_indexed(pixels, 4)
+    raise ValueError(f"Unknown raw encoding: {encoding}")
+
+
+def c_array(data):
+    """Format bytes as the body of a C array initializer, without looping over them in Python"""
+    data = np.frombuffer(data, dtype=np.uint8)
+    if not len(data):
+        return ""
+    # Each byte becomes "0xHH, ", and each line starts with four spaces
+    hex_digits = np.frombuffer(data.tobytes().hex().upper().encode(), dtype=np.uint8).reshape(-1, 2)
+    cells = np.empty((len(data), 6), dtype=np.uint8)
+    cells[:, 0:2] = np.frombuffer(b"0x", dtype=np.uint8)
+    cells[:, 2:4] = hex_digits
+    cells[:, 4:6] = np.frombuffer(b", ", dtype=np.uint8)
+
+    lines = -(-len(data) // C_BYTES_PER_LINE)
+    padded = np.zeros((lines * C_BYTES_PER_LINE, 6), dtype=np.uint8)
+    padded[:len(data)] = cells
+    padded = padded.reshape(lines, C_BYTES_PER_LINE * 6)
+    text = np.empty((lines, C_BYTES_PER_LINE * 6 + 4), dtype=np.uint8)
+    text[:, :4] = ord(" ")
+    text[:, 4:] = padded
+    text[:, -1] = ord("\n")
+    text = text.tobytes()
+
+    # Drop the padding of the last line and its trailing ", "
+    used = len(data) - (lines - 1) * C_BYTES_PER_LINE
+    end = (lines - 1) * len(text) // lines + 4 + used * 6 - 2
+    return text[:end].decode("ascii") + "\n"
+
+
+def c_name(filename):
+    """Turn a file name into a C identifier"""
+    name = os.path.splitext(os.path.basename(filename))[0]
+    name = "".join(c if c.isalnum() else "_" for c in name)
+    return name if name and not name[0].isdigit() else "sprite_" + name
+
+
+def export_raw(pixels, filename, encoding="rgba8888", container="raw"):
+    """Write pixels in a raw encoding as a binary file, a C header or a Python module.
+
+    Binary files hold only the pixel data; indexed palettes go to a
+    second file with ".pal" added to the name.
+    """
+    height, width = pixels.shape
+    palette, data = encode_raw(pixels, encoding)
+
+    if container == "raw":
+        with open(filename, 'wb') as f:
+            f.write(data)
+        if palette is not None:
+            with open(filename + ".pal", 'wb') as f:
+                f.write(palette)
+    elif container == "c":
+        name = c_name(filename)
+        guard = name.upper() + "_H"
+        with open(filename, 'w') as f:
+            f.write(f"#ifndef {guard}\n#define {guard}\n\n#include <stdint.h>\n\n")
+            f.write(f"/* {width}x{height}, {encoding} */\n")
+            f.write(f"#define {name.upper()}_WIDTH {width}\n#define {name.upper()}_HEIGHT {height}\n\n")
+            if palette is not None:
+                f.write(f"static const uint8_t {name}_palette[{len(palette)}] = {{\n{c_array(palette)}}};\n\n")
+            f.write(f"static const uint8_t {name}_data[{len(data)}] = {{\n{c_array(data)}}};\n\n")
+            f.write(f"#endif /* {guard} */\n")
+    elif container == "python":
+        with open(filename, 'w') as f:
+            f.write(f"# {width}x{height}, {encoding}\n")
+            f.write(f"WIDTH = {width}\nHEIGHT = {height}\nENCODING = {encoding!r}\n")
+            if palette is not None:
+                f.write(f"PALETTE = {bytes(palette)!r}\n")
+            f.write(f"DATA = {bytes(data)!r}\n")
+    else:
+        raise ValueError(f"Unknown raw container: {container}")
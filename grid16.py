@@ -1,7 +1,28 @@
+import os
+import queue
 import tkinter as tk
-from tkinter import ttk, colorchooser, filedialog, messagebox
-import json
-from PIL import Image, ImageDraw
+from tkinter import ttk, colorchooser, filedialog, messagebox, simpledialog
+import numpy as np
+from artfile import BINARY_EXTENSION, read_art
+from colors import PIXEL_DTYPE, TRANSPARENT, pack_color, to_hex
+from importer import IMPORT_METHODS, load_rgba, downsample, fit_size
+from quantize import PALETTE_METHODS, DITHER_METHODS, quantize
+from journal import AutosaveJournal
+from renderer import MAX_BITMAP_SIZE, CanvasRenderer, photo_from_pixels
+from selection import FloatingSelection, clipboard, clip_rect, mask_bounds, normalize_rect
+from shapes import line_points, rectangle_points, ellipse_points
+from brushes import BRUSH_SHAPES, MAX_BRUSH_SIZE, brush_mask, is_corner, stamp_mask
+from document import DocumentTab, PixelDocument
+from tilemap import TilemapEditor
+from usage import ColorUsagePanel
+from preview import PreviewPanel
+from navigator import NavigatorPanel
+from workspace import ProjectBrowser
+from watch import BuildRunner, FileWatcher
+import transforms
+import export
+
+SHAPE_TOOLS = ("line", "rectangle", "ellipse")
 
 class PixelArtEditor:
     def __init__(self, root):
@@ -14,21 +35,152 @@ class PixelArtEditor:
         self.grid_height = 16
         self.pixel_size = 26
         
-        # Current color
-        self.current_color = "#000000"
+        # Current color, packed once here and used as is by every tool
+        self.current_color = pack_color("#000000")
         
-        # Grid data - stores color for each pixel
-        self.grid_data = {}
+        # The document being edited - one packed RGBA color per cell, TRANSPARENT where empty
+        self.document = None
         
         # Drawing mode
         self.is_drawing = False
         self.is_erasing = False
         self.is_transparency_mode = False
+        
+        # Brush - custom stamp mask, last stamped cell and the cells of a pixel-perfect stroke
+        self.custom_brush = None
+        self.last_stamp = None
+        self.stroke_points = []
+        
+        # Shape tools - start cell, end cell and the single preview item
+        self.shape_start = None
+        self.shape_end = None
+        self.shape_preview = None
+        
+        # Selection - (left, top, right, bottom) cells, plus pixels being moved
+        self.selection = None
+        self.selection_item = None
+        self.selection_start = None
+        self.floating = None
+        self.floating_photo = None
+        self.floating_item = None
+        self.move_origin = None
+        
+        # Undo history - each entry is (x, y, pixels before, pixels after)
+        self.undo_stack = []
+        self.redo_stack = []
+        self.current_stroke = None
+        self.max_undo = 100
+
+        # Crash recovery journals, one per tab - edits are queued until recovery has been offered
+        self.journaling = False
+        
+        # Called with (x0, y0, x1, y1) whenever pixels inside that rectangle change
+        self.change_listeners = []
+        
+        # Open documents - only the active one has a bitmap, the others keep just their pixels
+        self.tabs = []
+        self.active_tab = None
+        
+        # File the artwork was loaded from or saved to, and watch mode state
+        self.filename = None
+        self.watcher = None
+        self.watch_changes = queue.SimpleQueue()
+        self.watch_poll = None
+        self.build_runner = None
 
         self.setup_ui()
-        self.create_grid()
+        self.new_tab()
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after_idle(self.offer_recovery)
         
     def setup_ui(self):
+        # Menu bar
+        self.menubar = tk.Menu(self.root)
+        self.root.config(menu=self.menubar)
+        
+        self.file_menu = tk.Menu(self.menubar, tearoff=0)
+        self.file_menu.add_command(label="New Tab", command=self.new_tab, accelerator="Ctrl+T")
+        self.file_menu.add_command(label="Close Tab", command=self.close_tab, accelerator="Ctrl+W")
+        self.file_menu.add_command(label="New Large Document...", command=self.new_mapped_document)
+        self.file_menu.add_separator()
+        self.file_menu.add_command(label="Load...", command=self.load_art)
+        self.file_menu.add_command(label="Open Project...", command=self.open_project)
+        self.file_menu.add_command(label="Import Image...", command=self.import_image)
+        self.file_menu.add_separator()
+        self.file_menu.add_command(label="Save JSON...", command=self.save_art)
+        self.file_menu.add_command(label="Save PNG...", command=self.export_png)
+        self.file_menu.add_command(label="Save JPEG...", command=self.export_jpeg)
+        self.file_menu.add_command(label="Save Raw Data...", command=self.export_raw)
+        self.file_menu.add_separator()
+        self.watch_var = tk.BooleanVar(value=False)
+        self.file_menu.add_checkbutton(label="Watch Mode", variable=self.watch_var, command=self.toggle_watch)
+        self.menubar.add_cascade(label="File", menu=self.file_menu)
+        
+        self.edit_menu = tk.Menu(self.menubar, tearoff=0)
+        self.edit_menu.add_command(label="Undo", accelerator="Ctrl+Z", command=self.undo)
+        self.edit_menu.add_command(label="Redo", accelerator="Ctrl+Y", command=self.redo)
+        self.edit_menu.add_separator()
+        self.edit_menu.add_command(label="Cut", accelerator="Ctrl+X", command=self.cut_selection)
+        self.edit_menu.add_command(label="Copy", accelerator="Ctrl+C", command=self.copy_selection)
+        self.edit_menu.add_command(label="Paste", accelerator="Ctrl+V", command=self.paste)
+        self.clipboard_menu = tk.Menu(self.edit_menu, tearoff=0, postcommand=self.update_clipboard_menu)
+        self.edit_menu.add_cascade(label="Paste From Clipboard", menu=self.clipboard_menu)
+        self.edit_menu.add_command(label="Delete", accelerator="Del", command=self.delete_selection)
+        self.edit_menu.add_separator()
+        self.edit_menu.add_command(label="Select All", accelerator="Ctrl+A", command=self.select_all)
+        self.edit_menu.add_command(label="Deselect", accelerator="Esc", command=self.deselect)
+        self.menubar.add_cascade(label="Edit", menu=self.edit_menu)
+        
+        # Transforms work on the selection if there is one, otherwise on the whole grid
+        self.transform_menu = tk.Menu(self.menubar, tearoff=0)
+        self.transform_menu.add_command(label="Flip Horizontal", command=self.flip_horizontal)
+        self.transform_menu.add_command(label="Flip Vertical", command=self.flip_vertical)
+        self.transform_menu.add_separator()
+        self.transform_menu.add_command(label="Rotate 90\u00b0", command=lambda: self.rotate(1))
+        self.transform_menu.add_command(label="Rotate 180\u00b0", command=lambda: self.rotate(2))
+        self.transform_menu.add_command(label="Rotate 270\u00b0", command=lambda: self.rotate(3))
+        self.transform_menu.add_separator()
+        self.transform_menu.add_command(label="Shift Left", command=lambda: self.shift(-1, 0))
+        self.transform_menu.add_command(label="Shift Right", command=lambda: self.shift(1, 0))
+        self.transform_menu.add_command(label="Shift Up", command=lambda: self.shift(0, -1))
+        self.transform_menu.add_command(label="Shift Down", command=lambda: self.shift(0, 1))
+        self.transform_menu.add_separator()
+        for factor in (2, 3, 4):
+            self.transform_menu.add_command(label=f"Scale {factor}x",
+                                            command=lambda f=factor: self.scale(f))
+        self.transform_menu.add_separator()
+        self.transform_menu.add_command(label="Crop to Content", command=self.crop_to_content)
+        self.menubar.add_cascade(label="Transform", menu=self.transform_menu)
+        
+        self.colors_menu = tk.Menu(self.menubar, tearoff=0)
+        self.colors_menu.add_command(label="Reduce Colors...", command=self.reduce_colors)
+        self.colors_menu.add_separator()
+        self.colors_menu.add_command(label="Fill With Current Color", command=self.fill_with_color)
+        self.colors_menu.add_command(label="Replace Current Color...", command=self.replace_current_color)
+        self.colors_menu.add_command(label="Select Current Color", command=self.select_current_color)
+        self.menubar.add_cascade(label="Colors", menu=self.colors_menu)
+        
+        self.view_menu = tk.Menu(self.menubar, tearoff=0)
+        self.tiling_var = tk.BooleanVar(value=False)
+        self.view_menu.add_checkbutton(label="Tiling Preview", variable=self.tiling_var,
+                                       command=self.toggle_tiling)
+        self.view_menu.add_command(label="Tilemap Editor...", command=self.open_tilemap_editor)
+        self.menubar.add_cascade(label="View", menu=self.view_menu)
+        
+        self.root.bind("<Control-t>", lambda e: self.new_tab())
+        self.root.bind("<Control-w>", self.close_tab)
+        # Editing keys are left to text fields such as the grid size box while they have focus
+        self.root.bind("<Control-z>", self.canvas_key(self.undo))
+        self.root.bind("<Control-y>", self.canvas_key(self.redo))
+        self.root.bind("<Control-x>", self.canvas_key(self.cut_selection))
+        self.root.bind("<Control-c>", self.canvas_key(self.copy_selection))
+        self.root.bind("<Control-v>", self.canvas_key(self.paste))
+        self.root.bind("<Delete>", self.canvas_key(self.delete_selection))
+        self.root.bind("<Control-a>", self.canvas_key(self.select_all))
+        self.root.bind("<Escape>", self.canvas_key(self.deselect))
+        self.root.bind("<Return>", self.canvas_key(self.deselect))
+        
         # Main frame
         main_frame = ttk.Frame(self.root)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -44,7 +196,7 @@ class PixelArtEditor:
         ttk.Label(color_frame, text="Current Color:").pack(side=tk.LEFT, padx=(0, 5))
         
         self.color_display = tk.Frame(color_frame, width=30, height=30, 
-                                    bg=self.current_color, relief=tk.RAISED, bd=2)
+                                    bg=to_hex(self.current_color), relief=tk.RAISED, bd=2)
         self.color_display.pack(side=tk.LEFT, padx=(0, 10))
         
         ttk.Button(color_frame, text="Choose Color", 
@@ -54,6 +206,9 @@ class PixelArtEditor:
         quick_colors = ["#000000", "#FFFFFF", "#FF0000", "#00FF00", "#0000FF", 
                        "#FFFF00", "#FF00FF", "#00FFFF", "#FFA500", "#800080"]
         
+        # The game palette as packed colors - quick colors plus every color picked with Choose Color
+        self.palette = [pack_color(color) for color in quick_colors]
+        
         for color in quick_colors:
             color_btn = tk.Button(color_frame, width=2, height=1, bg=color,
                                 command=lambda c=color: self.set_color(c))
@@ -76,6 +231,39 @@ class PixelArtEditor:
         ttk.Radiobutton(tool_buttons_frame, text="Transparent", variable=self.tool_var, 
                        value="transparent", command=self.set_tool).pack(side=tk.LEFT, padx=2)
         
+        # Second row for the shape tools
+        self.tool_options_frame = ttk.Frame(main_frame)
+        self.tool_options_frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 10))
+        
+        ttk.Label(self.tool_options_frame, text="Shapes:").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Radiobutton(self.tool_options_frame, text="Line", variable=self.tool_var, 
+                       value="line", command=self.set_tool).pack(side=tk.LEFT, padx=2)
+        ttk.Radiobutton(self.tool_options_frame, text="Rectangle", variable=self.tool_var, 
+                       value="rectangle", command=self.set_tool).pack(side=tk.LEFT, padx=2)
+        ttk.Radiobutton(self.tool_options_frame, text="Ellipse", variable=self.tool_var, 
+                       value="ellipse", command=self.set_tool).pack(side=tk.LEFT, padx=2)
+        
+        self.fill_shapes_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.tool_options_frame, text="Filled", 
+                       variable=self.fill_shapes_var).pack(side=tk.LEFT, padx=(5, 0))
+        
+        ttk.Label(self.tool_options_frame, text="Selection:").pack(side=tk.LEFT, padx=(20, 5))
+        ttk.Radiobutton(self.tool_options_frame, text="Select", variable=self.tool_var, 
+                       value="select", command=self.set_tool).pack(side=tk.LEFT, padx=2)
+        
+        ttk.Label(self.tool_options_frame, text="Brush:").pack(side=tk.LEFT, padx=(20, 5))
+        self.brush_shape_var = tk.StringVar(value="round")
+        ttk.Combobox(self.tool_options_frame, textvariable=self.brush_shape_var, values=BRUSH_SHAPES,
+                     width=7, state="readonly").pack(side=tk.LEFT, padx=2)
+        self.brush_size_var = tk.IntVar(value=1)
+        ttk.Spinbox(self.tool_options_frame, from_=1, to=MAX_BRUSH_SIZE, textvariable=self.brush_size_var,
+                    width=4).pack(side=tk.LEFT, padx=2)
+        self.pixel_perfect_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.tool_options_frame, text="Pixel Perfect",
+                       variable=self.pixel_perfect_var).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(self.tool_options_frame, text="Stamp From Selection",
+                  command=self.set_custom_brush).pack(side=tk.LEFT, padx=5)
+        
         # Action buttons
         action_buttons_frame = ttk.Frame(tools_frame)
         action_buttons_frame.pack(side=tk.LEFT)
@@ -97,11 +285,17 @@ class PixelArtEditor:
         
         ttk.Label(size_frame, text="Grid Size:").pack(side=tk.LEFT)
         
-        size_var = tk.StringVar(value=f"{self.grid_width}x{self.grid_height}")
-        size_combo = ttk.Combobox(size_frame, textvariable=size_var, width=8,
+        self.size_var = tk.StringVar(value=f"{self.grid_width}x{self.grid_height}")
+        size_combo = ttk.Combobox(size_frame, textvariable=self.size_var, width=8,
                                  values=["16x16", "32x32", "64x64", "128x128"])
         size_combo.pack(side=tk.LEFT, padx=5)
         size_combo.bind("<<ComboboxSelected>>", self.change_grid_size)
+        size_combo.bind("<Return>", self.change_grid_size)
+        
+        # One tab per open document, the canvas below shows the active one
+        self.tab_bar = ttk.Notebook(main_frame)
+        self.tab_bar.pack(fill=tk.X)
+        self.tab_bar.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         # Canvas frame
         canvas_frame = ttk.Frame(main_frame)
@@ -114,13 +308,28 @@ class PixelArtEditor:
         v_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self.canvas.yview)
         h_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL, command=self.canvas.xview)
         
-        self.canvas.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.canvas.configure(yscrollcommand=lambda first, last: self.on_view_scroll(v_scrollbar, first, last),
+                              xscrollcommand=lambda first, last: self.on_view_scroll(h_scrollbar, first, last))
+        self.canvas.bind("<Configure>", self.on_canvas_resize)
+        
+        # Panels docked to the right of the canvas
+        self.dock = ttk.Frame(canvas_frame)
+        self.dock.pack(side=tk.RIGHT, fill=tk.Y, padx=(10, 0))
+        self.navigator = NavigatorPanel(self, self.dock)
+        self.navigator.frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 10))
+        self.preview_panel = PreviewPanel(self, self.dock)
+        self.preview_panel.frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 10))
+        self.usage_panel = ColorUsagePanel(self, self.dock)
+        self.usage_panel.frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
         
         # Pack scrollbars and canvas
         v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         h_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
+        # Pixels are drawn as one bitmap instead of a rectangle per pixel
+        self.renderer = CanvasRenderer(self.canvas)
+        
         # Bind mouse events
         self.canvas.bind("<Button-1>", self.on_mouse_down)
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
@@ -128,25 +337,187 @@ class PixelArtEditor:
         
         # Remove old right-click events - now using tool selection instead
         
-    def create_grid(self):
-        """Create the pixel grid"""
+    def canvas_key(self, handler):
+        """Wrap a key binding so it does nothing while a text field has focus"""
+        def on_key(event):
+            # ttk.Combobox and ttk.Spinbox are ttk.Entry widgets too
+            if isinstance(event.widget, (tk.Entry, ttk.Entry, tk.Spinbox, tk.Text)):
+                return None
+            return handler(event)
+        return on_key
+    
+    def new_tab(self, document=None, filename=None):
+        """Open a document (a blank one by default) in a new tab and switch to it"""
+        if document is None:
+            document = PixelDocument(self.grid_width, self.grid_height)
+        tab = DocumentTab(document, filename)
+        tab.frame = ttk.Frame(self.tab_bar, height=1)
+        tab.journal = AutosaveJournal()
+        if self.journaling:
+            tab.journal.start()
+        self.tabs.append(tab)
+        self.tab_bar.add(tab.frame, text=self.tab_title(tab))
+        self.show_tab(tab)
+        self.journal_document()
+        return tab
+    
+    def tab_title(self, tab):
+        if tab.filename:
+            return os.path.basename(tab.filename)
+        return "Untitled"
+    
+    def show_tab(self, tab):
+        """Switch to a tab, the one left behind gives up its bitmap"""
+        if tab is self.active_tab:
+            return
+        if self.active_tab is not None:
+            self.commit_floating()
+            self.active_tab.undo_stack, self.active_tab.redo_stack = self.undo_stack, self.redo_stack
+        
+        self.active_tab = tab
+        # The tab's journal already holds its document
+        self.set_document(tab.document, journal=False)
+        self.undo_stack, self.redo_stack = tab.undo_stack, tab.redo_stack
+        self.filename = tab.filename
+        self.tab_bar.select(tab.frame)
+    
+    def on_tab_changed(self, event):
+        self.show_tab(self.tabs[self.tab_bar.index("current")])
+    
+    def close_tab(self, event=None):
+        """Close the active tab, leaving a blank one if it was the last"""
+        tab = self.active_tab
+        index = self.tabs.index(tab)
+        if len(self.tabs) == 1:
+            self.new_tab()
+        else:
+            self.show_tab(self.tabs[index - 1 if index else 1])
+        self.tabs.remove(tab)
+        self.tab_bar.forget(tab.frame)
+        tab.journal.close(discard=True)
+        self.update_watched_files()
+    
+    @property
+    def pixels(self):
+        return self.document.pixels
+    
+    @property
+    def journal(self):
+        """Crash recovery journal of the active tab"""
+        return self.active_tab.journal
+    
+    def set_document(self, document, journal=True):
+        """Start editing a document, with a new view and history"""
+        if self.document is not None and self.on_document_change in self.document.change_listeners:
+            self.document.change_listeners.remove(self.on_document_change)
+        self.document = document
+        document.change_listeners.append(self.on_document_change)
+        if self.active_tab is not None:
+            self.active_tab.document = document
+        self.undo_stack = []
+        self.redo_stack = []
+        self.reset_view(journal)
+    
+    def reset_view(self, journal=True):
+        """Draw the document from scratch, for a new document or a new size of it"""
+        self.grid_height, self.grid_width = self.pixels.shape
         self.canvas.delete("all")
-        self.grid_data = {}
+        if journal:
+            self.journal_document()
+        self.renderer.reset(self.pixels, self.pixel_size)
+        self.shape_preview = None
+        self.selection = None
+        self.selection_item = None
+        self.floating = None
+        self.floating_photo = None
+        self.floating_item = None
+        self.size_var.set(f"{self.grid_width}x{self.grid_height}")
         
         canvas_width = self.grid_width * self.pixel_size
         canvas_height = self.grid_height * self.pixel_size
         
-        # Update scroll region
-        self.canvas.configure(scrollregion=(0, 0, canvas_width + 50, canvas_height + 50))
+        self.update_scroll_region()
         
-        # Create grid lines
-        for i in range(self.grid_width + 1):
-            x = i * self.pixel_size
-            self.canvas.create_line(x, 0, x, canvas_height, fill="lightgray", tags="grid")
-            
-        for i in range(self.grid_height + 1):
-            y = i * self.pixel_size
-            self.canvas.create_line(0, y, canvas_width, y, fill="lightgray", tags="grid")
+        # Create grid lines, except for documents too big to draw at once
+        if not self.renderer.viewport:
+            for i in range(self.grid_width + 1):
+                x = i * self.pixel_size
+                self.canvas.create_line(x, 0, x, canvas_height, fill="lightgray", tags="grid")
+                
+            for i in range(self.grid_height + 1):
+                y = i * self.pixel_size
+                self.canvas.create_line(0, y, canvas_width, y, fill="lightgray", tags="grid")
+        
+        self.notify_change(0, 0, self.grid_width, self.grid_height)
+    
+    def journal_document(self):
+        """Start the active tab's journal over from its whole document"""
+        if self.document.mapped:
+            # Mapped documents are saved by flushing their file, they are not journaled
+            self.journal.record_clear()
+            return
+        self.journal.record_reset(self.grid_width, self.grid_height)
+        if self.pixels.any():
+            self.journal.record_region(0, 0, self.pixels.copy())
+    
+    def on_view_scroll(self, scrollbar, first, last):
+        """Update a scrollbar and the part of the document drawn in viewport mode"""
+        scrollbar.set(first, last)
+        self.renderer.view_changed()
+        self.navigator.view_changed()
+    
+    def on_canvas_resize(self, event):
+        """A resized window shows more or less of the document"""
+        self.renderer.view_changed()
+        self.navigator.view_changed()
+    
+    def center_view(self, grid_x, grid_y):
+        """Scroll the canvas so a grid position is in the middle of it"""
+        left, top, right, bottom = (float(value) for value in str(self.canvas.cget("scrollregion")).split())
+        x = grid_x * self.pixel_size - self.canvas.winfo_width() / 2
+        y = grid_y * self.pixel_size - self.canvas.winfo_height() / 2
+        self.canvas.xview_moveto((x - left) / (right - left))
+        self.canvas.yview_moveto((y - top) / (bottom - top))
+    
+    def update_scroll_region(self):
+        """Fit the scroll region to the grid, plus its neighbours in tiling preview"""
+        canvas_width = self.grid_width * self.pixel_size
+        canvas_height = self.grid_height * self.pixel_size
+        if self.tiling_var.get():
+            self.canvas.configure(scrollregion=(-canvas_width - 50, -canvas_height - 50,
+                                                2 * canvas_width + 50, 2 * canvas_height + 50))
+        else:
+            self.canvas.configure(scrollregion=(0, 0, canvas_width + 50, canvas_height + 50))
+    
+    def toggle_tiling(self):
+        """Show or hide the sprite wrapped around itself"""
+        tiling = self.tiling_var.get()
+        self.renderer.set_tiling(tiling)
+        self.update_scroll_region()
+        if tiling:
+            # Start with the sprite itself in the middle of the view
+            self.canvas.xview_moveto(1 / 3)
+            self.canvas.yview_moveto(1 / 3)
+    
+    def on_document_change(self, x0, y0, x1, y1):
+        """Redraw, journal and pass on a change made to the document"""
+        if self.pixels.shape != (self.grid_height, self.grid_width):
+            # The document was resized, show it at its new size and keep its history
+            self.reset_view()
+            return
+        
+        self.renderer.render_rect(x0, y0, x1, y1)
+        if not self.document.mapped:
+            if x1 - x0 == 1 and y1 - y0 == 1:
+                self.journal.record_pixel(x0, y0, int(self.pixels[y0, x0]))
+            else:
+                self.journal.record_region(x0, y0, self.pixels[y0:y1, x0:x1].copy())
+        self.notify_change(x0, y0, x1, y1)
+    
+    def notify_change(self, x0, y0, x1, y1):
+        """Tell other views which rectangle of the grid has changed"""
+        for listener in self.change_listeners:
+            listener(x0, y0, x1, y1)
     
     def get_grid_position(self, x, y):
         """Convert canvas coordinates to grid coordinates"""
@@ -156,38 +527,166 @@ class PixelArtEditor:
         grid_x = int(canvas_x // self.pixel_size)
         grid_y = int(canvas_y // self.pixel_size)
         
+        if self.tiling_var.get():
+            # Cells of the wrapped neighbours paint the sprite itself
+            if (-self.grid_width <= grid_x < 2 * self.grid_width and
+                    -self.grid_height <= grid_y < 2 * self.grid_height):
+                return grid_x % self.grid_width, grid_y % self.grid_height
+            return None, None
+        
         if 0 <= grid_x < self.grid_width and 0 <= grid_y < self.grid_height:
             return grid_x, grid_y
         return None, None
     
+    def get_clamped_grid_position(self, x, y):
+        """Convert canvas coordinates to grid coordinates, clamped to the grid"""
+        grid_x = int(self.canvas.canvasx(x) // self.pixel_size)
+        grid_y = int(self.canvas.canvasy(y) // self.pixel_size)
+        
+        grid_x = min(max(grid_x, 0), self.grid_width - 1)
+        grid_y = min(max(grid_y, 0), self.grid_height - 1)
+        return grid_x, grid_y
+    
+    def get_shape_position(self, x, y):
+        """Convert canvas coordinates to grid coordinates for the shape tools"""
+        if not self.tiling_var.get():
+            return self.get_clamped_grid_position(x, y)
+        
+        # Shapes may run into the wrapped neighbours, draw_pixels wraps them back
+        grid_x, grid_y = self.get_unclamped_grid_position(x, y)
+        grid_x = min(max(grid_x, -self.grid_width), 2 * self.grid_width - 1)
+        grid_y = min(max(grid_y, -self.grid_height), 2 * self.grid_height - 1)
+        return grid_x, grid_y
+    
+    def get_color_value(self, color=None, make_transparent=False):
+        """Convert a color (default: the current color) to the value stored in the grid"""
+        if make_transparent:
+            return TRANSPARENT
+        if color is None:
+            return self.current_color
+        if isinstance(color, str):
+            # Callers passing "white" mean transparency, as in the editor's erase tool
+            return TRANSPARENT if color == "white" else pack_color(color)
+        return color
+    
     def draw_pixel_at(self, grid_x, grid_y, color=None, make_transparent=False):
         """Draw a pixel at the given grid coordinates"""
-        pixel_tag = f"pixel_{grid_x}_{grid_y}"
+        value = self.get_color_value(color, make_transparent)
+        old_value = int(self.pixels[grid_y, grid_x])
+        if old_value == value:
+            return
         
-        # Remove existing pixel
-        self.canvas.delete(pixel_tag)
+        if self.current_stroke is not None:
+            # Keep the color from before the stroke started
+            self.current_stroke.append((grid_x, grid_y, np.array([[old_value]], dtype=PIXEL_DTYPE)))
         
-        if make_transparent:
-            # Make pixel transparent (remove from grid_data)
-            if (grid_x, grid_y) in self.grid_data:
-                del self.grid_data[(grid_x, grid_y)]
+        self.document.set_pixel(grid_x, grid_y, value)
+    
+    def draw_pixels(self, points, color=None, make_transparent=False):
+        """Draw many pixels as one batched write that undoes as one step"""
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        xs, ys = points[:, 0], points[:, 1]
+        if self.tiling_var.get():
+            # Parts that cross an edge continue on the other side
+            xs, ys = xs % self.grid_width, ys % self.grid_height
         else:
-            # Draw colored pixel
-            if color is None:
-                color = self.current_color
-                
-            x1 = grid_x * self.pixel_size
-            y1 = grid_y * self.pixel_size
-            x2 = x1 + self.pixel_size
-            y2 = y1 + self.pixel_size
-            
-            # Don't draw white pixels as they represent transparency in the editor
-            if color != "white":
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=color, 
-                                           outline=color, tags=pixel_tag)
-                self.grid_data[(grid_x, grid_y)] = color
-            elif (grid_x, grid_y) in self.grid_data:
-                del self.grid_data[(grid_x, grid_y)]
+            inside = (xs >= 0) & (xs < self.grid_width) & (ys >= 0) & (ys < self.grid_height)
+            xs, ys = xs[inside], ys[inside]
+        if not len(xs):
+            return
+        
+        left, top = int(xs.min()), int(ys.min())
+        region = self.pixels[top:int(ys.max()) + 1, left:int(xs.max()) + 1].copy()
+        region[ys - top, xs - left] = self.get_color_value(color, make_transparent)
+        self.set_region(left, top, region)
+    
+    def get_region(self, rect):
+        """Return a copy of the pixels inside a (left, top, right, bottom) rectangle"""
+        return self.document.get_region(rect)
+    
+    def set_region(self, left, top, region, mask=None, record_undo=True):
+        """Write a block of pixels (only where mask is set) as one undoable step"""
+        change = self.document.set_region(left, top, region, mask)
+        if change is None or not record_undo:
+            return
+        x0, y0, before = change
+        height, width = before.shape
+        self.push_undo(x0, y0, before, self.pixels[y0:y0 + height, x0:x0 + width].copy())
+    
+    def replace_pixels(self, pixels, record_undo=True):
+        """Replace the whole grid, possibly with a different size, as one undoable step"""
+        if pixels.shape == self.pixels.shape:
+            self.set_region(0, 0, pixels, record_undo=record_undo)
+            return
+        
+        # The document keeps its identity, only its pixels are replaced
+        before = self.pixels
+        try:
+            self.document.set_pixels(pixels)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        if record_undo:
+            # No position means the step swaps the whole grid
+            self.push_undo(None, None, before, self.pixels.copy())
+    
+    def begin_stroke(self):
+        """Start collecting pixel changes into one undo step"""
+        # Blocks of (x, y, pixels before) in the order they were written
+        self.current_stroke = []
+        self.last_stamp = None
+        self.stroke_points = []
+    
+    def end_stroke(self):
+        """Finish the current undo step"""
+        stroke = self.current_stroke
+        self.current_stroke = None
+        if not stroke:
+            return
+        
+        left = min(x for x, _, _ in stroke)
+        top = min(y for _, y, _ in stroke)
+        right = max(x + block.shape[1] for x, _, block in stroke)
+        bottom = max(y + block.shape[0] for _, y, block in stroke)
+        after = self.get_region((left, top, right, bottom))
+        before = after.copy()
+        # Earlier blocks hold older colors, so they are written last
+        for x, y, block in reversed(stroke):
+            height, width = block.shape
+            before[y - top:y - top + height, x - left:x - left + width] = block
+        self.push_undo(left, top, before, after)
+    
+    def push_undo(self, left, top, before, after):
+        """Add an undo step that swaps a block of pixels"""
+        if np.array_equal(before, after):
+            return
+        self.undo_stack.append((left, top, before, after))
+        del self.undo_stack[:-self.max_undo]
+        self.redo_stack = []
+    
+    def undo(self, event=None):
+        """Undo the last change"""
+        self.commit_floating()
+        if self.undo_stack:
+            step = self.undo_stack.pop()
+            left, top, before, _ = step
+            if left is None:
+                self.replace_pixels(before, record_undo=False)
+            else:
+                self.set_region(left, top, before, record_undo=False)
+            self.redo_stack.append(step)
+    
+    def redo(self, event=None):
+        """Redo the last undone change"""
+        self.commit_floating()
+        if self.redo_stack:
+            step = self.redo_stack.pop()
+            left, top, _, after = step
+            if left is None:
+                self.replace_pixels(after, record_undo=False)
+            else:
+                self.set_region(left, top, after, record_undo=False)
+            self.undo_stack.append(step)
     
     def set_tool(self):
         """Set the current tool mode"""
@@ -196,6 +695,9 @@ class PixelArtEditor:
         self.is_erasing = False
         self.is_transparency_mode = False
         
+        if tool != "select":
+            self.commit_floating()
+        
         # Update cursor based on tool
         if tool == "draw":
             self.canvas.configure(cursor="pencil")
@@ -203,6 +705,10 @@ class PixelArtEditor:
             self.canvas.configure(cursor="dotbox")
         elif tool == "transparent":
             self.canvas.configure(cursor="hand2")
+        elif tool in SHAPE_TOOLS:
+            self.canvas.configure(cursor="crosshair")
+        elif tool == "select":
+            self.canvas.configure(cursor="tcross")
 
     def on_mouse_down(self, event):
         """Handle mouse button press"""
@@ -210,37 +716,501 @@ class PixelArtEditor:
         
         if tool == "draw":
             self.is_drawing = True
+            self.begin_stroke()
             self.apply_tool(event)
         elif tool == "erase":
             self.is_erasing = True
+            self.begin_stroke()
             self.apply_tool(event)
         elif tool == "transparent":
             self.is_transparency_mode = True
+            self.begin_stroke()
             self.apply_tool(event)
+        elif tool in SHAPE_TOOLS:
+            self.start_shape(event)
+        elif tool == "select":
+            self.start_selection(event)
 
     def on_mouse_drag(self, event):
         """Handle mouse drag"""
         if self.is_drawing or self.is_erasing or self.is_transparency_mode:
             self.apply_tool(event)
+        elif self.shape_start is not None:
+            self.update_shape_preview(event)
+        elif self.move_origin is not None:
+            self.move_floating(event)
+        elif self.selection_start is not None:
+            self.update_selection(event)
 
     def on_mouse_up(self, event):
         """Handle mouse button release"""
+        if self.shape_start is not None:
+            self.finish_shape(event)
+        elif self.is_drawing or self.is_erasing or self.is_transparency_mode:
+            self.end_stroke()
+        
+        self.selection_start = None
+        self.move_origin = None
         self.is_drawing = False
         self.is_erasing = False
         self.is_transparency_mode = False
 
     def apply_tool(self, event):
         """Apply the current tool at the mouse position"""
-        grid_x, grid_y = self.get_grid_position(event.x, event.y)
-        if grid_x is not None:
-            tool = self.tool_var.get()
+        if self.get_grid_position(event.x, event.y)[0] is None:
+            self.last_stamp = None
+            return
+        
+        # Unwrapped in tiling preview, so strokes can cross the edges
+        grid_x, grid_y = self.get_shape_position(event.x, event.y)
+        tool = self.tool_var.get()
+        if tool == "draw":
+            value = self.current_color
+        elif tool == "erase":
+            value = TRANSPARENT  # Erased = transparent
+        else:
+            value = self.get_color_value(make_transparent=True)
+        
+        mask = self.get_brush_mask()
+        pixel_perfect = self.pixel_perfect_var.get() and mask.shape == (1, 1)
+        
+        # Stamp every cell since the last event, so fast drags leave no gaps
+        if self.last_stamp is None:
+            points = [(grid_x, grid_y)]
+        else:
+            points = line_points(*self.last_stamp, grid_x, grid_y)[1:]
+        self.last_stamp = (grid_x, grid_y)
+        
+        for x, y in points:
+            self.stamp(x, y, value, mask)
+            if pixel_perfect:
+                self.stroke_points.append((x, y))
+                if len(self.stroke_points) >= 3 and is_corner(*self.stroke_points[-3:]):
+                    self.restore_stroke_cell(*self.stroke_points.pop(-2))
+    
+    def get_brush_mask(self):
+        """Return the cached mask of the current brush"""
+        shape = self.brush_shape_var.get()
+        if shape == "custom" and self.custom_brush is not None:
+            return self.custom_brush
+        try:
+            size = self.brush_size_var.get()
+        except (tk.TclError, ValueError):
+            size = 1
+        return brush_mask("square" if shape == "square" else "round", size)
+    
+    def stamp(self, grid_x, grid_y, value, mask):
+        """Paint a brush mask centered on a cell, as one write"""
+        height, width = mask.shape
+        left, top = grid_x - width // 2, grid_y - height // 2
+        region = np.full(mask.shape, value, dtype=PIXEL_DTYPE)
+        
+        positions = [(left, top)]
+        if self.tiling_var.get():
+            # Parts that cross an edge continue on the other side
+            positions = [(left + dx, top + dy)
+                         for dy in (-self.grid_height, 0, self.grid_height)
+                         for dx in (-self.grid_width, 0, self.grid_width)]
+        for x, y in positions:
+            change = self.document.set_region(x, y, region, mask)
+            if change is not None and self.current_stroke is not None:
+                self.current_stroke.append(change)
+    
+    def restore_stroke_cell(self, grid_x, grid_y):
+        """Put back the color a cell had before the current stroke (pixel-perfect corners)"""
+        grid_x %= self.grid_width
+        grid_y %= self.grid_height
+        for x, y, block in self.current_stroke:
+            height, width = block.shape
+            if x <= grid_x < x + width and y <= grid_y < y + height:
+                self.document.set_pixel(grid_x, grid_y, int(block[grid_y - y, grid_x - x]))
+                return
+    
+    def set_custom_brush(self):
+        """Use the opaque selected pixels as the shape of the custom brush"""
+        if self.floating is not None:
+            pixels = self.floating.pixels
+        elif self.selection is not None:
+            pixels = self.get_region(self.selection)
+        else:
+            messagebox.showwarning("No Selection", "Select the pixels to use as a brush first.")
+            return
+        
+        if not pixels.any():
+            messagebox.showwarning("Empty Selection", "The selection has no pixels to use as a brush.")
+            return
+        self.custom_brush = stamp_mask(transforms.crop_to_content(pixels))
+        self.brush_shape_var.set("custom")
+
+    def start_shape(self, event):
+        """Start a line, rectangle or ellipse and create its preview item"""
+        if self.get_grid_position(event.x, event.y)[0] is None:
+            return
+        
+        grid_x, grid_y = self.get_shape_position(event.x, event.y)
+        self.shape_start = (grid_x, grid_y)
+        self.shape_end = (grid_x, grid_y)
+        
+        tool = self.tool_var.get()
+        filled = self.fill_shapes_var.get()
+        coords = self.get_preview_coords(grid_x, grid_y, grid_x, grid_y)
+        color = to_hex(self.current_color)
+        
+        # One overlay item that is only moved while dragging
+        if tool == "line":
+            self.shape_preview = self.canvas.create_line(
+                *coords, fill=color, width=self.pixel_size, capstyle=tk.PROJECTING, tags="preview")
+        elif tool == "rectangle":
+            self.shape_preview = self.canvas.create_rectangle(
+                *coords, fill=color if filled else "", outline=color,
+                width=0 if filled else self.pixel_size, tags="preview")
+        else:
+            self.shape_preview = self.canvas.create_oval(
+                *coords, fill=color if filled else "", outline=color,
+                width=0 if filled else self.pixel_size, tags="preview")
+    
+    def update_shape_preview(self, event):
+        """Move the preview item to follow the mouse"""
+        grid_x, grid_y = self.get_shape_position(event.x, event.y)
+        if (grid_x, grid_y) == self.shape_end:
+            return
+        
+        self.shape_end = (grid_x, grid_y)
+        start_x, start_y = self.shape_start
+        self.canvas.coords(self.shape_preview, *self.get_preview_coords(start_x, start_y, grid_x, grid_y))
+    
+    def finish_shape(self, event):
+        """Remove the preview and commit the shape to the grid"""
+        self.update_shape_preview(event)
+        self.canvas.delete(self.shape_preview)
+        
+        start_x, start_y = self.shape_start
+        end_x, end_y = self.shape_end
+        self.shape_preview = None
+        self.shape_start = None
+        self.shape_end = None
+        
+        self.draw_pixels(self.get_shape_points(start_x, start_y, end_x, end_y))
+    
+    def get_shape_points(self, x0, y0, x1, y1):
+        """Get the grid cells covered by the current shape tool"""
+        tool = self.tool_var.get()
+        filled = self.fill_shapes_var.get()
+        
+        if tool == "line":
+            return line_points(x0, y0, x1, y1)
+        elif tool == "rectangle":
+            return rectangle_points(x0, y0, x1, y1, filled)
+        return ellipse_points(x0, y0, x1, y1, filled)
+    
+    def get_preview_coords(self, x0, y0, x1, y1):
+        """Get canvas coordinates for the preview item of the current shape tool"""
+        size = self.pixel_size
+        
+        if self.tool_var.get() == "line":
+            # Line between cell centers, projecting caps cover the end cells
+            half = size / 2
+            return (x0 * size + half, y0 * size + half, x1 * size + half, y1 * size + half)
+        
+        left, right = min(x0, x1), max(x0, x1)
+        top, bottom = min(y0, y1), max(y0, y1)
+        
+        # Outlines are centered on the coordinates, so inset them by half a cell
+        inset = 0 if self.fill_shapes_var.get() else size / 2
+        return (left * size + inset, top * size + inset,
+                (right + 1) * size - inset, (bottom + 1) * size - inset)
+
+    def get_unclamped_grid_position(self, x, y):
+        """Convert canvas coordinates to grid coordinates that may lie outside the grid"""
+        return (int(self.canvas.canvasx(x) // self.pixel_size),
+                int(self.canvas.canvasy(y) // self.pixel_size))
+    
+    def start_selection(self, event):
+        """Start a marquee selection, or start moving the selected pixels"""
+        grid_x, grid_y = self.get_unclamped_grid_position(event.x, event.y)
+        
+        if self.floating is None and self.selection is not None:
+            left, top, right, bottom = self.selection
+            if left <= grid_x < right and top <= grid_y < bottom and not self.lift_selection():
+                return
+        
+        if self.floating is not None and self.floating.contains(grid_x, grid_y):
+            self.move_origin = (grid_x, grid_y, self.floating.x, self.floating.y)
+            return
+        
+        self.commit_floating()
+        grid_x, grid_y = self.get_clamped_grid_position(event.x, event.y)
+        self.selection_start = (grid_x, grid_y)
+        self.set_selection((grid_x, grid_y, grid_x + 1, grid_y + 1))
+    
+    def update_selection(self, event):
+        """Resize the marquee to follow the mouse"""
+        grid_x, grid_y = self.get_clamped_grid_position(event.x, event.y)
+        start_x, start_y = self.selection_start
+        self.set_selection(normalize_rect(start_x, start_y, grid_x, grid_y))
+    
+    def set_selection(self, rect):
+        """Select a (left, top, right, bottom) rectangle, or nothing if rect is None"""
+        self.selection = rect
+        if rect is None:
+            self.canvas.delete("selection")
+            self.selection_item = None
+            return
+        
+        size = self.pixel_size
+        left, top, right, bottom = rect
+        coords = (left * size, top * size, right * size, bottom * size)
+        if self.selection_item is None:
+            self.selection_item = self.canvas.create_rectangle(
+                *coords, outline="black", dash=(4, 2), width=2, tags="selection")
+        else:
+            self.canvas.coords(self.selection_item, *coords)
+            self.canvas.tag_raise(self.selection_item)
+    
+    def can_float(self, width, height):
+        """Whether pixels are small enough to float, their overlay is a single zoomed image"""
+        if max(width, height) * self.pixel_size <= MAX_BITMAP_SIZE:
+            return True
+        # Lifting would also copy and clear all of it, on a mapped file every page
+        messagebox.showwarning("Selection Too Large",
+                               f"Selections over {MAX_BITMAP_SIZE // self.pixel_size} pixels across "
+                               "cannot be moved or transformed.")
+        return False
+    
+    def lift_selection(self):
+        """Turn the selected pixels into a floating selection that can be moved, returns whether it could"""
+        left, top, right, bottom = self.selection
+        if not self.can_float(right - left, bottom - top):
+            return False
+        pixels = self.get_region(self.selection)
+        
+        # The hole is not an undo step of its own, the commit records the whole move
+        self.set_region(left, top, np.zeros_like(pixels), record_undo=False)
+        self.show_floating(FloatingSelection(pixels, left, top, source=(left, top, pixels)))
+        return True
+    
+    def show_floating(self, floating):
+        """Show a floating selection as one overlay bitmap"""
+        self.floating = floating
+        self.floating_photo = photo_from_pixels(self.canvas, floating.pixels, self.pixel_size)
+        self.floating_item = self.canvas.create_image(
+            floating.x * self.pixel_size, floating.y * self.pixel_size,
+            anchor=tk.NW, image=self.floating_photo, tags="floating")
+        self.set_selection(floating.rect)
+    
+    def move_floating(self, event):
+        """Drag the floating selection, only the overlay item moves"""
+        grid_x, grid_y = self.get_unclamped_grid_position(event.x, event.y)
+        start_x, start_y, floating_x, floating_y = self.move_origin
+        new_x = floating_x + grid_x - start_x
+        new_y = floating_y + grid_y - start_y
+        if (new_x, new_y) == (self.floating.x, self.floating.y):
+            return
+        
+        self.floating.x = new_x
+        self.floating.y = new_y
+        self.canvas.coords(self.floating_item, new_x * self.pixel_size, new_y * self.pixel_size)
+        self.set_selection(self.floating.rect)
+    
+    def commit_floating(self):
+        """Drop the floating selection onto the grid as one undo step"""
+        floating = self.floating
+        if floating is None:
+            return
+        
+        self.floating = None
+        self.canvas.delete(self.floating_item)
+        self.floating_item = None
+        self.floating_photo = None
+        
+        # One undo step covering both where the pixels came from and where they landed
+        rect = floating.rect
+        if floating.source is not None:
+            source_x, source_y, source_pixels = floating.source
+            source_height, source_width = source_pixels.shape
+            rect = (min(rect[0], source_x), min(rect[1], source_y),
+                    max(rect[2], source_x + source_width), max(rect[3], source_y + source_height))
+        rect = clip_rect(rect, self.grid_width, self.grid_height)
+        
+        if rect is not None:
+            left, top, right, bottom = rect
+            before = self.get_region(rect)
+            if floating.source is not None:
+                before[source_y - top:source_y - top + source_height,
+                       source_x - left:source_x - left + source_width] = source_pixels
             
-            if tool == "draw":
-                self.draw_pixel_at(grid_x, grid_y)
-            elif tool == "erase":
-                self.draw_pixel_at(grid_x, grid_y, "white")  # White = erased
-            elif tool == "transparent":
-                self.draw_pixel_at(grid_x, grid_y, make_transparent=True)
+            # Transparent pixels of the selection don't cover what is underneath
+            self.set_region(floating.x, floating.y, floating.pixels,
+                            mask=floating.pixels != TRANSPARENT, record_undo=False)
+            self.push_undo(left, top, before, self.get_region(rect))
+        
+        self.set_selection(clip_rect(floating.rect, self.grid_width, self.grid_height))
+    
+    def copy_selection(self, event=None):
+        """Copy the selected pixels to the clipboard"""
+        if self.floating is not None:
+            # Only the lifted pixels, not what is underneath them
+            clipboard.push(self.floating.pixels)
+            return
+        if self.selection is not None:
+            clipboard.push(self.get_region(self.selection))
+    
+    def cut_selection(self, event=None):
+        """Copy the selected pixels to the clipboard and clear them"""
+        self.copy_selection()
+        self.delete_selection()
+    
+    def delete_selection(self, event=None):
+        """Clear the selected pixels"""
+        if self.floating is not None:
+            # Dropping nothing leaves the hole the pixels were lifted from
+            self.floating.pixels = np.zeros_like(self.floating.pixels)
+            self.commit_floating()
+            return
+        if self.selection is not None:
+            left, top, right, bottom = self.selection
+            self.set_region(left, top, np.zeros((bottom - top, right - left), dtype=PIXEL_DTYPE))
+    
+    def paste(self, event=None, index=0):
+        """Paste a clipboard entry as a floating selection"""
+        pixels = clipboard.get(index)
+        if pixels is None or not self.can_float(pixels.shape[1], pixels.shape[0]):
+            return
+        
+        self.commit_floating()
+        if self.selection is not None:
+            left, top = self.selection[0], self.selection[1]
+        else:
+            # Top left corner of the visible part of the grid
+            left, top = self.get_clamped_grid_position(0, 0)
+        
+        self.tool_var.set("select")
+        self.set_tool()
+        self.show_floating(FloatingSelection(pixels.copy(), left, top))
+    
+    def update_clipboard_menu(self):
+        """List the clipboard entries in the Paste From Clipboard menu"""
+        self.clipboard_menu.delete(0, tk.END)
+        if not len(clipboard):
+            self.clipboard_menu.add_command(label="(empty)", state=tk.DISABLED)
+        for index, pixels in enumerate(clipboard.items):
+            height, width = pixels.shape
+            self.clipboard_menu.add_command(label=f"{index + 1}: {width}x{height}",
+                                            command=lambda i=index: self.paste(index=i))
+    
+    def select_all(self, event=None):
+        """Select the whole grid"""
+        self.commit_floating()
+        self.set_selection((0, 0, self.grid_width, self.grid_height))
+    
+    def deselect(self, event=None):
+        """Drop any floating pixels and clear the selection"""
+        self.commit_floating()
+        self.set_selection(None)
+
+    def apply_transform(self, transform):
+        """Run a transform on the selection, or on the whole grid if nothing is selected"""
+        if self.floating is None and self.selection is None:
+            self.replace_pixels(transform(self.pixels))
+            return
+        
+        # Selected pixels float while transformed so a changed shape can still be placed
+        if self.floating is None and not self.lift_selection():
+            return
+        floating = self.floating
+        self.canvas.delete(self.floating_item)
+        floating.pixels = transform(floating.pixels)
+        self.show_floating(floating)
+    
+    def reduce_colors(self):
+        """Map the selection or the grid onto the palette or onto an extracted palette"""
+        self.commit_floating()
+        if not self.pixels.any():
+            messagebox.showwarning("Nothing to Reduce", "The canvas is empty!")
+            return
+        
+        reduce_dialog = ReduceColorsDialog(self.root, len(self.palette))
+        self.root.wait_window(reduce_dialog.dialog)
+        if not reduce_dialog.result:
+            return
+        
+        source, size, method, dither = reduce_dialog.result
+        palette = None
+        if source == "palette":
+            palette = np.array(self.palette, dtype=PIXEL_DTYPE)
+        
+        rect = self.selection or (0, 0, self.grid_width, self.grid_height)
+        try:
+            reduced = quantize(self.get_region(rect), palette, size, method, dither)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Could not reduce colors: {str(e)}")
+            return
+        self.set_region(rect[0], rect[1], reduced)
+    
+    def fill_mask(self, mask, value):
+        """Paint the cells set in a grid-sized mask with a packed color as one undoable step"""
+        rect = mask_bounds(mask)
+        if rect is None:
+            return
+        left, top, right, bottom = rect
+        self.set_region(left, top, np.full((bottom - top, right - left), value, dtype=PIXEL_DTYPE),
+                        mask[top:bottom, left:right])
+    
+    def fill_with_color(self):
+        """Paint the selection or the whole grid with the current color"""
+        self.commit_floating()
+        left, top, right, bottom = self.selection or (0, 0, self.grid_width, self.grid_height)
+        self.set_region(left, top, np.full((bottom - top, right - left), self.current_color, dtype=PIXEL_DTYPE))
+    
+    def replace_current_color(self):
+        """Change every pixel of the current color to another color"""
+        self.commit_floating()
+        color = colorchooser.askcolor(color=to_hex(self.current_color), title="Replace With")[1]
+        if not color:
+            return
+        self.fill_mask(self.document.color_mask(self.current_color), pack_color(color))
+        self.set_color(color)
+    
+    def select_current_color(self):
+        """Lift every pixel of the current color into a floating selection"""
+        self.commit_floating()
+        mask = self.document.color_mask(self.current_color)
+        rect = mask_bounds(mask)
+        if rect is None:
+            self.set_selection(None)
+            return
+        
+        left, top, right, bottom = rect
+        if not self.can_float(right - left, bottom - top):
+            return
+        region = self.get_region(rect)
+        selected = mask[top:bottom, left:right]
+        # The hole is not an undo step of its own, the commit records the whole move
+        self.set_region(left, top, np.zeros_like(region), mask=selected, record_undo=False)
+        self.tool_var.set("select")
+        self.set_tool()
+        self.show_floating(FloatingSelection(np.where(selected, region, TRANSPARENT).astype(PIXEL_DTYPE),
+                                             left, top, source=(left, top, region)))
+    
+    def flip_horizontal(self):
+        """Mirror the selection or the grid left to right"""
+        self.apply_transform(transforms.flip_horizontal)
+    
+    def flip_vertical(self):
+        """Mirror the selection or the grid top to bottom"""
+        self.apply_transform(transforms.flip_vertical)
+    
+    def rotate(self, quarter_turns=1):
+        """Rotate the selection or the grid clockwise by 90 degree steps"""
+        self.apply_transform(lambda pixels: transforms.rotate(pixels, quarter_turns))
+    
+    def shift(self, dx, dy):
+        """Move the selection or grid contents, wrapping around the edges"""
+        self.apply_transform(lambda pixels: transforms.shift(pixels, dx, dy))
+    
+    def scale(self, factor):
+        """Enlarge the selection or the grid by a whole number factor"""
+        self.apply_transform(lambda pixels: transforms.scale(pixels, factor))
 
     # Keep old methods for backwards compatibility but make them use new system
     def start_drawing(self, event):
@@ -259,67 +1229,80 @@ class PixelArtEditor:
 
     def choose_color(self):
         """Open color chooser dialog"""
-        color = colorchooser.askcolor(color=self.current_color)[1]
+        color = colorchooser.askcolor(color=to_hex(self.current_color))[1]
         if color:
             self.set_color(color)
+            if self.current_color not in self.palette:
+                self.palette.append(self.current_color)
     
     def set_color(self, color):
-        """Set the current drawing color"""
+        """Set the current drawing color from a color string or a packed color"""
+        if isinstance(color, str):
+            color = pack_color(color)
         self.current_color = color
-        self.color_display.config(bg=color)
+        self.color_display.config(bg=to_hex(color))
     
     def clear_grid(self):
         """Clear all pixels"""
         if messagebox.askyesno("Clear Grid", "Are you sure you want to clear all pixels?"):
-            self.grid_data = {}
-            self.canvas.delete("pixel")
-            # Recreate grid to ensure it's on top
-            for item in self.canvas.find_withtag("grid"):
-                self.canvas.tag_raise(item)
+            self.commit_floating()
+            self.set_region(0, 0, np.zeros_like(self.pixels))
     
     def change_grid_size(self, event=None):
-        """Change the grid size"""
-        size_str = event.widget.get()
+        """Change the grid size, keeping the artwork"""
+        size_str = self.size_var.get()
         try:
             width, height = map(int, size_str.split('x'))
-            self.grid_width = width
-            self.grid_height = height
-            self.create_grid()
+            if width < 1 or height < 1:
+                raise ValueError(size_str)
         except ValueError:
             messagebox.showerror("Invalid Size", "Please enter size in format WIDTHxHEIGHT")
+            self.size_var.set(f"{self.grid_width}x{self.grid_height}")
+            return
+        
+        if (width, height) == (self.grid_width, self.grid_height):
+            return
+        
+        self.commit_floating()
+        if not self.pixels.any():
+            # Nothing to keep, no need to ask how
+            self.resize_grid(width, height)
+            return
+        
+        resize_dialog = ResizeDialog(self.root)
+        self.root.wait_window(resize_dialog.dialog)
+        
+        if resize_dialog.result:
+            mode, anchor = resize_dialog.result
+            self.resize_grid(width, height, mode, anchor)
+        else:
+            self.size_var.set(f"{self.grid_width}x{self.grid_height}")
+    
+    def resize_grid(self, width, height, mode="crop", anchor="center"):
+        """Resize the grid by cropping/padding around an anchor or by rescaling the artwork"""
+        if mode == "scale":
+            pixels = transforms.rescale(self.pixels, width, height)
+        else:
+            pixels = transforms.resize_canvas(self.pixels, width, height, anchor)
+        self.replace_pixels(pixels)
+    
+    def crop_to_content(self):
+        """Shrink the grid to the bounding box of the artwork"""
+        self.commit_floating()
+        if transforms.content_bounds(self.pixels) is None:
+            messagebox.showwarning("Nothing to Crop", "The canvas is empty!")
+            return
+        self.set_selection(None)
+        self.replace_pixels(transforms.crop_to_content(self.pixels))
     
     def create_image(self, scale_factor=1, transparent_bg=False):
         """Create a PIL Image from the grid data"""
-        # Calculate image size
-        img_width = self.grid_width * scale_factor
-        img_height = self.grid_height * scale_factor
-        
-        # Create image with transparent or white background
-        if transparent_bg:
-            # Create image with transparent background (RGBA mode)
-            image = Image.new('RGBA', (img_width, img_height), (0, 0, 0, 0))
-        else:
-            # Create image with white background (RGB mode)
-            image = Image.new('RGB', (img_width, img_height), 'white')
-        
-        draw = ImageDraw.Draw(image)
-        
-        # Draw each pixel
-        for (grid_x, grid_y), color in self.grid_data.items():
-            # Calculate pixel position in the image
-            x1 = grid_x * scale_factor
-            y1 = grid_y * scale_factor
-            x2 = x1 + scale_factor
-            y2 = y1 + scale_factor
-            
-            # Draw the pixel (rectangle)
-            draw.rectangle([x1, y1, x2-1, y2-1], fill=color)
-        
-        return image
+        return export.create_image(self.pixels, scale_factor, transparent_bg)
     
     def export_png(self):
         """Export the pixel art as PNG with transparency option"""
-        if not self.grid_data:
+        self.commit_floating()
+        if not self.pixels.any():
             messagebox.showwarning("Nothing to Export", "The canvas is empty!")
             return
         
@@ -338,15 +1321,13 @@ class PixelArtEditor:
                     scale_factor, transparent_bg = export_dialog.result
                     print(f"Exporting with scale: {scale_factor}, transparent: {transparent_bg}")
                     
-                    image = self.create_image(scale_factor, transparent_bg)
-                    print(f"Created image: {image.size}, mode: {image.mode}")  
-                    
-                    image.save(filename, 'PNG')
-                    print(f"Saved to: {filename}")  
+                    # Sprites with 256 colors or less get a palette PNG, the usage index knows without a scan
+                    image = self.document.export(filename, "png", scale_factor, transparent_bg)
                     
                     bg_type = "transparent" if transparent_bg else "white"
+                    colors = "palette" if image.mode == "P" else "true color"
                     messagebox.showinfo("Success", 
-                        f"PNG exported successfully!\nSize: {image.width}x{image.height}\nBackground: {bg_type}")
+                        f"PNG exported successfully!\nSize: {image.width}x{image.height}\nBackground: {bg_type}\nColors: {colors}")
                 else:
                     print("Export canceled by user")  
                     
@@ -356,7 +1337,8 @@ class PixelArtEditor:
     
     def export_jpeg(self):
         """Export the pixel art as JPEG (no transparency support)"""
-        if not self.grid_data:
+        self.commit_floating()
+        if not self.pixels.any():
             messagebox.showwarning("Nothing to Export", "The canvas is empty!")
             return
         
@@ -386,29 +1368,57 @@ class PixelArtEditor:
             except Exception as e:
                 messagebox.showerror("Error", f"Could not export JPEG: {str(e)}")
     
+    def export_raw(self):
+        """Export raw pixel data (binary, C header or Python bytes) for game engines"""
+        self.commit_floating()
+        if not self.pixels.any():
+            messagebox.showwarning("Nothing to Export", "The canvas is empty!")
+            return
+        
+        raw_dialog = RawExportDialog(self.root)
+        self.root.wait_window(raw_dialog.dialog)
+        if not raw_dialog.result:
+            return
+        encoding, container = raw_dialog.result
+        
+        extension = export.RAW_EXTENSIONS[container]
+        filename = filedialog.asksaveasfilename(
+            defaultextension=extension,
+            filetypes=[(f"{container} files", "*" + extension), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        
+        try:
+            export.export_raw(self.pixels, filename, encoding, container)
+            messagebox.showinfo("Success",
+                f"Raw data exported successfully!\nSize: {self.grid_width}x{self.grid_height}\nEncoding: {encoding}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not export raw data: {str(e)}")
+    
     def save_art(self):
         """Save the pixel art to a JSON file"""
-        if not self.grid_data:
+        self.commit_floating()
+        if self.document.mapped:
+            # The file already is the pixel store, only changed pages need writing
+            self.document.flush()
+            messagebox.showinfo("Success", "Pixel art saved successfully!")
+            return
+        
+        if not self.pixels.any():
             messagebox.showwarning("Nothing to Save", "The canvas is empty!")
             return
             
         filename = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("JSON files", "*.json"), ("Binary art files", "*" + BINARY_EXTENSION),
+                       ("All files", "*.*")]
         )
         
         if filename:
             try:
-                save_data = {
-                    'grid_width': self.grid_width,
-                    'grid_height': self.grid_height,
-                    'pixel_size': self.pixel_size,
-                    'pixels': {f"{x},{y}": color for (x, y), color in self.grid_data.items()}
-                }
-                
-                with open(filename, 'w') as f:
-                    json.dump(save_data, f, indent=2)
-                    
+                self.document.save(filename, self.pixel_size)
+                self.set_filename(filename)
                 messagebox.showinfo("Success", "Pixel art saved successfully!")
             except Exception as e:
                 messagebox.showerror("Error", f"Could not save file: {str(e)}")
@@ -416,18 +1426,412 @@ class PixelArtEditor:
     def load_art(self):
         """Load pixel art from a JSON file"""
         filename = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("Art files", "*.json *" + BINARY_EXTENSION), ("All files", "*.*")]
         )
         
-        if filename:
+        if filename and self.open_art(filename):
+            messagebox.showinfo("Success", "Pixel art loaded successfully!")
+    
+    def open_art(self, filename):
+        """Load pixel art from a file, returning whether it worked.
+        
+        Binary art files are memory-mapped rather than read.
+        """
+        try:
+            if filename.lower().endswith(BINARY_EXTENSION):
+                document = PixelDocument.open_mapped(filename)
+            else:
+                document = PixelDocument(pixels=read_art(filename))
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not load file: {str(e)}")
+            return False
+        
+        if self.filename is None and not self.pixels.any():
+            # Reuse a blank tab
+            self.set_document(document)
+        else:
+            self.new_tab(document)
+        self.set_filename(filename)
+        return True
+    
+    def new_mapped_document(self):
+        """Create a memory-mapped binary art file for a document too big to keep in memory"""
+        width = simpledialog.askinteger("New Large Document", "Width in pixels:",
+                                        initialvalue=4096, minvalue=1, maxvalue=65536)
+        if width is None:
+            return
+        height = simpledialog.askinteger("New Large Document", "Height in pixels:",
+                                         initialvalue=width, minvalue=1, maxvalue=65536)
+        if height is None:
+            return
+        filename = filedialog.asksaveasfilename(
+            defaultextension=BINARY_EXTENSION,
+            filetypes=[("Binary art files", "*" + BINARY_EXTENSION), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        
+        try:
+            document = PixelDocument.create_mapped(filename, width, height)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not create file: {str(e)}")
+            return
+        self.new_tab(document)
+        self.set_filename(filename)
+    
+    def set_filename(self, filename):
+        """Remember the file of the artwork, and watch it in watch mode"""
+        self.filename = os.path.abspath(filename)
+        self.active_tab.filename = self.filename
+        self.tab_bar.tab(self.active_tab.frame, text=self.tab_title(self.active_tab))
+        self.update_watched_files()
+    
+    def update_watched_files(self):
+        if self.watcher is not None:
+            self.watcher.set_files([tab.filename for tab in self.tabs if tab.filename])
+    
+    def toggle_watch(self):
+        """Start or stop reloading the open file and re-exporting when files change"""
+        if not self.watch_var.get():
+            self.watcher.stop()
+            self.watcher = None
+            self.build_runner = None
+            # Turning watch on again must not leave two polling loops running
+            if self.watch_poll is not None:
+                self.root.after_cancel(self.watch_poll)
+                self.watch_poll = None
+            return
+        
+        manifest = filedialog.askopenfilename(
+            title="Build manifest to re-export on changes (cancel for none)",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        self.watcher = FileWatcher(self.watch_changes.put)
+        self.update_watched_files()
+        if manifest:
             try:
-                with open(filename, 'r') as f:
-                    save_data = json.load(f)
-                
-                messagebox.showinfo("Success", "Pixel art loaded successfully!")
-                
+                self.watcher.add_manifest(manifest)
             except Exception as e:
-                messagebox.showerror("Error", f"Could not load file: {str(e)}")
+                messagebox.showerror("Error", f"Could not read build manifest: {str(e)}")
+            else:
+                self.build_runner = BuildRunner(manifest)
+                self.build_runner.request()
+        self.watcher.start()
+        self.watch_poll = self.root.after(200, self.poll_watcher)
+    
+    def poll_watcher(self):
+        """Handle changes reported by the watcher thread"""
+        if self.watcher is None:
+            return
+        
+        changed = set()
+        while True:
+            try:
+                changed.update(self.watch_changes.get_nowait())
+            except queue.Empty:
+                break
+        
+        for tab in self.tabs:
+            if tab.filename not in changed:
+                continue
+            if tab is self.active_tab:
+                self.reload_art()
+            else:
+                self.reload_tab(tab)
+        if changed and self.build_runner is not None:
+            self.build_runner.request()
+        self.watch_poll = self.root.after(200, self.poll_watcher)
+    
+    def reload_tab(self, tab):
+        """Bring in changes to the file of an inactive tab, as one undo step of that tab"""
+        try:
+            pixels = read_art(tab.filename)
+        except Exception:
+            return
+        before = tab.document.pixels.copy()
+        if np.array_equal(before, pixels):
+            return
+        try:
+            tab.document.set_pixels(pixels)
+        except ValueError:
+            return
+        if not tab.document.mapped:
+            tab.journal.record_reset(tab.document.width, tab.document.height, pixels)
+        tab.undo_stack.append((None, None, before, pixels))
+        del tab.undo_stack[:-self.max_undo]
+        tab.redo_stack.clear()
+    
+    def reload_art(self):
+        """Bring in changes another program made to the open file, redrawing only the pixels that differ"""
+        try:
+            pixels = read_art(self.filename)
+        except Exception:
+            # Keep the current artwork if the file cannot be read
+            return
+        
+        self.commit_floating()
+        if pixels.shape != self.pixels.shape:
+            self.replace_pixels(pixels)
+            return
+        
+        changed = pixels != self.pixels
+        if not changed.any():
+            return
+        ys, xs = np.nonzero(changed)
+        left, top = int(xs.min()), int(ys.min())
+        right, bottom = int(xs.max()) + 1, int(ys.max()) + 1
+        self.set_region(left, top, pixels[top:bottom, left:right], mask=changed[top:bottom, left:right])
+    
+    def open_project(self):
+        """Browse all sprites in a directory tree"""
+        directory = filedialog.askdirectory()
+        if directory:
+            ProjectBrowser(self, directory)
+    
+    def load_pixels(self, pixels):
+        """Start over with a new grid holding the given packed colors"""
+        self.set_document(PixelDocument(pixels=pixels))
+    
+    def import_image(self):
+        """Import a raster image, downsampled to the grid"""
+        filename = filedialog.askopenfilename(
+            filetypes=[("Image files", "*.png *.jpg *.jpeg *.gif *.bmp *.webp *.tif *.tiff"),
+                       ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        
+        import_dialog = ImportDialog(self.root)
+        self.root.wait_window(import_dialog.dialog)
+        if not import_dialog.result:
+            return
+        
+        method, alpha_threshold, keep_aspect = import_dialog.result
+        try:
+            rgba = load_rgba(filename)
+            width, height = self.grid_width, self.grid_height
+            if keep_aspect:
+                width, height = fit_size(rgba.shape[1], rgba.shape[0], width, height)
+            imported = downsample(rgba, width, height, method, alpha_threshold)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not import image: {str(e)}")
+            return
+        
+        # The image replaces the artwork, centered on the grid, as one undo step
+        self.commit_floating()
+        pixels = np.zeros_like(self.pixels)
+        left = (self.grid_width - width) // 2
+        top = (self.grid_height - height) // 2
+        pixels[top:top + height, left:left + width] = imported
+        self.set_region(0, 0, pixels)
+
+    def offer_recovery(self):
+        """Offer to restore unsaved work left behind by crashed sessions, each in its own tab"""
+        directory = self.journal.directory
+        sessions = AutosaveJournal.leftover_sessions(directory)
+        recovered = [pixels for pixels in (AutosaveJournal.recover(directory, session) for session in sessions)
+                     if pixels is not None]
+        if recovered and messagebox.askyesno(
+                "Recover Unsaved Work",
+                "The editor did not shut down cleanly last time.\n"
+                f"Do you want to recover the unsaved pixel art ({len(recovered)} documents)?"):
+            self.load_pixels(recovered[0])
+            for pixels in recovered[1:]:
+                self.new_tab(PixelDocument(pixels=pixels))
+        
+        # Recovered work is journaled again by the tabs of this session
+        for session in sessions:
+            AutosaveJournal.discard_session(directory, session)
+        self.journaling = True
+        for tab in self.tabs:
+            tab.journal.start()
+    
+    def open_tilemap_editor(self):
+        """Open a window for building levels out of sprites"""
+        TilemapEditor(self)
+    
+    def on_close(self):
+        """Shut down cleanly, discarding the crash recovery journal"""
+        if self.watcher is not None:
+            self.watcher.stop()
+        for tab in self.tabs:
+            tab.journal.close(discard=True)
+        self.root.destroy()
+
+class ResizeDialog:
+    """Dialog to ask how the artwork should be kept when the grid size changes"""
+    def __init__(self, parent):
+        self.result = None
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Resize Grid")
+        self.dialog.resizable(False, False)
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        self.dialog.geometry("+%d+%d" % (parent.winfo_rootx() + 50, parent.winfo_rooty() + 50))
+        
+        ttk.Label(self.dialog, text="Resize Grid", font=('Arial', 12, 'bold')).pack(pady=10)
+        
+        mode_frame = ttk.LabelFrame(self.dialog, text="Artwork", padding=10)
+        mode_frame.pack(pady=10, padx=20, fill='x')
+        
+        self.mode_var = tk.StringVar(value="crop")
+        ttk.Radiobutton(mode_frame, text="Crop / pad the canvas", 
+                       variable=self.mode_var, value="crop").pack(anchor='w')
+        ttk.Radiobutton(mode_frame, text="Scale the artwork (nearest neighbour)", 
+                       variable=self.mode_var, value="scale").pack(anchor='w')
+        
+        anchor_frame = ttk.LabelFrame(self.dialog, text="Anchor (crop / pad only)", padding=10)
+        anchor_frame.pack(pady=10, padx=20, fill='x')
+        
+        self.anchor_var = tk.StringVar(value="center")
+        anchor_grid = ttk.Frame(anchor_frame)
+        anchor_grid.pack()
+        for row, names in enumerate((("nw", "n", "ne"), ("w", "center", "e"), ("sw", "s", "se"))):
+            for column, name in enumerate(names):
+                ttk.Radiobutton(anchor_grid, variable=self.anchor_var,
+                               value=name).grid(row=row, column=column, padx=4, pady=4)
+        
+        button_frame = ttk.Frame(self.dialog)
+        button_frame.pack(pady=20)
+        
+        ttk.Button(button_frame, text="Resize", command=self.ok_clicked).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=self.cancel_clicked).pack(side=tk.LEFT, padx=5)
+        
+        self.dialog.bind('<Return>', lambda e: self.ok_clicked())
+        self.dialog.bind('<Escape>', lambda e: self.cancel_clicked())
+        self.dialog.focus_set()
+    
+    def ok_clicked(self):
+        self.result = (self.mode_var.get(), self.anchor_var.get())
+        self.dialog.destroy()
+    
+    def cancel_clicked(self):
+        self.result = None
+        self.dialog.destroy()
+
+class ImportDialog:
+    """Dialog to ask how an imported image should be reduced to the grid"""
+    def __init__(self, parent):
+        self.result = None
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Import Image")
+        self.dialog.resizable(False, False)
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        self.dialog.geometry("+%d+%d" % (parent.winfo_rootx() + 50, parent.winfo_rooty() + 50))
+        
+        ttk.Label(self.dialog, text="Import Options", font=('Arial', 12, 'bold')).pack(pady=10)
+        
+        method_frame = ttk.LabelFrame(self.dialog, text="Sampling", padding=10)
+        method_frame.pack(pady=10, padx=20, fill='x')
+        
+        self.method_var = tk.StringVar(value="box")
+        labels = {"box": "Box (average of each block)",
+                  "mode": "Mode (most common color of each block)",
+                  "nearest": "Nearest (center pixel of each block)"}
+        for method in IMPORT_METHODS:
+            ttk.Radiobutton(method_frame, text=labels[method], 
+                           variable=self.method_var, value=method).pack(anchor='w')
+        
+        alpha_frame = ttk.LabelFrame(self.dialog, text="Transparency", padding=10)
+        alpha_frame.pack(pady=10, padx=20, fill='x')
+        
+        ttk.Label(alpha_frame, text="Pixels less opaque than this become transparent:").pack(anchor='w')
+        self.alpha_var = tk.IntVar(value=128)
+        tk.Scale(alpha_frame, from_=1, to=255, orient=tk.HORIZONTAL,
+                 variable=self.alpha_var).pack(fill='x')
+        
+        self.keep_aspect_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(self.dialog, text="Keep aspect ratio", 
+                       variable=self.keep_aspect_var).pack(padx=20, anchor='w')
+        
+        button_frame = ttk.Frame(self.dialog)
+        button_frame.pack(pady=20)
+        
+        ttk.Button(button_frame, text="Import", command=self.ok_clicked).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=self.cancel_clicked).pack(side=tk.LEFT, padx=5)
+        
+        self.dialog.bind('<Return>', lambda e: self.ok_clicked())
+        self.dialog.bind('<Escape>', lambda e: self.cancel_clicked())
+        self.dialog.focus_set()
+    
+    def ok_clicked(self):
+        self.result = (self.method_var.get(), self.alpha_var.get(), self.keep_aspect_var.get())
+        self.dialog.destroy()
+    
+    def cancel_clicked(self):
+        self.result = None
+        self.dialog.destroy()
+
+class ReduceColorsDialog:
+    """Dialog to ask which palette to reduce to and how to dither"""
+    def __init__(self, parent, palette_size):
+        self.result = None
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Reduce Colors")
+        self.dialog.resizable(False, False)
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        self.dialog.geometry("+%d+%d" % (parent.winfo_rootx() + 50, parent.winfo_rooty() + 50))
+        
+        ttk.Label(self.dialog, text="Reduce Colors", font=('Arial', 12, 'bold')).pack(pady=10)
+        
+        palette_frame = ttk.LabelFrame(self.dialog, text="Palette", padding=10)
+        palette_frame.pack(pady=10, padx=20, fill='x')
+        
+        self.source_var = tk.StringVar(value="palette")
+        ttk.Radiobutton(palette_frame, text=f"Editor palette ({palette_size} colors)", 
+                       variable=self.source_var, value="palette").pack(anchor='w')
+        ttk.Radiobutton(palette_frame, text="Extract from the artwork", 
+                       variable=self.source_var, value="extract").pack(anchor='w')
+        
+        extract_frame = ttk.Frame(palette_frame)
+        extract_frame.pack(anchor='w', padx=(20, 0))
+        ttk.Label(extract_frame, text="Colors:").pack(side=tk.LEFT)
+        self.size_var = tk.IntVar(value=16)
+        ttk.Spinbox(extract_frame, from_=2, to=256, width=5,
+                   textvariable=self.size_var).pack(side=tk.LEFT, padx=5)
+        
+        self.method_var = tk.StringVar(value="median_cut")
+        labels = {"median_cut": "Median cut", "kmeans": "K-means"}
+        for method in PALETTE_METHODS:
+            ttk.Radiobutton(extract_frame, text=labels[method], 
+                           variable=self.method_var, value=method).pack(side=tk.LEFT, padx=2)
+        
+        dither_frame = ttk.LabelFrame(self.dialog, text="Dithering", padding=10)
+        dither_frame.pack(pady=10, padx=20, fill='x')
+        
+        self.dither_var = tk.StringVar(value="none")
+        labels = {"none": "None", "floyd_steinberg": "Floyd-Steinberg", "ordered": "Ordered (Bayer)"}
+        for dither in DITHER_METHODS:
+            ttk.Radiobutton(dither_frame, text=labels[dither], 
+                           variable=self.dither_var, value=dither).pack(anchor='w')
+        
+        button_frame = ttk.Frame(self.dialog)
+        button_frame.pack(pady=20)
+        
+        ttk.Button(button_frame, text="Reduce", command=self.ok_clicked).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=self.cancel_clicked).pack(side=tk.LEFT, padx=5)
+        
+        self.dialog.bind('<Return>', lambda e: self.ok_clicked())
+        self.dialog.bind('<Escape>', lambda e: self.cancel_clicked())
+        self.dialog.focus_set()
+    
+    def ok_clicked(self):
+        try:
+            size = min(max(self.size_var.get(), 2), 256)
+        except tk.TclError:
+            messagebox.showerror("Invalid Value", "Please enter a number of colors")
+            return
+        self.result = (self.source_var.get(), size, self.method_var.get(), self.dither_var.get())
+        self.dialog.destroy()
+    
+    def cancel_clicked(self):
+        self.result = None
+        self.dialog.destroy()
 
 class ExportDialog:
     """Enhanced dialog to ask user for export scale factor and transparency option"""
@@ -510,6 +1914,54 @@ class ExportDialog:
         self.result = None
         self.dialog.destroy()
 
+class RawExportDialog:
+    """Dialog to choose the pixel encoding and file type of a raw export"""
+    def __init__(self, parent):
+        self.result = None
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Raw Export Options")
+        self.dialog.resizable(False, False)
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        
+        self.dialog.geometry("+%d+%d" % (parent.winfo_rootx() + 50, parent.winfo_rooty() + 50))
+        
+        ttk.Label(self.dialog, text="Raw Export Options", font=('Arial', 12, 'bold')).pack(pady=10)
+        
+        encoding_frame = ttk.LabelFrame(self.dialog, text="Pixel Encoding", padding=10)
+        encoding_frame.pack(pady=10, padx=20, fill='x')
+        self.encoding_var = tk.StringVar(value=export.RAW_ENCODINGS[0])
+        ttk.Combobox(encoding_frame, textvariable=self.encoding_var, values=export.RAW_ENCODINGS,
+                     state="readonly").pack(fill='x')
+        ttk.Label(encoding_frame, text="(Indexed encodings need at most 256 or 16 colors)",
+                 font=('Arial', 8)).pack(pady=(5, 0))
+        
+        container_frame = ttk.LabelFrame(self.dialog, text="File Type", padding=10)
+        container_frame.pack(pady=10, padx=20, fill='x')
+        self.container_var = tk.StringVar(value=export.RAW_CONTAINERS[0])
+        for container, label in zip(export.RAW_CONTAINERS,
+                                    ("Binary file", "C header", "Python module")):
+            ttk.Radiobutton(container_frame, text=label,
+                           variable=self.container_var, value=container).pack(anchor='w')
+        
+        button_frame = ttk.Frame(self.dialog)
+        button_frame.pack(pady=20)
+        ttk.Button(button_frame, text="Export", command=self.ok_clicked).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=self.cancel_clicked).pack(side=tk.LEFT, padx=5)
+        
+        self.dialog.bind('<Return>', lambda e: self.ok_clicked())
+        self.dialog.bind('<Escape>', lambda e: self.cancel_clicked())
+        self.dialog.focus_set()
+        
+    def ok_clicked(self):
+        self.result = (self.encoding_var.get(), self.container_var.get())
+        self.dialog.destroy()
+        
+    def cancel_clicked(self):
+        self.result = None
+        self.dialog.destroy()
+
 def main():
     root = tk.Tk()
     app = PixelArtEditor(root)
@@ -0,0 +1,112 @@
+import numpy as np
+from PIL import Image
+
+from colors import PIXEL_DTYPE, TRANSPARENT
+
+IMPORT_METHODS = ("box", "mode", "nearest")
+
+
+def load_rgba(path):
+    """Open any image PIL can read as a (height, width, 4) byte array"""
+    with Image.open(path) as image:
+        return np.asarray(image.convert("RGBA"))
+
+
+def pack_rgba_array(rgba):
+    """Pack a (height, width, 4) byte array into packed colors"""
+    return np.ascontiguousarray(rgba, dtype=np.uint8).view(PIXEL_DTYPE)[:, :, 0]
+
+
+def block_edges(source_size, target_size):
+    """Start index of each source block that becomes one target pixel"""
+    return np.arange(target_size) * source_size // target_size
+
+
+def downsample(rgba, width, height, method="box", alpha_threshold=128):
+    """Reduce an RGBA image to width x height packed colors.
+
+    box averages every block (weighted by alpha), mode keeps the most common
+    color of every block and nearest takes the pixel at each block's center.
+    Pixels whose alpha ends up below alpha_threshold become transparent.
+    """
+    source_height, source_width = rgba.shape[:2]
+    if width > source_width or height > source_height:
+        # Enlarging is always nearest neighbour
+        method = "nearest"
+
+    if method == "nearest":
+        rows = ((np.arange(height) + 0.5) * source_height / height).astype(np.intp)
+        columns = ((np.arange(width) + 0.5) * source_width / width).astype(np.intp)
+        result = rgba[rows[:, None], columns].copy()
+    elif method == "box":
+        result = _box_downsample(rgba, width, height)
+    elif method == "mode":
+        return _mode_downsample(rgba, width, height, alpha_threshold)
+    else:
+        raise ValueError(f"Unknown import method: {method}")
+
+    # Pixel art has no partial transparency
+    opaque = result[:, :, 3] >= alpha_threshold
+    result[:, :, 3] = 255
+    packed = pack_rgba_array(result)
+    packed[~opaque] = TRANSPARENT
+    return packed
+
+
+def _box_downsample(rgba, width, height):
+    """Average every block, weighting colors by their alpha"""
+    rows = block_edges(rgba.shape[0], height)
+    columns = block_edges(rgba.shape[1], width)
+
+    alpha = rgba[:, :, 3].astype(np.float32)
+    weighted = rgba[:, :, :3] * alpha[:, :, None]
+
+    # Sums over uneven blocks in two passes
+    color_sums = np.add.reduceat(np.add.reduceat(weighted, rows, axis=0), columns, axis=1)
+    alpha_sums = np.add.reduceat(np.add.reduceat(alpha, rows, axis=0), columns, axis=1)
+
+    counts = np.diff(np.append(rows, rgba.shape[0]))[:, None] * np.diff(np.append(columns, rgba.shape[1]))
+    result = np.empty((height, width, 4), dtype=np.uint8)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result[:, :, :3] = np.nan_to_num(color_sums / alpha_sums[:, :, None]).round().clip(0, 255)
+    result[:, :, 3] = (alpha_sums / counts).round().clip(0, 255)
+    return result
+
+
+def _mode_downsample(rgba, width, height, alpha_threshold):
+    """Keep the most common color of every block"""
+    source_height, source_width = rgba.shape[:2]
+    packed = pack_rgba_array(rgba) | np.uint32(0xFF000000)
+    packed[rgba[:, :, 3] < alpha_threshold] = TRANSPARENT
+
+    # Number every pixel with its target cell and sort by (cell, color)
+    row_cells = np.repeat(np.arange(height), np.diff(np.append(block_edges(source_height, height), source_height)))
+    column_cells = np.repeat(np.arange(width), np.diff(np.append(block_edges(source_width, width), source_width)))
+    cells = (row_cells[:, None] * width + column_cells).astype(np.uint64)
+    keys = np.sort(((cells << np.uint64(32)) | packed.astype(np.uint64)).ravel())
+
+    # Run lengths of identical (cell, color) keys
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    lengths = np.diff(np.append(starts, len(keys)))
+    run_keys = keys[starts]
+    run_cells = (run_keys >> np.uint64(32)).astype(np.intp)
+
+    # Longest run per cell: order runs by (cell, length) and take the last of each cell
+    order = np.lexsort((lengths, run_cells))
+    last = np.flatnonzero(np.append(run_cells[order][1:] != run_cells[order][:-1], True))
+    best = order[last]
+
+    result = np.empty(height * width, dtype=PIXEL_DTYPE)
+    result[run_cells[best]] = (run_keys[best] & np.uint64(0xFFFFFFFF)).astype(PIXEL_DTYPE)
+    return result.reshape(height, width)
+
+
+def import_image(path, width, height, method="box", alpha_threshold=128):
+    """Load an image file and downsample it to width x height packed colors"""
+    return downsample(load_rgba(path), width, height, method, alpha_threshold)
+
+
+def fit_size(source_width, source_height, width, height):
+    """Largest size inside width x height with the source aspect ratio"""
+    ratio = min(width / source_width, height / source_height)
+    return max(1, round(source_width * ratio)), max(1, round(source_height * ratio))
@@ -0,0 +1,303 @@
+import os
+import queue
+import struct
+import threading
+import time
+import uuid
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from colors import PIXEL_DTYPE
+
+# Where crash-recovery data is kept between sessions
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".pixel_art_editor", "autosave")
+
+# Every session has its own files, named after the session
+JOURNAL_SUFFIX = ".journal"
+SNAPSHOT_SUFFIX = ".snapshot.npy"
+LOCK_SUFFIX = ".lock"
+
+# Each journal block is this header, (x, y, width, height), followed by width * height <u4 colors
+BLOCK_HEADER = struct.Struct("<4I")
+
+_STOP = object()
+
+
+def new_session():
+    """A session name no other editor process uses"""
+    return f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+
+
+def lock_file(f):
+    """Take an exclusive lock on an open file without waiting, returns whether it was taken.
+
+    The operating system drops the lock when the process exits, crashed or not.
+    """
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def apply_block(pixels, x, y, block):
+    """Write a block of colors into pixels, leaving out the part outside of it"""
+    height, width = pixels.shape
+    right = min(x + block.shape[1], width)
+    bottom = min(y + block.shape[0], height)
+    if x < right and y < bottom:
+        pixels[y:bottom, x:right] = block[:bottom - y, :right - x]
+
+
+class AutosaveJournal:
+    """Append-only journal of pixel edits, written by a background thread.
+
+    The UI thread only puts small tuples on a queue. The writer thread keeps
+    its own copy of the grid so it can write compacted snapshots without
+    touching editor state, and truncates the journal after each snapshot.
+    Edits are journaled as binary blocks of colors, so a region costs one
+    write of its bytes however many pixels it has.
+
+    Each session writes its own files and holds a lock on its lock file
+    while it runs, so editors running side by side never touch each
+    other's journal and recovery only picks up sessions that are gone.
+    """
+    def __init__(self, directory=DEFAULT_DIRECTORY, session=None, snapshot_interval=30.0, snapshot_ops=5000):
+        self.directory = directory
+        self.session = session or new_session()
+        self.journal_path, self.snapshot_path, self.lock_path = self.session_paths(directory, self.session)
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_ops = snapshot_ops
+
+        # Edits queue up here until the writer thread picks them up
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.lock = None
+
+        # Writer thread state - only touched from the writer thread
+        self._pixels = np.zeros((0, 0), dtype=PIXEL_DTYPE)
+        self._file = None
+        self._ops_since_snapshot = 0
+        self._last_snapshot = 0.0
+        self._last_sync = 0.0
+
+    def start(self):
+        """Start a fresh journal and the writer thread"""
+        if self.thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.lock = open(self.lock_path, 'a')
+        if not lock_file(self.lock):
+            self.lock.close()
+            self.lock = None
+            raise RuntimeError(f"Autosave session {self.session} is already in use")
+        self._file = open(self.journal_path, 'wb')
+        self._last_snapshot = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name="autosave-journal", daemon=True)
+        self.thread.start()
+
+    def record_pixel(self, grid_x, grid_y, value):
+        """Queue a single pixel edit as a packed color (TRANSPARENT clears it)"""
+        self.queue.put((grid_x, grid_y, value))
+
+    def record_region(self, x0, y0, region):
+        """Queue a block of pixel edits (an array of packed colors, not modified afterwards)"""
+        self.queue.put(("region", x0, y0, region))
+
+    def record_reset(self, width, height, pixels=None):
+        """Queue a whole-grid replacement (clear, resize or load)"""
+        grid = np.zeros((height, width), dtype=PIXEL_DTYPE)
+        if pixels is not None:
+            grid[:] = pixels
+        self.queue.put(("reset", grid))
+
+    def record_clear(self):
+        """Queue dropping the recovery data, for a document that is not journaled"""
+        self.queue.put(("clear",))
+
+    def close(self, discard=True):
+        """Stop the writer thread, optionally removing the recovery files"""
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+        if discard:
+            self.remove_files(self.journal_path, self.snapshot_path)
+        if self.lock is not None:
+            self.lock.close()
+            self.lock = None
+            self.remove_files(self.lock_path)
+
+    @staticmethod
+    def session_paths(directory, session):
+        """Journal, snapshot and lock file of a session"""
+        return tuple(os.path.join(directory, session + suffix)
+                     for suffix in (JOURNAL_SUFFIX, SNAPSHOT_SUFFIX, LOCK_SUFFIX))
+
+    @staticmethod
+    def remove_files(*paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def leftover_sessions(directory=DEFAULT_DIRECTORY):
+        """Sessions with recovery files whose editor is no longer running, oldest first"""
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        sessions = []
+        for name in names:
+            if not name.endswith(SNAPSHOT_SUFFIX):
+                continue
+            session = name[:-len(SNAPSHOT_SUFFIX)]
+            _, snapshot_path, lock_path = AutosaveJournal.session_paths(directory, session)
+            try:
+                with open(lock_path, 'a') as f:
+                    # A running editor holds the lock on its session
+                    if not lock_file(f):
+                        continue
+                sessions.append((os.path.getmtime(snapshot_path), session))
+            except OSError:
+                continue
+        return [session for _, session in sorted(sessions)]
+
+    @staticmethod
+    def discard_session(directory, session):
+        """Remove the recovery files of a session that is no longer running"""
+        AutosaveJournal.remove_files(*AutosaveJournal.session_paths(directory, session))
+
+    @staticmethod
+    def recover(directory, session):
+        """Rebuild the last journaled grid of a session, or return None if there is nothing to recover"""
+        journal_path, snapshot_path, _ = AutosaveJournal.session_paths(directory, session)
+
+        try:
+            pixels = np.load(snapshot_path).astype(PIXEL_DTYPE)
+        except (OSError, ValueError):
+            return None
+        if pixels.ndim != 2:
+            return None
+
+        try:
+            with open(journal_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = b""
+        offset = 0
+        while offset + BLOCK_HEADER.size <= len(data):
+            x, y, width, height = BLOCK_HEADER.unpack_from(data, offset)
+            offset += BLOCK_HEADER.size
+            size = width * height * 4
+            # A crash can leave a half-written last block behind
+            if offset + size > len(data):
+                break
+            block = np.frombuffer(data, dtype=PIXEL_DTYPE, count=width * height, offset=offset)
+            apply_block(pixels, x, y, block.reshape(height, width))
+            offset += size
+
+        if not pixels.any():
+            return None
+        return pixels
+
+    def _run(self):
+        """Writer thread main loop"""
+        running = True
+        while running:
+            try:
+                batch = [self.queue.get(timeout=1.0)]
+            except queue.Empty:
+                batch = []
+
+            # Drain whatever else is waiting so a drag becomes one write
+            while len(batch) < 10000:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            blocks = []
+            for item in batch:
+                if item is _STOP:
+                    running = False
+                    break
+                if item[0] == "reset":
+                    self._write_blocks(blocks)
+                    blocks = []
+                    self._pixels = item[1]
+                    self._write_snapshot()
+                    continue
+                if item[0] == "clear":
+                    self._write_blocks(blocks)
+                    blocks = []
+                    self._clear()
+                    continue
+                if item[0] == "region":
+                    _, x, y, region = item
+                else:
+                    x, y, value = item
+                    region = np.array([[value]], dtype=PIXEL_DTYPE)
+                region = np.ascontiguousarray(region, dtype=PIXEL_DTYPE)
+                apply_block(self._pixels, x, y, region)
+                height, width = region.shape
+                blocks.append(BLOCK_HEADER.pack(x, y, width, height))
+                blocks.append(region.tobytes())
+                self._ops_since_snapshot += region.size
+            self._write_blocks(blocks)
+
+            now = time.monotonic()
+            if self._ops_since_snapshot and (self._ops_since_snapshot >= self.snapshot_ops or
+                                             now - self._last_snapshot >= self.snapshot_interval):
+                self._write_snapshot()
+
+        self._file.close()
+        self._file = None
+
+    def _write_blocks(self, blocks):
+        """Append journal blocks and flush them to disk"""
+        if not blocks:
+            return
+        self._file.write(b"".join(blocks))
+        self._file.flush()
+
+        # fsync at most once a second, it is the expensive part
+        now = time.monotonic()
+        if now - self._last_sync >= 1.0:
+            os.fsync(self._file.fileno())
+            self._last_sync = now
+
+    def _clear(self):
+        """Forget the grid and remove the snapshot, leaving nothing to recover"""
+        self._pixels = np.zeros((0, 0), dtype=PIXEL_DTYPE)
+        self.remove_files(self.snapshot_path)
+        self._file.close()
+        self._file = open(self.journal_path, 'wb')
+        self._ops_since_snapshot = 0
+
+    def _write_snapshot(self):
+        """Write the full grid atomically and start an empty journal"""
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, self._pixels)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+
+        # Everything so far is in the snapshot now
+        self._file.close()
+        self._file = open(self.journal_path, 'wb')
+        self._ops_since_snapshot = 0
+        self._last_snapshot = time.monotonic()
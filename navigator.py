@@ -0,0 +1,89 @@
+import tkinter as tk
+from tkinter import ttk
+
+from renderer import ZoomedBitmap
+
+# Width and height of the minimap in screen pixels
+NAVIGATOR_SIZE = 160
+
+
+class NavigatorPanel:
+    """Minimap of the whole document with the part in view outlined.
+
+    The minimap shows every step-th cell of every step-th row. That
+    sample is a strided view of the document, so it never needs copying
+    or rebuilding. A change only redraws the samples inside its dirty
+    rectangle, which is at most a few minimap pixels for a stroke, even
+    on a 4096x4096 document. Clicking or dragging on the minimap moves
+    the view there.
+    """
+    def __init__(self, editor, parent):
+        self.editor = editor
+        self.pixels = None
+        self.bitmap = None
+        self.view_item = None
+        self.step = 1
+        self.zoom = 1
+        self.dirty = None
+        self.update_pending = False
+
+        self.frame = ttk.LabelFrame(parent, text="Navigator", padding=5)
+        self.canvas = tk.Canvas(self.frame, width=NAVIGATOR_SIZE, height=NAVIGATOR_SIZE,
+                                bg="gray80", highlightthickness=0)
+        self.canvas.pack(side=tk.TOP)
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<B1-Motion>", self.on_click)
+        self.editor.change_listeners.append(self.on_change)
+
+    def on_change(self, x0, y0, x1, y1):
+        if self.dirty is None:
+            self.dirty = (x0, y0, x1, y1)
+        else:
+            left, top, right, bottom = self.dirty
+            self.dirty = (min(left, x0), min(top, y0), max(right, x1), max(bottom, y1))
+        if not self.update_pending:
+            self.update_pending = True
+            self.canvas.after_idle(self.refresh)
+
+    def refresh(self):
+        self.update_pending = False
+        dirty, self.dirty = self.dirty, None
+        if self.editor.pixels is not self.pixels:
+            self.reset()
+        elif dirty is not None:
+            # Samples are at multiples of step, round the rectangle inwards to them
+            step = self.step
+            x0, y0, x1, y1 = dirty
+            self.bitmap.render_rect(-(-x0 // step), -(-y0 // step), -(-x1 // step), -(-y1 // step))
+
+    def reset(self):
+        """Sample the editor's current pixels and draw all of the minimap"""
+        self.pixels = self.editor.pixels
+        height, width = self.pixels.shape
+        longest = max(width, height)
+        self.step = -(-longest // NAVIGATOR_SIZE)
+        # Small documents are scaled up to fill the minimap
+        self.zoom = max(1, NAVIGATOR_SIZE // -(-longest // self.step))
+
+        self.canvas.delete("all")
+        self.bitmap = ZoomedBitmap(self.canvas, self.pixels[::self.step, ::self.step], self.zoom)
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.bitmap.photo)
+        self.view_item = self.canvas.create_rectangle(0, 0, 0, 0, outline="red", width=2)
+        self.view_changed()
+
+    def view_changed(self):
+        """Move the outline to the part of the document the editor's canvas shows"""
+        if self.view_item is None:
+            return
+        canvas = self.editor.canvas
+        scale = self.zoom / (self.step * self.editor.pixel_size)
+        self.canvas.coords(self.view_item,
+                           canvas.canvasx(0) * scale, canvas.canvasy(0) * scale,
+                           canvas.canvasx(canvas.winfo_width()) * scale,
+                           canvas.canvasy(canvas.winfo_height()) * scale)
+
+    def on_click(self, event):
+        if self.bitmap is None:
+            return
+        scale = self.zoom / self.step
+        self.editor.center_view(event.x / scale, event.y / scale)
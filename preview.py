@@ -0,0 +1,72 @@
+import tkinter as tk
+from tkinter import ttk
+
+from renderer import PreviewBitmap
+
+PREVIEW_ZOOMS = (1, 2, 4)
+
+# Zoom levels wider or taller than this many screen pixels are left out
+MAX_PREVIEW_SIZE = 256
+
+
+class PreviewPanel:
+    """The editor's document at 1x, 2x and 4x, the way it looks in game.
+
+    Edits only mark a dirty rectangle. Once the editor is idle the union
+    of the rectangles is encoded once and Tk copies it into every zoom
+    level, so a stroke costs one small encode however many pixels it
+    touched since the last redraw.
+    """
+    GAP = 8
+
+    def __init__(self, editor, parent):
+        self.editor = editor
+        self.bitmap = None
+        self.pixels = None
+        self.dirty = None
+        self.update_pending = False
+
+        self.frame = ttk.LabelFrame(parent, text="Preview", padding=5)
+        self.canvas = tk.Canvas(self.frame, width=150, height=100, bg="gray80", highlightthickness=0)
+        self.canvas.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.editor.change_listeners.append(self.on_change)
+
+    def on_change(self, x0, y0, x1, y1):
+        if self.dirty is None:
+            self.dirty = (x0, y0, x1, y1)
+        else:
+            left, top, right, bottom = self.dirty
+            self.dirty = (min(left, x0), min(top, y0), max(right, x1), max(bottom, y1))
+        if not self.update_pending:
+            self.update_pending = True
+            self.canvas.after_idle(self.refresh)
+
+    def refresh(self):
+        self.update_pending = False
+        dirty, self.dirty = self.dirty, None
+        if self.editor.pixels is not self.pixels:
+            # A new document or size, build the images again
+            self.reset()
+        elif self.bitmap is not None and dirty is not None:
+            self.bitmap.render_rect(*dirty)
+
+    def reset(self):
+        """Create the preview images for the editor's current pixels"""
+        self.pixels = self.editor.pixels
+        self.canvas.delete("all")
+        height, width = self.pixels.shape
+        zooms = [zoom for zoom in PREVIEW_ZOOMS if max(width, height) * zoom <= MAX_PREVIEW_SIZE]
+        if not zooms:
+            self.bitmap = None
+            self.canvas.create_text(4, 4, anchor=tk.NW, text="Too large to preview", font=('Arial', 8))
+            self.canvas.configure(width=150, height=20)
+            return
+
+        # Zoom levels stacked top to bottom, each with its label
+        self.bitmap = PreviewBitmap(self.canvas, self.pixels, zooms)
+        y = 0
+        for zoom in zooms:
+            self.canvas.create_text(0, y, anchor=tk.NW, text=f"{zoom}x", font=('Arial', 8))
+            self.canvas.create_image(0, y + 14, anchor=tk.NW, image=self.bitmap.photos[zoom])
+            y += 14 + height * zoom + self.GAP
+        self.canvas.configure(width=max(150, width * zooms[-1]), height=y - self.GAP)
@@ -0,0 +1,229 @@
+import argparse
+import numpy as np
+from PIL import Image
+
+from colors import PIXEL_DTYPE, TRANSPARENT, pack_color, rgba_view
+
+PALETTE_METHODS = ("median_cut", "kmeans")
+DITHER_METHODS = ("none", "floyd_steinberg", "ordered")
+
+# Images with more distinct colors are reduced to 5 bits per channel before building a palette
+REDUCE_THRESHOLD = 4096
+
+# 4x4 Bayer matrix, scaled to offsets in -0.5..0.5
+BAYER_4X4 = (np.array([[0, 8, 2, 10],
+                       [12, 4, 14, 6],
+                       [3, 11, 1, 9],
+                       [15, 7, 13, 5]], dtype=np.float32) + 0.5) / 16 - 0.5
+
+
+def unique_colors(pixels):
+    """Return the distinct opaque colors as an (n, 3) float array and how often each is used"""
+    opaque = pixels[pixels != TRANSPARENT]
+    values, counts = np.unique(opaque, return_counts=True)
+    return rgba_view(values.reshape(1, -1))[0, :, :3].astype(np.float32), counts
+
+
+def pack_rgb(rgb):
+    """Pack an (..., 3) array of channel values into opaque packed colors"""
+    rgb = np.clip(np.rint(rgb), 0, 255).astype(np.uint32)
+    return (rgb[..., 0] | (rgb[..., 1] << 8) | (rgb[..., 2] << 16) | np.uint32(0xFF000000)).astype(PIXEL_DTYPE)
+
+
+def reduce_colors(colors, counts, bits=5):
+    """Merge colors that are equal in their top bits per channel into their weighted average.
+
+    Leaves at most 2 ** (3 * bits) colors, so palette building does not
+    depend on how many distinct colors the image has.
+    """
+    shift = 8 - bits
+    levels = colors.astype(np.int64) >> shift
+    keys = (levels[:, 0] << (2 * bits)) | (levels[:, 1] << bits) | levels[:, 2]
+    keys, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    weights = counts.astype(np.float64)
+    totals = np.bincount(inverse, weights=weights, minlength=len(keys))
+    sums = np.stack([np.bincount(inverse, weights=weights * colors[:, channel], minlength=len(keys))
+                     for channel in range(3)], axis=1)
+    return (sums / totals[:, None]).astype(np.float32), totals.astype(np.int64)
+
+
+def box_span(colors, box):
+    """Return (widest channel range, that channel) of a box of colors, or (-1, 0) if it cannot be split"""
+    if len(box) < 2:
+        return -1, 0
+    spans = np.ptp(colors[box], axis=0)
+    channel = int(np.argmax(spans))
+    return float(spans[channel]), channel
+
+
+def median_cut(colors, counts, size):
+    """Split the color cube into boxes of equal weight and return each box's average"""
+    # (span, channel, color indices), the span is only measured when a box is made
+    boxes = [box_span(colors, np.arange(len(colors))) + (np.arange(len(colors)),)]
+    while len(boxes) < size:
+        # Split the box that spans the widest channel range
+        index = max(range(len(boxes)), key=lambda i: boxes[i][0])
+        span, channel, box = boxes[index]
+        if span <= 0:
+            break
+        boxes.pop(index)
+        box = box[np.argsort(colors[box, channel], kind="stable")]
+
+        # Cut at the weighted median, keeping at least one color on each side
+        cumulative = np.cumsum(counts[box])
+        cut = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+        cut = min(max(cut, 1), len(box) - 1)
+        for half in (box[:cut], box[cut:]):
+            boxes.append(box_span(colors, half) + (half,))
+    boxes = [box for _, _, box in boxes]
+
+    return np.array([np.average(colors[box], axis=0, weights=counts[box]) for box in boxes],
+                    dtype=np.float32)
+
+
+def nearest_indices(rgb, palette, chunk_size=65536):
+    """Index of the closest palette color (RGB distance) for every row of rgb"""
+    rgb = rgb.reshape(-1, 3).astype(np.float32)
+    palette = np.asarray(palette, dtype=np.float32)
+    palette_norms = (palette ** 2).sum(axis=1)
+    result = np.empty(len(rgb), dtype=np.intp)
+
+    # |a - b|^2 = |a|^2 - 2ab + |b|^2, and |a|^2 is the same for every palette color
+    for start in range(0, len(rgb), chunk_size):
+        chunk = rgb[start:start + chunk_size]
+        distances = palette_norms - 2 * chunk @ palette.T
+        result[start:start + chunk_size] = distances.argmin(axis=1)
+    return result
+
+
+def kmeans(colors, counts, size, iterations=12):
+    """Refine a median cut palette with weighted k-means"""
+    palette = median_cut(colors, counts, size)
+    weights = counts.astype(np.float32)
+    for _ in range(iterations):
+        labels = nearest_indices(colors, palette)
+        totals = np.bincount(labels, weights=weights, minlength=len(palette))
+        sums = np.stack([np.bincount(labels, weights=weights * colors[:, channel], minlength=len(palette))
+                         for channel in range(3)], axis=1)
+        used = totals > 0
+        moved = sums[used] / totals[used, None]
+        if np.allclose(moved, palette[used], atol=0.5):
+            break
+        palette[used] = moved
+    return palette
+
+
+def extract_palette(pixels, size=16, method="median_cut"):
+    """Build a palette of at most size packed colors that represents the pixels"""
+    colors, counts = unique_colors(pixels)
+    if not len(colors):
+        return np.zeros(0, dtype=PIXEL_DTYPE)
+    if len(colors) <= size:
+        return pack_rgb(colors)
+    if len(colors) > REDUCE_THRESHOLD:
+        # Photos can have hundreds of thousands of colors, close ones are merged first
+        colors, counts = reduce_colors(colors, counts)
+
+    if method == "median_cut":
+        palette = median_cut(colors, counts, size)
+    elif method == "kmeans":
+        palette = kmeans(colors, counts, size)
+    else:
+        raise ValueError(f"Unknown palette method: {method}")
+    return np.unique(pack_rgb(palette))
+
+
+def map_to_palette(pixels, palette, dither="none"):
+    """Replace every opaque pixel with a palette color, optionally dithered"""
+    palette = np.asarray(palette, dtype=PIXEL_DTYPE)
+    if not len(palette):
+        raise ValueError("The palette is empty")
+    palette_rgb = rgba_view(palette.reshape(1, -1))[0, :, :3].astype(np.float32)
+    # Fully transparent pixels stay transparent whatever their RGB
+    transparent = rgba_view(pixels)[:, :, 3] == 0
+
+    if dither == "none":
+        # Map each distinct color once
+        values, inverse = np.unique(pixels, return_inverse=True)
+        rgb = rgba_view(values.reshape(1, -1))[0, :, :3]
+        result = palette[nearest_indices(rgb, palette_rgb)][inverse.reshape(pixels.shape)]
+    elif dither == "ordered":
+        # Nudge every pixel by the Bayer threshold, scaled to the palette's spacing
+        height, width = pixels.shape
+        spread = 255 / max(len(palette) ** (1 / 3) - 1, 1)
+        thresholds = np.tile(BAYER_4X4, (height // 4 + 1, width // 4 + 1))[:height, :width]
+        rgb = rgba_view(pixels)[:, :, :3] + thresholds[:, :, None] * spread
+        result = palette[nearest_indices(rgb, palette_rgb)].reshape(pixels.shape)
+    elif dither == "floyd_steinberg":
+        # Error diffusion is sequential, PIL does it in C
+        if len(palette) > 256:
+            raise ValueError("Floyd-Steinberg dithering needs a palette of 256 colors or less")
+        height, width = pixels.shape
+        # Transparent pixels are given an exact palette color, so they add no error of their
+        # own to the opaque pixels around them, as black would at the edges of a sprite
+        opaque = np.where(transparent, palette[0], pixels).astype(PIXEL_DTYPE)
+        image = Image.frombuffer("RGBA", (width, height), opaque.tobytes(),
+                                 "raw", "RGBA", 0, 1).convert("RGB")
+        palette_image = Image.new("P", (1, 1))
+        flat = palette_rgb.astype(np.uint8).ravel().tolist()
+        # Pad with the first color so PIL never picks an unused entry
+        palette_image.putpalette(flat + flat[:3] * (256 - len(palette)))
+        indices = np.asarray(image.quantize(palette=palette_image, dither=Image.Dither.FLOYDSTEINBERG))
+        result = palette[np.minimum(indices, len(palette) - 1)]
+    else:
+        raise ValueError(f"Unknown dither method: {dither}")
+
+    result = result.astype(PIXEL_DTYPE)
+    result[transparent] = TRANSPARENT
+    return result
+
+
+def quantize(pixels, palette=None, size=16, method="median_cut", dither="none"):
+    """Reduce pixels to a given palette, or to one extracted from the pixels"""
+    if palette is None:
+        palette = extract_palette(pixels, size, method)
+    if not len(palette):
+        return pixels.copy()
+    return map_to_palette(pixels, palette, dither)
+
+
+def parse_palette(text):
+    """Parse a comma separated list of colors into packed colors"""
+    return np.array([pack_color(color.strip()) for color in text.split(",") if color.strip()],
+                    dtype=PIXEL_DTYPE)
+
+
+def main():
+    from artfile import read_art, write_art
+    from importer import load_rgba, pack_rgba_array
+
+    parser = argparse.ArgumentParser(description="Reduce the colors of pixel art files")
+    parser.add_argument("input", help="art file (.json) or image")
+    parser.add_argument("output", help="art file (.json) or image")
+    parser.add_argument("--palette", help="comma separated colors to map onto, e.g. #000000,#FFFFFF")
+    parser.add_argument("--colors", type=int, default=16, help="palette size when extracting a palette")
+    parser.add_argument("--method", choices=PALETTE_METHODS, default="median_cut")
+    parser.add_argument("--dither", choices=DITHER_METHODS, default="none")
+    args = parser.parse_args()
+
+    if args.input.lower().endswith(".json"):
+        pixels = read_art(args.input)
+    else:
+        rgba = load_rgba(args.input).copy()
+        rgba[:, :, 3] = np.where(rgba[:, :, 3] >= 128, 255, 0)
+        pixels = pack_rgba_array(rgba)
+        pixels[rgba[:, :, 3] == 0] = TRANSPARENT
+
+    palette = parse_palette(args.palette) if args.palette else None
+    result = quantize(pixels, palette, args.colors, args.method, args.dither)
+
+    if args.output.lower().endswith(".json"):
+        write_art(args.output, result)
+    else:
+        height, width = result.shape
+        Image.frombuffer("RGBA", (width, height), result.tobytes(), "raw", "RGBA", 0, 1).save(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+from artfile import PIXEL_KEYS, is_art_data, pixels_from_dict, write_art
+from colors import PIXEL_DTYPE, TRANSPARENT, color_value, rgba_view
+from export import EXPORT_FORMATS, RAW_CONTAINERS, RAW_ENCODINGS, RAW_EXTENSIONS, export_image, export_raw
+from quantize import nearest_indices, parse_palette
+from workers import shared_pool
+from workspace import scan_art_files
+
+# Files per worker task, so the pool gets a few big tasks instead of many small ones
+BATCH_SIZE = 64
+
+# Below this many files recoloring is faster without the pool
+POOL_THRESHOLD = 32
+
+
+def color_table(mapping):
+    """Turn a {old color: new color} mapping into sorted old colors and the matching new ones"""
+    pairs = sorted((color_value(old), color_value(new)) for old, new in mapping.items())
+    sources = np.array([old for old, _ in pairs], dtype=PIXEL_DTYPE)
+    targets = np.array([new for _, new in pairs], dtype=PIXEL_DTYPE)
+    return sources, targets
+
+
+def recolor(pixels, sources, targets, palette=None):
+    """Apply a color table to a pixel array, returns the new pixels and how many changed.
+
+    The table is looked up once per distinct color of the image, and the
+    resulting lookup table is applied to all pixels in one step. With a
+    palette, colors the table leaves alone are snapped to the nearest
+    palette color.
+    """
+    values, inverse = np.unique(pixels, return_inverse=True)
+    lut = values.copy()
+    if len(sources):
+        positions = np.minimum(np.searchsorted(sources, values), len(sources) - 1)
+        hits = sources[positions] == values
+        lut[hits] = targets[positions[hits]]
+    else:
+        hits = np.zeros(len(values), dtype=bool)
+
+    if palette is not None and len(palette):
+        snap = ~hits & (values != TRANSPARENT)
+        if snap.any():
+            palette = np.asarray(palette, dtype=PIXEL_DTYPE)
+            palette_rgb = rgba_view(palette.reshape(1, -1))[0, :, :3]
+            rgb = rgba_view(values[snap].reshape(1, -1))[0, :, :3]
+            lut[snap] = palette[nearest_indices(rgb, palette_rgb)]
+
+    changed = lut != values
+    if not changed.any():
+        return pixels, 0
+    inverse = inverse.reshape(pixels.shape)
+    return lut[inverse], int(changed[inverse].sum())
+
+
+def export_name(path, file_format, scale):
+    """Name of an export next to an art file: sprite.png, sprite@4x.png, sprite.h"""
+    base = os.path.splitext(path)[0]
+    if scale != 1:
+        base += f"@{scale}x"
+    extension = RAW_EXTENSIONS[file_format] if file_format in RAW_CONTAINERS else "." + file_format
+    return base + extension
+
+
+def recolor_file(source, target, sources, targets, palette=None, exports=(), encoding="rgba8888"):
+    """Recolor one art file into target and write its exports (runs in worker processes).
+
+    exports is a list of (format, scale). Returns (source, changed pixels, error),
+    changed pixels is None for JSON files that are not art files.
+    """
+    try:
+        with open(source, 'r') as f:
+            save_data = json.load(f)
+        if not is_art_data(save_data):
+            return source, None, None
+        pixels, changed = recolor(pixels_from_dict(save_data), sources, targets, palette)
+        directory = os.path.dirname(target)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # The sprite keeps its pixel_size and other settings
+        write_art(target, pixels, metadata={key: value for key, value in save_data.items()
+                                            if key not in PIXEL_KEYS})
+        for file_format, scale in exports:
+            filename = export_name(target, file_format, scale)
+            if file_format in RAW_CONTAINERS:
+                scaled = pixels.repeat(scale, axis=0).repeat(scale, axis=1) if scale != 1 else pixels
+                export_raw(scaled, filename, encoding, file_format)
+            else:
+                export_image(pixels, filename, file_format, scale)
+    except Exception as e:
+        return source, 0, f"Could not recolor {source}: {str(e)}"
+    return source, changed, None
+
+
+def recolor_files(jobs, sources, targets, palette=None, exports=(), encoding="rgba8888"):
+    """recolor_file for a batch of (source, target) pairs"""
+    return [recolor_file(source, target, sources, targets, palette, exports, encoding)
+            for source, target in jobs]
+
+
+def recolor_directory(source_directory, target_directory, mapping, palette=None, exports=(),
+                      encoding="rgba8888", log=print):
+    """Recolor every art file in a directory tree into the same layout under target_directory.
+
+    Returns the number of files that failed.
+    """
+    start = time.perf_counter()
+    sources, targets = color_table(mapping)
+    if palette is not None:
+        palette = np.asarray(palette, dtype=PIXEL_DTYPE)
+    for file_format, _ in exports:
+        if file_format not in EXPORT_FORMATS + RAW_CONTAINERS:
+            raise ValueError(f"Unknown export format: {file_format}")
+
+    # Leave out the output when it is inside the source tree
+    source_directory = os.path.abspath(source_directory)
+    target_directory = os.path.abspath(target_directory)
+    skip = os.path.relpath(target_directory, source_directory) + os.sep
+    # Binary documents are left alone, they are not sprites and can be huge
+    jobs = [(os.path.join(source_directory, path), os.path.join(target_directory, path))
+            for path, _, _ in scan_art_files(source_directory)
+            if not path.startswith(skip) and path.lower().endswith(".json")]
+
+    batches = [jobs[i:i + BATCH_SIZE] for i in range(0, len(jobs), BATCH_SIZE)]
+    count = len(batches)
+    if len(jobs) >= POOL_THRESHOLD:
+        results = shared_pool().map(recolor_files, batches, [sources] * count, [targets] * count,
+                                    [palette] * count, [exports] * count, [encoding] * count)
+    else:
+        results = (recolor_files(batch, sources, targets, palette, exports, encoding) for batch in batches)
+
+    errors = 0
+    skipped = 0
+    changed_files = 0
+    changed_pixels = 0
+    for batch in results:
+        for source, changed, error in batch:
+            if error is not None:
+                errors += 1
+                log(error)
+            elif changed is None:
+                # Manifests, indexes and other JSON that is not art
+                skipped += 1
+            elif changed:
+                changed_files += 1
+                changed_pixels += changed
+
+    log(f"{len(jobs) - errors - skipped} written, {changed_files} changed ({changed_pixels} pixels), "
+        f"{skipped} skipped, {errors} failed in {time.perf_counter() - start:.2f}s")
+    return errors
+
+
+def parse_mapping(pairs):
+    """Parse "#FF0000=#0000FF" arguments into a {old: new} mapping"""
+    mapping = {}
+    for pair in pairs:
+        old, separator, new = pair.partition("=")
+        if not separator:
+            raise ValueError(f"Expected OLD=NEW, got {pair}")
+        mapping[old.strip()] = new.strip()
+    return mapping
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recolor every art file in a directory, e.g. for team colors")
+    parser.add_argument("source", help="directory of art files (.json)")
+    parser.add_argument("target", help="directory for the recolored files, mirrors the source layout")
+    parser.add_argument("--map", action="append", default=[], metavar="OLD=NEW",
+                        help="replace one color, e.g. --map #FF0000=#0000FF (repeatable)")
+    parser.add_argument("--table", help="JSON file with a {\"#old\": \"#new\"} color table")
+    parser.add_argument("--palette", help="comma separated colors to snap every other color to")
+    parser.add_argument("--export", action="append", default=[], metavar="FORMAT[@SCALE]",
+                        help=f"also export each file, formats: {', '.join(EXPORT_FORMATS + RAW_CONTAINERS)}")
+    parser.add_argument("--encoding", choices=RAW_ENCODINGS, default="rgba8888",
+                        help="pixel encoding of raw exports")
+    args = parser.parse_args()
+
+    mapping = {}
+    if args.table:
+        with open(args.table, 'r') as f:
+            mapping.update(json.load(f))
+    mapping.update(parse_mapping(args.map))
+    palette = parse_palette(args.palette) if args.palette else None
+    exports = []
+    for export in args.export:
+        file_format, _, scale = export.partition("@")
+        exports.append((file_format, int(scale.rstrip("x") or 1)))
+
+    sys.exit(1 if recolor_directory(args.source, args.target, mapping, palette, exports, args.encoding) else 0)
+
+
+if __name__ == "__main__":
+    main()
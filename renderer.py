@@ -0,0 +1,210 @@
+import io
+import base64
+import tkinter as tk
+import numpy as np
+from PIL import Image
+
+from colors import rgba_view
+
+# Documents whose zoomed image would be larger than this (in screen pixels)
+# are only drawn for the part in view
+MAX_BITMAP_SIZE = 8192
+
+
+def encode_ppm(region, background=(255, 255, 255)):
+    """Encode a block of packed colors as binary PPM, showing transparency as the background"""
+    height, width = region.shape
+    # Strided views (such as a minimap's samples) have to be copied before viewing them as bytes
+    rgba = rgba_view(np.ascontiguousarray(region))
+    transparent = rgba[:, :, 3] < 128
+    rgb = np.where(transparent[:, :, None], np.array(background, dtype=np.uint8), rgba[:, :, :3])
+    return b"P6 %d %d 255\n" % (width, height) + rgb.astype(np.uint8).tobytes()
+
+
+def photo_from_pixels(master, pixels, zoom=1):
+    """Create a PhotoImage from packed colors, keeping transparent pixels transparent"""
+    height, width = pixels.shape
+    image = Image.frombuffer("RGBA", (width, height), np.ascontiguousarray(pixels).tobytes(),
+                             "raw", "RGBA", 0, 1)
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", compress_level=1)
+    photo = tk.PhotoImage(master=master, data=base64.b64encode(buffer.getvalue()).decode("ascii"))
+    if zoom > 1:
+        photo = photo.zoom(zoom)
+    return photo
+
+
+class ZoomedBitmap:
+    """A pixel array kept as a Tk image with pixel_size image pixels per cell.
+
+    The array is first written into a small image with one image pixel per
+    grid cell, which Tk then copies into the zoomed image. Only the
+    rectangles that changed are re-encoded. Any number of canvas items can
+    show the same zoomed image.
+    """
+    def __init__(self, master, pixels, pixel_size):
+        height, width = pixels.shape
+        self.pixels = pixels
+        self.pixel_size = pixel_size
+        # (x0, y0, x1, y1) cells held by the image
+        self.window = (0, 0, width, height)
+        self.source = tk.PhotoImage(master=master, width=width, height=height)
+        self.photo = tk.PhotoImage(master=master, width=width * pixel_size,
+                                   height=height * pixel_size)
+        self.render_all()
+
+    def render_all(self):
+        """Redraw all cells held by the image"""
+        self.render_rect(*self.window)
+
+    def render_rect(self, x0, y0, x1, y1):
+        """Redraw the grid cells from (x0, y0) up to but not including (x1, y1)"""
+        left, top, right, bottom = self.window
+        x0, y0 = max(x0, left), max(y0, top)
+        x1, y1 = min(x1, right), min(y1, bottom)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        data = encode_ppm(self.pixels[y0:y1, x0:x1])
+        self.source.tk.call(self.source.name, "put", data, "-format", "ppm", "-to", x0 - left, y0 - top)
+
+        size = self.pixel_size
+        self.photo.tk.call(self.photo.name, "copy", self.source.name,
+                           "-from", x0 - left, y0 - top, x1 - left, y1 - top,
+                           "-to", (x0 - left) * size, (y0 - top) * size,
+                           "-zoom", size, size)
+
+
+class PreviewBitmap:
+    """A pixel array at a few small zoom levels, all copied by Tk from one 1x image.
+
+    Like ZoomedBitmap, only changed rectangles are encoded, and only once
+    whatever the number of zoom levels.
+    """
+    def __init__(self, master, pixels, zooms=(1, 2, 4)):
+        height, width = pixels.shape
+        self.pixels = pixels
+        self.source = tk.PhotoImage(master=master, width=width, height=height)
+        self.photos = {}
+        for zoom in zooms:
+            self.photos[zoom] = self.source if zoom == 1 else tk.PhotoImage(
+                master=master, width=width * zoom, height=height * zoom)
+        self.render_rect(0, 0, width, height)
+
+    def render_rect(self, x0, y0, x1, y1):
+        """Redraw the cells from (x0, y0) up to but not including (x1, y1) at every zoom level"""
+        height, width = self.pixels.shape
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, width), min(y1, height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        data = encode_ppm(self.pixels[y0:y1, x0:x1])
+        self.source.tk.call(self.source.name, "put", data, "-format", "ppm", "-to", x0, y0)
+        for zoom, photo in self.photos.items():
+            if photo is not self.source:
+                photo.tk.call(photo.name, "copy", self.source.name, "-from", x0, y0, x1, y1,
+                              "-to", x0 * zoom, y0 * zoom, "-zoom", zoom, zoom)
+
+
+class ViewportBitmap(ZoomedBitmap):
+    """A zoomed bitmap holding only the cells in view of a canvas.
+
+    Used for documents too big for one image. Scrolling moves the image
+    and redraws it for the cells that came into view, so the cost depends
+    on the window size, not the document size.
+    """
+    def __init__(self, canvas, pixels, pixel_size):
+        self.canvas = canvas
+        self.pixels = pixels
+        self.pixel_size = pixel_size
+        self.window = (0, 0, 0, 0)
+        self.source = None
+        self.photo = None
+        self.item = canvas.create_image(0, 0, anchor=tk.NW, tags="pixels")
+        self.update_view()
+
+    def update_view(self):
+        """Move the image to the cells now in view, redrawing it if they changed"""
+        height, width = self.pixels.shape
+        size = self.pixel_size
+        x0 = max(int(self.canvas.canvasx(0) // size), 0)
+        y0 = max(int(self.canvas.canvasy(0) // size), 0)
+        x1 = min(int(self.canvas.canvasx(self.canvas.winfo_width()) // size) + 1, width)
+        y1 = min(int(self.canvas.canvasy(self.canvas.winfo_height()) // size) + 1, height)
+        if x0 >= x1 or y0 >= y1 or (x0, y0, x1, y1) == self.window:
+            return
+
+        left, top, right, bottom = self.window
+        if self.photo is None or (x1 - x0, y1 - y0) != (right - left, bottom - top):
+            self.source = tk.PhotoImage(master=self.canvas, width=x1 - x0, height=y1 - y0)
+            self.photo = tk.PhotoImage(master=self.canvas, width=(x1 - x0) * size, height=(y1 - y0) * size)
+            self.canvas.itemconfigure(self.item, image=self.photo)
+        self.window = (x0, y0, x1, y1)
+        self.canvas.coords(self.item, x0 * size, y0 * size)
+        self.render_all()
+
+
+class CanvasRenderer:
+    """Draws the editor's pixel array on its canvas as one zoomed bitmap.
+
+    In tiling mode eight more canvas items show the same bitmap around it,
+    so the wrapped neighbours update along with every redrawn rectangle.
+    Documents too big for one image are drawn in viewport mode instead.
+    """
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.bitmap = None
+        self.item = None
+        self.tiling = False
+
+    @property
+    def viewport(self):
+        """Whether only the part of the document in view is drawn"""
+        return isinstance(self.bitmap, ViewportBitmap)
+
+    def reset(self, pixels, pixel_size):
+        """Create a new bitmap for a pixel array and draw all of it"""
+        height, width = pixels.shape
+        if max(width, height) * pixel_size > MAX_BITMAP_SIZE:
+            self.bitmap = ViewportBitmap(self.canvas, pixels, pixel_size)
+            self.item = self.bitmap.item
+        else:
+            self.bitmap = ZoomedBitmap(self.canvas, pixels, pixel_size)
+            self.item = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.bitmap.photo, tags="pixels")
+        self.canvas.tag_lower(self.item)
+        if self.tiling:
+            self.show_tiling()
+
+    def view_changed(self):
+        """Call after scrolling or resizing the canvas"""
+        if self.viewport:
+            self.bitmap.update_view()
+
+    def set_tiling(self, tiling):
+        """Show or hide the wrapped neighbours"""
+        self.tiling = tiling
+        self.canvas.delete("tiling")
+        if tiling and self.bitmap is not None:
+            self.show_tiling()
+
+    def show_tiling(self):
+        if self.viewport:
+            # There is no image of the whole document to repeat
+            return
+        height, width = self.bitmap.pixels.shape
+        width *= self.bitmap.pixel_size
+        height *= self.bitmap.pixel_size
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                if dx or dy:
+                    item = self.canvas.create_image(dx * width, dy * height, anchor=tk.NW,
+                                                    image=self.bitmap.photo, tags="tiling")
+                    self.canvas.tag_lower(item)
+
+    def render_all(self):
+        """Redraw the whole array"""
+        self.bitmap.render_all()
+
+    def render_rect(self, x0, y0, x1, y1):
+        """Redraw the grid cells from (x0, y0) up to but not including (x1, y1)"""
+        self.bitmap.render_rect(x0, y0, x1, y1)
@@ -0,0 +1,69 @@
+import numpy as np
+
+
+def normalize_rect(x0, y0, x1, y1):
+    """Return (left, top, right, bottom) for the cells spanned by two corner cells"""
+    return min(x0, x1), min(y0, y1), max(x0, x1) + 1, max(y0, y1) + 1
+
+
+def mask_bounds(mask):
+    """Return the (left, top, right, bottom) box around the set cells of a mask, or None if none are set"""
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not len(rows):
+        return None
+    columns = np.flatnonzero(mask[rows[0]:rows[-1] + 1].any(axis=0))
+    return int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1
+
+
+def clip_rect(rect, width, height):
+    """Clip a (left, top, right, bottom) rectangle to the grid, or return None if nothing is left"""
+    left, top, right, bottom = rect
+    left, top = max(left, 0), max(top, 0)
+    right, bottom = min(right, width), min(bottom, height)
+    if left >= right or top >= bottom:
+        return None
+    return left, top, right, bottom
+
+
+class FloatingSelection:
+    """Pixels lifted off the grid (or pasted) that follow the mouse until committed"""
+    def __init__(self, pixels, x, y, source=None):
+        self.pixels = pixels
+        self.x = x
+        self.y = y
+        # (x, y, original pixels) of the area the pixels were lifted from, if any
+        self.source = source
+
+    @property
+    def rect(self):
+        height, width = self.pixels.shape
+        return self.x, self.y, self.x + width, self.y + height
+
+    def contains(self, grid_x, grid_y):
+        left, top, right, bottom = self.rect
+        return left <= grid_x < right and top <= grid_y < bottom
+
+
+class Clipboard:
+    """Keeps the most recently copied pixel regions, newest first"""
+    def __init__(self, max_items=20):
+        self.max_items = max_items
+        self.items = []
+
+    def push(self, pixels):
+        """Add a copy of a pixel region"""
+        self.items.insert(0, pixels.copy())
+        del self.items[self.max_items:]
+
+    def get(self, index=0):
+        """Return a stored region, or None if there is no such entry"""
+        if 0 <= index < len(self.items):
+            return self.items[index]
+        return None
+
+    def __len__(self):
+        return len(self.items)
+
+
+# Shared by every editor in the process
+clipboard = Clipboard()
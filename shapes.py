@@ -0,0 +1,93 @@
+def line_points(x0, y0, x1, y1):
+    """Return the grid cells on a line between two cells (Bresenham)"""
+    points = []
+    dx = abs(x1 - x0)
+    dy = -abs(y1 - y0)
+    sx = 1 if x0 < x1 else -1
+    sy = 1 if y0 < y1 else -1
+    err = dx + dy
+    while True:
+        points.append((x0, y0))
+        if x0 == x1 and y0 == y1:
+            break
+        e2 = 2 * err
+        if e2 >= dy:
+            err += dy
+            x0 += sx
+        if e2 <= dx:
+            err += dx
+            y0 += sy
+    return points
+
+
+def rectangle_points(x0, y0, x1, y1, filled=False):
+    """Return the grid cells of a rectangle spanning two corner cells"""
+    left, right = min(x0, x1), max(x0, x1)
+    top, bottom = min(y0, y1), max(y0, y1)
+    if filled:
+        return [(x, y) for y in range(top, bottom + 1) for x in range(left, right + 1)]
+
+    points = []
+    for x in range(left, right + 1):
+        points.append((x, top))
+        if bottom != top:
+            points.append((x, bottom))
+    for y in range(top + 1, bottom):
+        points.append((left, y))
+        if right != left:
+            points.append((right, y))
+    return points
+
+
+def ellipse_points(x0, y0, x1, y1, filled=False):
+    """Return the grid cells of an ellipse inside the box spanning two corner cells"""
+    # Integer midpoint ellipse that fits a bounding box of any size
+    a = abs(x1 - x0)
+    b = abs(y1 - y0)
+    b1 = b & 1
+    dx = 4 * (1 - a) * b * b
+    dy = 4 * (b1 + 1) * a * a
+    err = dx + dy + b1 * a * a
+
+    if x0 > x1:
+        x0 = x1
+        x1 += a
+    if y0 > y1:
+        y0 = y1
+    y0 += (b + 1) // 2
+    y1 = y0 - b1
+    a8 = 8 * a * a
+    b8 = 8 * b * b
+
+    outline = set()
+    while True:
+        outline.update(((x1, y0), (x0, y0), (x0, y1), (x1, y1)))
+        e2 = 2 * err
+        if e2 <= dy:
+            y0 += 1
+            y1 -= 1
+            dy += a8
+            err += dy
+        if e2 >= dx or 2 * err > dy:
+            x0 += 1
+            x1 -= 1
+            dx += b8
+            err += dx
+        if x0 > x1:
+            break
+
+    # Flat ellipses stop early, finish the tips
+    while y0 - y1 <= b:
+        outline.update(((x0 - 1, y0), (x1 + 1, y0), (x0 - 1, y1), (x1 + 1, y1)))
+        y0 += 1
+        y1 -= 1
+
+    if not filled:
+        return list(outline)
+
+    # Fill each row between its leftmost and rightmost outline cell
+    rows = {}
+    for x, y in outline:
+        left, right = rows.get(y, (x, x))
+        rows[y] = (min(left, x), max(right, x))
+    return [(x, y) for y, (left, right) in rows.items() for x in range(left, right + 1)]
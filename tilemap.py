@@ -0,0 +1,436 @@
+import json
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox, simpledialog
+import numpy as np
+
+from artfile import pixels_from_dict, pixels_to_dict, read_art
+from dedupe import tile_replacements
+from renderer import ZoomedBitmap
+
+# Cell value for "no tile"
+EMPTY = -1
+
+
+class Tile:
+    """A sprite used as a tile, plus the bitmap shared by all its instances"""
+    def __init__(self, name, pixels):
+        self.name = name
+        self.pixels = pixels
+        self.bitmap = None
+
+
+class TileMap:
+    """A grid of cells that each reference a tile of the tileset by index"""
+    def __init__(self, width=64, height=64):
+        self.cells = np.full((height, width), EMPTY, dtype=np.int32)
+        self.tiles = []
+
+    @property
+    def width(self):
+        return self.cells.shape[1]
+
+    @property
+    def height(self):
+        return self.cells.shape[0]
+
+    @property
+    def tile_size(self):
+        """(width, height) of the tiles, or None while the tileset is empty"""
+        if not self.tiles:
+            return None
+        height, width = self.tiles[0].pixels.shape
+        return width, height
+
+    def add_tile(self, name, pixels):
+        """Add a sprite to the tileset and return its index"""
+        height, width = pixels.shape
+        if self.tile_size is not None and self.tile_size != (width, height):
+            tile_width, tile_height = self.tile_size
+            raise ValueError(f"Tiles in this tileset are {tile_width}x{tile_height}, "
+                             f"not {width}x{height}")
+        self.tiles.append(Tile(name, pixels.copy()))
+        return len(self.tiles) - 1
+
+    def merge_tiles(self, max_distance=0):
+        """Drop tiles that repeat an earlier tile (up to max_distance pixels apart) and point their cells at it.
+
+        Returns the new index of every old tile.
+        """
+        if not self.tiles:
+            return np.empty(0, dtype=np.int32)
+        width, height = self.tile_size
+        if width != height:
+            raise ValueError("Only square tiles can be merged")
+        replacements = tile_replacements([tile.pixels for tile in self.tiles], max_distance)
+        kept = replacements == np.arange(len(self.tiles))
+        new_index = (np.cumsum(kept) - 1)[replacements].astype(np.int32)
+
+        used = self.cells != EMPTY
+        self.cells[used] = new_index[self.cells[used]]
+        self.tiles = [tile for tile, keep in zip(self.tiles, kept.tolist()) if keep]
+        return new_index
+
+    def to_dict(self):
+        """Convert to the JSON structure used in tilemap files"""
+        tiles = []
+        for tile in self.tiles:
+            height, width = tile.pixels.shape
+            tiles.append({'name': tile.name, 'grid_width': width, 'grid_height': height,
+                          'pixels': pixels_to_dict(tile.pixels)})
+        return {'map_width': self.width, 'map_height': self.height,
+                'tiles': tiles, 'cells': self.cells.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a tilemap from the contents of a tilemap file"""
+        tilemap = cls(int(data['map_width']), int(data['map_height']))
+        for tile in data['tiles']:
+            tilemap.add_tile(tile.get('name', ""), pixels_from_dict(tile))
+        cells = np.array(data['cells'], dtype=np.int32).reshape(tilemap.height, tilemap.width)
+        cells[(cells < 0) | (cells >= len(tilemap.tiles))] = EMPTY
+        tilemap.cells = cells
+        return tilemap
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+
+class TilemapEditor:
+    """Window for building levels out of sprites.
+
+    Each tile is rendered once into a bitmap. Every map cell showing the tile
+    is a canvas item that displays that same bitmap, and items only exist
+    for the cells in view. Editing a tile redraws its bitmap, which updates
+    all instances at once.
+    """
+    def __init__(self, editor, zoom=2):
+        self.editor = editor
+        self.tilemap = TileMap()
+        self.zoom = zoom
+        self.current_tile = None
+        # Tile being edited in the editor, and the editor grid it is loaded into
+        self.linked_tile = None
+        self.linked_pixels = None
+        self.items = {}
+        self.update_pending = False
+
+        self.window = tk.Toplevel(editor.root)
+        self.window.title("Tilemap Editor")
+        self.window.geometry("900x600")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.setup_ui()
+        self.editor.change_listeners.append(self.on_editor_change)
+        self.reset_map_view()
+
+    def setup_ui(self):
+        toolbar = ttk.Frame(self.window)
+        toolbar.pack(side=tk.TOP, fill=tk.X, padx=10, pady=10)
+
+        ttk.Button(toolbar, text="New Map", command=self.new_map).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="Open", command=self.open_map).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="Save", command=self.save_map).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="Add Tile From File", command=self.add_tile_from_file).pack(side=tk.LEFT, padx=(20, 2))
+        ttk.Button(toolbar, text="Add Current Sprite", command=self.add_current_sprite).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="Edit Tile In Editor", command=self.edit_tile).pack(side=tk.LEFT, padx=2)
+        ttk.Button(toolbar, text="Merge Duplicates", command=self.merge_duplicates).pack(side=tk.LEFT, padx=2)
+
+        ttk.Label(toolbar, text="Left click paints, right click erases").pack(side=tk.RIGHT)
+
+        body = ttk.Frame(self.window)
+        body.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+
+        # Tileset strip
+        strip_frame = ttk.Frame(body)
+        strip_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
+        self.strip = tk.Canvas(strip_frame, width=80, bg="gray85")
+        strip_scrollbar = ttk.Scrollbar(strip_frame, orient=tk.VERTICAL, command=self.strip.yview)
+        self.strip.configure(yscrollcommand=strip_scrollbar.set)
+        strip_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.strip.pack(side=tk.LEFT, fill=tk.Y)
+        self.strip.bind("<Button-1>", self.on_strip_click)
+
+        # Map view
+        map_frame = ttk.Frame(body)
+        map_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas = tk.Canvas(map_frame, bg="gray70")
+        self.v_scrollbar = ttk.Scrollbar(map_frame, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.h_scrollbar = ttk.Scrollbar(map_frame, orient=tk.HORIZONTAL, command=self.canvas.xview)
+        self.canvas.configure(yscrollcommand=self.on_y_scroll, xscrollcommand=self.on_x_scroll)
+        self.v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.h_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.canvas.bind("<Configure>", lambda e: self.schedule_update())
+        self.canvas.bind("<Button-1>", self.on_paint)
+        self.canvas.bind("<B1-Motion>", self.on_paint)
+        self.canvas.bind("<Button-3>", self.on_erase)
+        self.canvas.bind("<B3-Motion>", self.on_erase)
+
+    def close(self):
+        if self.on_editor_change in self.editor.change_listeners:
+            self.editor.change_listeners.remove(self.on_editor_change)
+        self.window.destroy()
+
+    # Scrolling - only the cells in view have canvas items
+
+    def on_x_scroll(self, first, last):
+        self.h_scrollbar.set(first, last)
+        self.schedule_update()
+
+    def on_y_scroll(self, first, last):
+        self.v_scrollbar.set(first, last)
+        self.schedule_update()
+
+    def schedule_update(self):
+        """Update the visible cells once the current burst of events is handled"""
+        if not self.update_pending:
+            self.update_pending = True
+            self.window.after_idle(self.update_visible)
+
+    def cell_size(self):
+        tile_width, tile_height = self.tilemap.tile_size or (16, 16)
+        return tile_width * self.zoom, tile_height * self.zoom
+
+    def reset_map_view(self):
+        """Drop all items and size the scroll region for the current map"""
+        self.canvas.delete("all")
+        self.items = {}
+        cell_width, cell_height = self.cell_size()
+        map_width = self.tilemap.width * cell_width
+        map_height = self.tilemap.height * cell_height
+        self.canvas.configure(scrollregion=(0, 0, map_width, map_height))
+        self.canvas.create_rectangle(0, 0, map_width, map_height, outline="black", fill="white", tags="border")
+        self.update_strip()
+        self.schedule_update()
+
+    def visible_cells(self):
+        """Return the (left, top, right, bottom) range of cells in view"""
+        cell_width, cell_height = self.cell_size()
+        left = int(self.canvas.canvasx(0) // cell_width)
+        top = int(self.canvas.canvasy(0) // cell_height)
+        right = int(self.canvas.canvasx(self.canvas.winfo_width()) // cell_width) + 1
+        bottom = int(self.canvas.canvasy(self.canvas.winfo_height()) // cell_height) + 1
+        return (max(left, 0), max(top, 0),
+                min(right, self.tilemap.width), min(bottom, self.tilemap.height))
+
+    def update_visible(self):
+        """Create items for cells that came into view and delete the ones that left"""
+        self.update_pending = False
+        left, top, right, bottom = self.visible_cells()
+
+        for cell in list(self.items):
+            cell_x, cell_y = cell
+            if not (left <= cell_x < right and top <= cell_y < bottom):
+                self.canvas.delete(self.items.pop(cell))
+
+        cells = self.tilemap.cells[top:bottom, left:right]
+        for dy, dx in zip(*np.nonzero(cells != EMPTY)):
+            cell = (left + int(dx), top + int(dy))
+            if cell not in self.items:
+                self.show_cell(*cell)
+
+    def show_cell(self, cell_x, cell_y):
+        """Create, change or remove the item of one cell"""
+        index = int(self.tilemap.cells[cell_y, cell_x])
+        item = self.items.pop((cell_x, cell_y), None)
+        if index == EMPTY:
+            if item is not None:
+                self.canvas.delete(item)
+            return
+
+        photo = self.tile_bitmap(index).photo
+        if item is not None:
+            self.canvas.itemconfigure(item, image=photo)
+        else:
+            cell_width, cell_height = self.cell_size()
+            item = self.canvas.create_image(cell_x * cell_width, cell_y * cell_height,
+                                            anchor=tk.NW, image=photo, tags="tile")
+        self.items[(cell_x, cell_y)] = item
+
+    def tile_bitmap(self, index):
+        """Return the bitmap of a tile, rendering it the first time it is needed"""
+        tile = self.tilemap.tiles[index]
+        if tile.bitmap is None:
+            tile.bitmap = ZoomedBitmap(self.window, tile.pixels, self.zoom)
+        return tile.bitmap
+
+    # Tileset strip
+
+    def update_strip(self):
+        """Show every tile once in the tileset strip, using the shared bitmaps"""
+        self.strip.delete("all")
+        if not self.tilemap.tiles:
+            return
+        cell_width, cell_height = self.cell_size()
+        for index in range(len(self.tilemap.tiles)):
+            y = index * (cell_height + 8) + 4
+            self.strip.create_image(8, y, anchor=tk.NW, image=self.tile_bitmap(index).photo)
+            if index == self.current_tile:
+                self.strip.create_rectangle(5, y - 3, cell_width + 11, y + cell_height + 3,
+                                            outline="red", width=2)
+        self.strip.configure(width=cell_width + 16,
+                             scrollregion=(0, 0, cell_width + 16, len(self.tilemap.tiles) * (cell_height + 8)))
+
+    def on_strip_click(self, event):
+        _, cell_height = self.cell_size()
+        index = int(self.strip.canvasy(event.y) // (cell_height + 8))
+        if 0 <= index < len(self.tilemap.tiles):
+            self.current_tile = index
+            self.update_strip()
+
+    # Painting
+
+    def get_cell(self, event):
+        cell_width, cell_height = self.cell_size()
+        cell_x = int(self.canvas.canvasx(event.x) // cell_width)
+        cell_y = int(self.canvas.canvasy(event.y) // cell_height)
+        if 0 <= cell_x < self.tilemap.width and 0 <= cell_y < self.tilemap.height:
+            return cell_x, cell_y
+        return None
+
+    def on_paint(self, event):
+        cell = self.get_cell(event)
+        if cell is not None and self.current_tile is not None:
+            self.set_cell(cell, self.current_tile)
+
+    def on_erase(self, event):
+        cell = self.get_cell(event)
+        if cell is not None:
+            self.set_cell(cell, EMPTY)
+
+    def set_cell(self, cell, index):
+        cell_x, cell_y = cell
+        if self.tilemap.cells[cell_y, cell_x] != index:
+            self.tilemap.cells[cell_y, cell_x] = index
+            self.show_cell(cell_x, cell_y)
+
+    # Tiles
+
+    def add_tile(self, name, pixels):
+        try:
+            index = self.tilemap.add_tile(name, pixels)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=self.window)
+            return
+        if index == 0:
+            # The first tile decides the cell size
+            self.reset_map_view()
+        self.current_tile = index
+        self.update_strip()
+
+    def add_tile_from_file(self):
+        filenames = filedialog.askopenfilenames(
+            parent=self.window, filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        for filename in filenames:
+            try:
+                pixels = read_art(filename)
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not load file: {str(e)}", parent=self.window)
+                continue
+            self.add_tile(filename, pixels)
+
+    def add_current_sprite(self):
+        self.editor.commit_floating()
+        self.add_tile(f"Sprite {len(self.tilemap.tiles) + 1}", self.editor.pixels)
+
+    def edit_tile(self):
+        """Open the selected tile in the editor, where edits update every instance"""
+        if self.current_tile is None:
+            messagebox.showwarning("No Tile", "Select a tile first.", parent=self.window)
+            return
+        if not messagebox.askyesno("Edit Tile", "Replace the artwork in the editor with this tile?",
+                                   parent=self.window):
+            return
+        self.linked_tile = None
+        self.editor.load_pixels(self.tilemap.tiles[self.current_tile].pixels.copy())
+        self.linked_tile = self.current_tile
+        self.linked_pixels = self.editor.pixels
+
+    def on_editor_change(self, x0, y0, x1, y1):
+        """Copy edits made in the editor into the linked tile"""
+        if self.linked_tile is None:
+            return
+        if self.editor.pixels is not self.linked_pixels:
+            # The editor started a new grid (load, resize, new artwork)
+            self.linked_tile = None
+            self.linked_pixels = None
+            return
+        tile = self.tilemap.tiles[self.linked_tile]
+        tile.pixels[y0:y1, x0:x1] = self.editor.pixels[y0:y1, x0:x1]
+        if tile.bitmap is not None:
+            tile.bitmap.render_rect(x0, y0, x1, y1)
+
+    def merge_duplicates(self):
+        """Replace repeated tiles with their first copy everywhere on the map"""
+        if not self.tilemap.tiles:
+            return
+        distance = simpledialog.askinteger("Merge Duplicates", "Also merge tiles differing in up to this many pixels:",
+                                           parent=self.window, initialvalue=0, minvalue=0)
+        if distance is None:
+            return
+        before = len(self.tilemap.tiles)
+        try:
+            new_index = self.tilemap.merge_tiles(distance)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=self.window)
+            return
+        if self.current_tile is not None:
+            self.current_tile = int(new_index[self.current_tile])
+        if self.linked_tile is not None:
+            # Edits keep going to the tile that replaced the linked one
+            self.linked_tile = int(new_index[self.linked_tile])
+        self.reset_map_view()
+        messagebox.showinfo("Merge Duplicates", f"{before - len(self.tilemap.tiles)} of {before} tiles merged.",
+                            parent=self.window)
+
+    # Files
+
+    def new_map(self):
+        width = simpledialog.askinteger("New Map", "Map width in tiles:", parent=self.window,
+                                        initialvalue=self.tilemap.width, minvalue=1, maxvalue=4096)
+        if width is None:
+            return
+        height = simpledialog.askinteger("New Map", "Map height in tiles:", parent=self.window,
+                                         initialvalue=self.tilemap.height, minvalue=1, maxvalue=4096)
+        if height is None:
+            return
+
+        # Keep the tileset, start with empty cells
+        tiles = self.tilemap.tiles
+        self.tilemap = TileMap(width, height)
+        self.tilemap.tiles = tiles
+        self.reset_map_view()
+
+    def open_map(self):
+        filename = filedialog.askopenfilename(
+            parent=self.window, filetypes=[("Tilemap files", "*.json"), ("All files", "*.*")])
+        if not filename:
+            return
+        try:
+            tilemap = TileMap.load(filename)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not load tilemap: {str(e)}", parent=self.window)
+            return
+        self.tilemap = tilemap
+        self.current_tile = 0 if tilemap.tiles else None
+        self.linked_tile = None
+        self.reset_map_view()
+
+    def save_map(self):
+        filename = filedialog.asksaveasfilename(
+            parent=self.window, defaultextension=".json",
+            filetypes=[("Tilemap files", "*.json"), ("All files", "*.*")])
+        if not filename:
+            return
+        try:
+            self.tilemap.save(filename)
+            messagebox.showinfo("Success", "Tilemap saved successfully!", parent=self.window)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not save tilemap: {str(e)}", parent=self.window)
@@ -0,0 +1,85 @@
+import numpy as np
+
+# Each transform takes a 2D array of packed colors and returns a new array,
+# so the same functions work on the whole grid, a selection or a script's data.
+
+
+def flip_horizontal(pixels):
+    """Mirror left to right"""
+    return np.ascontiguousarray(pixels[:, ::-1])
+
+
+def flip_vertical(pixels):
+    """Mirror top to bottom"""
+    return np.ascontiguousarray(pixels[::-1, :])
+
+
+def rotate(pixels, quarter_turns=1):
+    """Rotate clockwise in steps of 90 degrees (1 = 90, 2 = 180, 3 = 270)"""
+    return np.ascontiguousarray(np.rot90(pixels, -quarter_turns))
+
+
+def shift(pixels, dx, dy):
+    """Move the pixels by (dx, dy), wrapping around the edges"""
+    return np.roll(pixels, (dy, dx), axis=(0, 1))
+
+
+def scale(pixels, factor):
+    """Enlarge by a whole number factor with nearest neighbour sampling"""
+    if factor < 1:
+        raise ValueError("Scale factor must be a positive whole number")
+    return pixels.repeat(factor, axis=0).repeat(factor, axis=1)
+
+
+# Anchor names for resize_canvas, as (horizontal, vertical) fractions of the size change
+ANCHORS = {
+    "nw": (0, 0), "n": (0.5, 0), "ne": (1, 0),
+    "w": (0, 0.5), "center": (0.5, 0.5), "e": (1, 0.5),
+    "sw": (0, 1), "s": (0.5, 1), "se": (1, 1),
+}
+
+
+def resize_canvas(pixels, width, height, anchor="center"):
+    """Crop or pad to a new size, keeping the artwork pinned to an anchor"""
+    if anchor not in ANCHORS:
+        raise ValueError(f"Unknown anchor: {anchor}")
+    old_height, old_width = pixels.shape
+    fraction_x, fraction_y = ANCHORS[anchor]
+    offset_x = int((width - old_width) * fraction_x)
+    offset_y = int((height - old_height) * fraction_y)
+
+    result = np.zeros((height, width), dtype=pixels.dtype)
+
+    # Overlap between the old pixels and the new grid, in new grid coordinates
+    left, top = max(offset_x, 0), max(offset_y, 0)
+    right, bottom = min(offset_x + old_width, width), min(offset_y + old_height, height)
+    if left < right and top < bottom:
+        result[top:bottom, left:right] = pixels[top - offset_y:bottom - offset_y,
+                                                left - offset_x:right - offset_x]
+    return result
+
+
+def rescale(pixels, width, height):
+    """Resize the artwork to a new size with nearest neighbour sampling"""
+    old_height, old_width = pixels.shape
+    rows = np.arange(height) * old_height // height
+    columns = np.arange(width) * old_width // width
+    return pixels[rows[:, None], columns]
+
+
+def content_bounds(pixels):
+    """Return (left, top, right, bottom) around all non-transparent pixels, or None if empty"""
+    used_columns = np.flatnonzero(pixels.any(axis=0))
+    if not len(used_columns):
+        return None
+    used_rows = np.flatnonzero(pixels.any(axis=1))
+    return int(used_columns[0]), int(used_rows[0]), int(used_columns[-1]) + 1, int(used_rows[-1]) + 1
+
+
+def crop_to_content(pixels):
+    """Cut away transparent borders, leaving empty pixels unchanged"""
+    bounds = content_bounds(pixels)
+    if bounds is None:
+        return pixels
+    left, top, right, bottom = bounds
+    return pixels[top:bottom, left:right].copy()
@@ -0,0 +1,174 @@
+import tkinter as tk
+from tkinter import ttk
+import numpy as np
+
+from colors import TRANSPARENT, to_hex
+from selection import mask_bounds
+
+# PNG palettes hold at most this many colors
+PALETTE_PNG_COLORS = 256
+
+
+class ColorUsage:
+    """How many pixels of each color a pixel array has, kept up to date from the changes made to it.
+
+    Only the changed pixels of each write are counted, so a one pixel edit
+    costs a dictionary update whatever the size of the array. Bounding
+    boxes grow with every write and are only recomputed from the pixels
+    when a color lost pixels and its box is asked for.
+    """
+    def __init__(self, pixels):
+        self.pixels = pixels
+        self.boxes = {}
+        self.stale = set()
+        # Bumped on every change, so views can skip redrawing when nothing changed
+        self.version = 0
+        values, counts = np.unique(pixels, return_counts=True)
+        self.counts = dict(zip(values.tolist(), counts.tolist()))
+        self.stale.update(self.counts)
+
+    def __len__(self):
+        """Number of distinct colors, transparent not included"""
+        return len(self.counts) - (TRANSPARENT in self.counts)
+
+    def count(self, color):
+        return self.counts.get(color, 0)
+
+    def colors(self):
+        """The colors in use, transparent not included, most used first"""
+        return sorted((color for color in self.counts if color != TRANSPARENT),
+                      key=lambda color: (-self.counts[color], color))
+
+    def fits_palette(self, size=PALETTE_PNG_COLORS):
+        """Whether every color, transparent included, fits in a palette of this size"""
+        return len(self.counts) <= size
+
+    def bounds(self, color):
+        """Return the (left, top, right, bottom) box around the pixels of a color, or None if it is unused"""
+        if color not in self.counts:
+            return None
+        if color in self.stale:
+            self.boxes[color] = mask_bounds(self.pixels == color)
+            self.stale.discard(color)
+        return self.boxes[color]
+
+    def replace_pixel(self, x, y, old, new):
+        """Count a pixel that changed from old to new"""
+        self._remove(old, 1)
+        self._add(new, 1, (x, y, x + 1, y + 1))
+        self.version += 1
+
+    def replace_region(self, left, top, before, after):
+        """Count a block of pixels that changed from before to after"""
+        changed = before != after
+        if not changed.any():
+            return
+        old_values, old_counts = np.unique(before[changed], return_counts=True)
+        for value, count in zip(old_values.tolist(), old_counts.tolist()):
+            self._remove(value, count)
+        new_values, new_counts = np.unique(after[changed], return_counts=True)
+        for value, count in zip(new_values.tolist(), new_counts.tolist()):
+            box = None
+            if value not in self.stale:
+                x0, y0, x1, y1 = mask_bounds(changed & (after == value))
+                box = (left + x0, top + y0, left + x1, top + y1)
+            self._add(value, count, box)
+        self.version += 1
+
+    def _remove(self, color, count):
+        remaining = self.counts[color] - count
+        if remaining:
+            self.counts[color] = remaining
+            # The box may have shrunk
+            self.stale.add(color)
+        else:
+            del self.counts[color]
+            self.boxes.pop(color, None)
+            self.stale.discard(color)
+
+    def _add(self, color, count, box):
+        if color in self.counts:
+            self.counts[color] += count
+            if color not in self.stale and box is not None:
+                left, top, right, bottom = self.boxes[color]
+                self.boxes[color] = (min(left, box[0]), min(top, box[1]),
+                                     max(right, box[2]), max(bottom, box[3]))
+        else:
+            self.counts[color] = count
+            self.boxes[color] = box
+            if box is None:
+                self.stale.add(color)
+
+
+class ColorUsagePanel:
+    """List of the colors of the editor's document with live pixel counts.
+
+    Redraws are batched until the editor is idle and skipped when the
+    counts did not change. Clicking a color makes it the current color.
+    """
+    ROW_HEIGHT = 20
+    MAX_ROWS = 64
+
+    def __init__(self, editor, parent):
+        self.editor = editor
+        self.rows = []
+        self.colors = []
+        self.shown = None
+        self.update_pending = False
+
+        self.frame = ttk.LabelFrame(parent, text="Colors In Use", padding=5)
+        self.summary = ttk.Label(self.frame, text="")
+        self.summary.pack(side=tk.TOP, anchor='w')
+        self.canvas = tk.Canvas(self.frame, width=150, height=200, bg="white", highlightthickness=0)
+        scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.editor.change_listeners.append(self.on_change)
+
+    def on_change(self, x0, y0, x1, y1):
+        if not self.update_pending:
+            self.update_pending = True
+            self.canvas.after_idle(self.refresh)
+
+    def refresh(self):
+        self.update_pending = False
+        document = self.editor.document
+        if document.mapped:
+            # Counting a huge mapped file would read all of it
+            self.shown = None
+            self.summary.configure(text="Not counted for large documents")
+            self.canvas.delete("all")
+            self.rows = []
+            return
+
+        usage = document.usage
+        if self.shown == (usage, usage.version):
+            return
+        self.shown = (usage, usage.version)
+
+        colors = usage.colors()[:self.MAX_ROWS]
+        palette = "fits a palette PNG" if usage.fits_palette() else "too many for a palette PNG"
+        self.summary.configure(text=f"{len(usage)} colors, {palette}")
+
+        # Reuse the row items, only their colors and text change
+        for index in range(len(self.rows), len(colors)):
+            y = index * self.ROW_HEIGHT + 2
+            swatch = self.canvas.create_rectangle(4, y, 20, y + self.ROW_HEIGHT - 4, outline="gray40")
+            label = self.canvas.create_text(26, y + (self.ROW_HEIGHT - 4) // 2, anchor=tk.W, font=('Arial', 8))
+            self.rows.append((swatch, label))
+        while len(self.rows) > len(colors):
+            for item in self.rows.pop():
+                self.canvas.delete(item)
+
+        for (swatch, label), color in zip(self.rows, colors):
+            self.canvas.itemconfigure(swatch, fill=to_hex(color))
+            self.canvas.itemconfigure(label, text=f"{to_hex(color)}  {usage.count(color)}")
+        self.canvas.configure(scrollregion=(0, 0, 150, len(colors) * self.ROW_HEIGHT + 4))
+        self.colors = colors
+
+    def on_click(self, event):
+        index = int(self.canvas.canvasy(event.y) // self.ROW_HEIGHT)
+        if self.shown is not None and 0 <= index < len(self.colors):
+            self.editor.set_color(self.colors[index])
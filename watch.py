@@ -0,0 +1,162 @@
+import os
+import sys
+import time
+import argparse
+import threading
+
+from build import Build
+from workspace import scan_art_files
+
+
+class FileWatcher:
+    """Polls files and directory trees for changes from a background thread.
+
+    A file only counts as changed once its modification time and size
+    have stayed the same for the debounce time, so a save that writes in
+    several steps is reported once. callback is called from the watcher
+    thread with a list of absolute paths.
+    """
+    def __init__(self, callback, interval=0.5, debounce=0.3):
+        self.callback = callback
+        self.interval = interval
+        self.debounce = debounce
+        self.files = set()
+        # Files watched for good, set_files leaves them alone
+        self.fixed_files = set()
+        self.directories = set()
+        self.ignore = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def set_files(self, files):
+        with self.lock:
+            self.files = {os.path.abspath(path) for path in files}
+
+    def add_files(self, files):
+        with self.lock:
+            self.fixed_files.update(os.path.abspath(path) for path in files)
+
+    def add_manifest(self, manifest_path):
+        """Watch the art files next to a build manifest and every source it exports from"""
+        directories, files = Build(manifest_path).watch_paths()
+        self.add_directory(os.path.dirname(os.path.abspath(manifest_path)), ignore=[manifest_path])
+        for directory in directories:
+            self.add_directory(directory, ignore=[manifest_path])
+        self.add_files(files)
+
+    def add_directory(self, directory, ignore=()):
+        """Watch every art file in a directory tree, except the given paths"""
+        with self.lock:
+            self.directories.add(os.path.abspath(directory))
+            self.ignore.update(os.path.abspath(path) for path in ignore)
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+    def _snapshot(self):
+        """Return {path: (mtime_ns, size)} for everything being watched"""
+        with self.lock:
+            files = list(self.files | self.fixed_files)
+            directories = list(self.directories)
+            ignore = set(self.ignore)
+
+        signatures = {}
+        for path in files:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signatures[path] = (stat.st_mtime_ns, stat.st_size)
+        for directory in directories:
+            for path, mtime_ns, size in scan_art_files(directory):
+                path = os.path.join(directory, path)
+                if path not in ignore:
+                    signatures[path] = (mtime_ns, size)
+        return signatures
+
+    def _run(self):
+        """Watcher thread main loop"""
+        signatures = self._snapshot()
+        pending = {}
+        while not self.stop_event.wait(self.interval):
+            current = self._snapshot()
+            now = time.monotonic()
+            for path in current.keys() | signatures.keys():
+                if current.get(path) != signatures.get(path):
+                    pending[path] = now
+            signatures = current
+
+            ready = [path for path, changed in pending.items() if now - changed >= self.debounce]
+            if ready:
+                for path in ready:
+                    del pending[path]
+                self.callback(sorted(ready))
+
+
+class BuildRunner:
+    """Runs a build manifest in a background thread whenever asked.
+
+    Requests that arrive while a build is running start one more build
+    once it finishes, instead of queueing one build each.
+    """
+    def __init__(self, manifest_path, log=print):
+        self.manifest_path = manifest_path
+        self.log = log
+        self.lock = threading.Lock()
+        self.thread = None
+        self.rerun = False
+
+    def request(self):
+        with self.lock:
+            if self.thread is not None:
+                self.rerun = True
+                return
+            self.thread = threading.Thread(target=self._run, name="build-runner", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                Build(self.manifest_path).run(log=self.log)
+            except Exception as e:
+                self.log(f"Build failed: {str(e)}")
+            with self.lock:
+                if not self.rerun:
+                    self.thread = None
+                    return
+                self.rerun = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-export a build manifest whenever its art files change")
+    parser.add_argument("manifest", help="build manifest (.json)")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between polls")
+    args = parser.parse_args()
+
+    runner = BuildRunner(args.manifest)
+    runner.request()
+    watcher = FileWatcher(lambda paths: runner.request(), interval=args.interval)
+    watcher.add_manifest(args.manifest)
+    watcher.start()
+    print("Watching for changes, press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        watcher.stop()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
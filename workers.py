@@ -0,0 +1,12 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+_pool = None
+
+
+def shared_pool():
+    """Return the process pool shared by exports, indexing and bulk jobs, started on first use"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+    return _pool
@@ -0,0 +1,361 @@
+import os
+import hashlib
+import sqlite3
+import tkinter as tk
+from tkinter import ttk, messagebox
+import numpy as np
+from PIL import Image
+
+from artfile import BINARY_EXTENSION, map_binary, read_art, read_binary_header
+from colors import to_hex
+from workers import shared_pool
+
+# Per-project index and thumbnail cache, kept inside the project directory
+PROJECT_DIRECTORY = ".pixel_art_project"
+INDEX_NAME = "index.sqlite"
+THUMBNAIL_DIRECTORY = "thumbnails"
+
+THUMBNAIL_SIZE = 64
+
+# Below this many changed files indexing is faster without starting a pool
+POOL_THRESHOLD = 32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sprites (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    palette TEXT NOT NULL,
+    hash TEXT NOT NULL
+)
+"""
+
+
+def content_hash(pixels):
+    """Hash a pixel array, so identical sprites share one hash whatever their file looks like"""
+    digest = hashlib.sha1(b"%dx%d:" % (pixels.shape[1], pixels.shape[0]))
+    digest.update(np.ascontiguousarray(pixels).tobytes())
+    return digest.hexdigest()
+
+
+def write_thumbnail(pixels, filename, size=THUMBNAIL_SIZE):
+    """Save a sprite scaled to fit a size x size box, keeping hard pixel edges"""
+    height, width = pixels.shape
+    scale = max(1, size // max(width, height))
+    image = Image.frombuffer("RGBA", (width, height), np.ascontiguousarray(pixels).tobytes(),
+                             "raw", "RGBA", 0, 1)
+    if scale > 1:
+        image = image.resize((width * scale, height * scale), Image.NEAREST)
+    elif max(width, height) > size:
+        image.thumbnail((size, size), Image.NEAREST)
+    temp_path = filename + ".tmp"
+    image.save(temp_path, "PNG")
+    os.replace(temp_path, filename)
+
+
+def thumbnail_pixels(path, size=THUMBNAIL_SIZE):
+    """The pixels a thumbnail is made from.
+
+    Binary art files can be far too big to read, so only their header and
+    every step-th pixel of every step-th row are read through a mapping.
+    """
+    if not path.lower().endswith(BINARY_EXTENSION):
+        return read_art(path)
+    pixels = map_binary(path, writable=False)
+    step = max(1, -(-max(pixels.shape) // size))
+    return np.array(pixels[::step, ::step])
+
+
+def index_sprite(path, thumbnail_directory):
+    """Read one art file and return its index row, writing its thumbnail if it is missing.
+
+    Runs in worker processes. Files that are not art files get a row with
+    zero size so they are not parsed again until they change. Binary files
+    are indexed from their header and a sample, without their palette.
+    """
+    try:
+        pixels = thumbnail_pixels(path)
+        if path.lower().endswith(BINARY_EXTENSION):
+            width, height = read_binary_header(path)
+            palette = np.empty(0, dtype=pixels.dtype)
+        else:
+            height, width = pixels.shape
+            palette = np.unique(pixels[pixels != 0])
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return path, 0, 0, "", ""
+
+    # For binary files this hashes the sample, which is all the thumbnail shows
+    sprite_hash = content_hash(pixels)
+
+    thumbnail = os.path.join(thumbnail_directory, sprite_hash + ".png")
+    if not os.path.exists(thumbnail):
+        try:
+            write_thumbnail(pixels, thumbnail)
+        except OSError:
+            pass
+    return path, width, height, ",".join(to_hex(value) for value in palette.tolist()), sprite_hash
+
+
+def index_sprites(paths, thumbnail_directory):
+    """index_sprite for a batch of files, so workers get a few big tasks instead of many small ones"""
+    return [index_sprite(path, thumbnail_directory) for path in paths]
+
+
+def scan_art_files(root):
+    """Yield (path relative to root, mtime_ns, size) for every art file (.json or binary) in a directory tree"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.name.lower().endswith((".json", BINARY_EXTENSION)):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                yield os.path.relpath(entry.path, root), stat.st_mtime_ns, stat.st_size
+
+
+class Sprite:
+    """One indexed art file of a project"""
+    __slots__ = ("path", "width", "height", "palette", "hash", "mtime_ns")
+
+    def __init__(self, path, width, height, palette, sprite_hash, mtime_ns):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.palette = palette.split(",") if palette else []
+        self.hash = sprite_hash
+        self.mtime_ns = mtime_ns
+
+
+class Project:
+    """A directory tree of art files with a SQLite index and thumbnail cache.
+
+    Opening a project only stats the files. Art files are parsed again only
+    when their modification time or size differ from the index, and large
+    batches are spread over a process pool.
+    """
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.directory = os.path.join(self.root, PROJECT_DIRECTORY)
+        self.thumbnail_directory = os.path.join(self.directory, THUMBNAIL_DIRECTORY)
+        os.makedirs(self.thumbnail_directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(self.directory, INDEX_NAME))
+        self.connection.execute(SCHEMA)
+        self.sprites = []
+
+    def close(self):
+        self.connection.close()
+
+    def refresh(self):
+        """Bring the index up to date with the files on disk and return the sprites"""
+        known = {path: (mtime_ns, size) for path, mtime_ns, size in
+                 self.connection.execute("SELECT path, mtime_ns, size FROM sprites")}
+
+        found = {}
+        changed = []
+        for path, mtime_ns, size in scan_art_files(self.root):
+            found[path] = (mtime_ns, size)
+            if known.get(path) != (mtime_ns, size):
+                changed.append(path)
+
+        removed = [(path,) for path in known if path not in found]
+        rows = [(path, *found[path], *info) for path, *info in self.index_files(changed)]
+
+        with self.connection:
+            self.connection.executemany("DELETE FROM sprites WHERE path = ?", removed)
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO sprites (path, mtime_ns, size, width, height, palette, hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+        self.sprites = [Sprite(path, width, height, palette, sprite_hash, mtime_ns)
+                        for path, width, height, palette, sprite_hash, mtime_ns in self.connection.execute(
+                            "SELECT path, width, height, palette, hash, mtime_ns FROM sprites "
+                            "WHERE width > 0 ORDER BY path")]
+        return self.sprites
+
+    def index_files(self, paths):
+        """Return (path, width, height, palette, hash) for changed files, relative paths in and out"""
+        full_paths = [os.path.join(self.root, path) for path in paths]
+        if len(full_paths) < POOL_THRESHOLD:
+            results = index_sprites(full_paths, self.thumbnail_directory)
+        else:
+            chunk = max(1, len(full_paths) // ((os.cpu_count() or 1) * 4))
+            batches = [full_paths[i:i + chunk] for i in range(0, len(full_paths), chunk)]
+            results = []
+            for batch in shared_pool().map(index_sprites, batches, [self.thumbnail_directory] * len(batches)):
+                results.extend(batch)
+        return [(os.path.relpath(path, self.root), *info) for path, *info in results]
+
+    def full_path(self, sprite):
+        return os.path.join(self.root, sprite.path)
+
+    def thumbnail_path(self, sprite):
+        """Return the cached thumbnail of a sprite, creating it if it went missing"""
+        filename = os.path.join(self.thumbnail_directory, sprite.hash + ".png")
+        if not os.path.exists(filename):
+            write_thumbnail(thumbnail_pixels(self.full_path(sprite)), filename)
+        return filename
+
+
+class ProjectBrowser:
+    """Window listing the sprites of a project as a grid of thumbnails.
+
+    Thumbnails are only loaded for the rows in view and are kept in a
+    small cache while scrolling back and forth.
+    """
+    # Loaded thumbnails by content hash, shared by all browser windows
+    photos = {}
+
+    def __init__(self, editor, root_directory, columns=6, cache_size=600):
+        self.editor = editor
+        self.columns = columns
+        self.cache_size = cache_size
+        self.cell_width = THUMBNAIL_SIZE + 56
+        self.cell_height = THUMBNAIL_SIZE + 36
+        self.items = {}
+        self.update_pending = False
+
+        self.project = Project(root_directory)
+        self.sprites = []
+
+        self.window = tk.Toplevel(editor.root)
+        self.window.title(f"Project - {self.project.root}")
+        self.window.geometry(f"{columns * self.cell_width + 40}x600")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.setup_ui()
+        self.refresh()
+
+    def setup_ui(self):
+        toolbar = ttk.Frame(self.window)
+        toolbar.pack(side=tk.TOP, fill=tk.X, padx=10, pady=10)
+
+        ttk.Button(toolbar, text="Refresh", command=self.refresh).pack(side=tk.LEFT, padx=2)
+        ttk.Label(toolbar, text="Filter:").pack(side=tk.LEFT, padx=(20, 5))
+        self.filter_var = tk.StringVar()
+        filter_entry = ttk.Entry(toolbar, textvariable=self.filter_var, width=20)
+        filter_entry.pack(side=tk.LEFT)
+        filter_entry.bind("<KeyRelease>", lambda e: self.apply_filter())
+
+        self.status_var = tk.StringVar()
+        ttk.Label(toolbar, textvariable=self.status_var).pack(side=tk.RIGHT)
+
+        frame = ttk.Frame(self.window)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        self.canvas = tk.Canvas(frame, bg="white")
+        self.scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.canvas.bind("<Configure>", lambda e: self.schedule_update())
+        self.canvas.bind("<Double-Button-1>", self.on_double_click)
+        self.canvas.bind("<MouseWheel>", lambda e: self.canvas.yview_scroll(-e.delta // 120, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+
+    def close(self):
+        self.project.close()
+        self.window.destroy()
+
+    def refresh(self):
+        """Re-index the project and show the result"""
+        try:
+            self.all_sprites = self.project.refresh()
+        except (OSError, sqlite3.Error) as e:
+            messagebox.showerror("Error", f"Could not index project: {str(e)}", parent=self.window)
+            self.all_sprites = []
+        self.apply_filter()
+
+    def apply_filter(self):
+        text = self.filter_var.get().lower()
+        if text:
+            self.sprites = [sprite for sprite in self.all_sprites if text in sprite.path.lower()]
+        else:
+            self.sprites = self.all_sprites
+        self.status_var.set(f"{len(self.sprites)} of {len(self.all_sprites)} sprites")
+
+        self.canvas.delete("all")
+        self.items = {}
+        rows = (len(self.sprites) + self.columns - 1) // self.columns
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.cell_width, rows * self.cell_height))
+        self.canvas.yview_moveto(0)
+        self.schedule_update()
+
+    # Lazy loading - only the rows in view have items and loaded thumbnails
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.schedule_update()
+
+    def schedule_update(self):
+        if not self.update_pending:
+            self.update_pending = True
+            self.window.after_idle(self.update_visible)
+
+    def update_visible(self):
+        self.update_pending = False
+        top = int(self.canvas.canvasy(0) // self.cell_height)
+        bottom = int(self.canvas.canvasy(self.canvas.winfo_height()) // self.cell_height) + 1
+        first = max(top, 0) * self.columns
+        last = min(bottom * self.columns, len(self.sprites))
+
+        for index in list(self.items):
+            if not first <= index < last:
+                for item in self.items.pop(index):
+                    self.canvas.delete(item)
+
+        for index in range(first, last):
+            if index not in self.items:
+                self.show_sprite(index)
+
+    def show_sprite(self, index):
+        sprite = self.sprites[index]
+        row, column = divmod(index, self.columns)
+        x = column * self.cell_width + self.cell_width // 2
+        y = row * self.cell_height + 4
+
+        items = []
+        photo = self.get_photo(sprite)
+        if photo is not None:
+            items.append(self.canvas.create_image(x, y + THUMBNAIL_SIZE // 2, image=photo))
+        name = os.path.basename(sprite.path)
+        if len(name) > 18:
+            name = name[:15] + "..."
+        items.append(self.canvas.create_text(x, y + THUMBNAIL_SIZE + 6, anchor=tk.N, font=("Arial", 8),
+                                             text=f"{name}\n{sprite.width}x{sprite.height}", justify=tk.CENTER))
+        self.items[index] = items
+
+    def get_photo(self, sprite):
+        """Load a thumbnail from the disk cache, keeping recently used ones in memory"""
+        photo = self.photos.pop(sprite.hash, None)
+        if photo is None:
+            try:
+                photo = tk.PhotoImage(master=self.window, file=self.project.thumbnail_path(sprite))
+            except (OSError, ValueError, KeyError, tk.TclError):
+                return None
+            if len(self.photos) >= self.cache_size:
+                # Dicts keep insertion order, so the first entry is the least recently used
+                self.photos.pop(next(iter(self.photos)))
+        self.photos[sprite.hash] = photo
+        return photo
+
+    def on_double_click(self, event):
+        """Open the sprite under the mouse in the editor"""
+        column = int(self.canvas.canvasx(event.x) // self.cell_width)
+        row = int(self.canvas.canvasy(event.y) // self.cell_height)
+        index = row * self.columns + column
+        if 0 <= column < self.columns and 0 <= index < len(self.sprites):
+            self.editor.open_art(self.project.full_path(self.sprites[index]))